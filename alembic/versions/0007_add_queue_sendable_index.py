@@ -0,0 +1,25 @@
+"""Add partial index for sendable messages_queue rows"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007_queue_sendable_idx"
+down_revision = "0006_camera_last_sent"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_messages_queue_sendable",
+        "messages_queue",
+        ["created_at", "next_retry_at"],
+        unique=False,
+        postgresql_where=sa.text("status IN ('PENDING', 'FAILED')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_queue_sendable", table_name="messages_queue")
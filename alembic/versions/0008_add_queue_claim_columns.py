@@ -0,0 +1,32 @@
+"""Add claim owner columns to messages_queue"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008_queue_claims"
+down_revision = "0007_queue_sendable_idx"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "messages_queue",
+        sa.Column(
+            "claimed_by",
+            sa.String(length=255),
+            nullable=True,
+            comment="Proceso sender (host:pid) que tiene reclamado el mensaje",
+        ),
+    )
+    op.add_column(
+        "messages_queue",
+        sa.Column("claimed_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("messages_queue", "claimed_at")
+    op.drop_column("messages_queue", "claimed_by")
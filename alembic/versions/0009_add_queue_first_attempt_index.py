@@ -0,0 +1,25 @@
+"""Add partial index for first-attempt messages_queue rows"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009_queue_first_attempts"
+down_revision = "0008_queue_claims"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_messages_queue_first_attempts",
+        "messages_queue",
+        ["created_at"],
+        unique=False,
+        postgresql_where=sa.text("status IN ('PENDING', 'FAILED') AND attempts = 0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_queue_first_attempts", table_name="messages_queue")
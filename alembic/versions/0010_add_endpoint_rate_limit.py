@@ -0,0 +1,37 @@
+"""Add rate limit columns to endpoints"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010_endpoint_rate_limit"
+down_revision = "0009_queue_first_attempts"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "endpoints",
+        sa.Column(
+            "rate_limit_per_second",
+            sa.Float(),
+            nullable=True,
+            comment="Envíos por segundo permitidos (NULL = valor por defecto)",
+        ),
+    )
+    op.add_column(
+        "endpoints",
+        sa.Column(
+            "rate_limit_burst",
+            sa.Integer(),
+            nullable=True,
+            comment="Envíos seguidos permitidos sin esperar (ráfaga)",
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("endpoints", "rate_limit_burst")
+    op.drop_column("endpoints", "rate_limit_per_second")
@@ -0,0 +1,35 @@
+"""Add lease expiry to claimed messages_queue rows"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0011_queue_lease"
+down_revision = "0010_endpoint_rate_limit"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "messages_queue",
+        sa.Column(
+            "lease_expires_at",
+            sa.DateTime(timezone=True),
+            nullable=True,
+            comment="Vencimiento de la reclamación; el sender la renueva mientras está vivo",
+        ),
+    )
+    op.create_index(
+        "ix_messages_queue_sending_lease",
+        "messages_queue",
+        ["lease_expires_at"],
+        unique=False,
+        postgresql_where=sa.text("status = 'SENDING'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_queue_sending_lease", table_name="messages_queue")
+    op.drop_column("messages_queue", "lease_expires_at")
@@ -0,0 +1,54 @@
+"""Add compressed raw XML column to alpr_readings"""
+from __future__ import annotations
+
+import gzip
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0012_raw_xml_gz"
+down_revision = "0011_queue_lease"
+branch_labels = None
+depends_on = None
+
+DOWNGRADE_BATCH_SIZE = 500
+
+
+def upgrade() -> None:
+    op.add_column(
+        "alpr_readings",
+        sa.Column(
+            "raw_xml_gz",
+            sa.LargeBinary(),
+            nullable=True,
+            comment="XML original sin imágenes comprimido con gzip (RAW_XML_POLICY=compressed)",
+        ),
+    )
+
+
+def downgrade() -> None:
+    # Las lecturas comprimidas se descomprimen en raw_xml antes de quitar la
+    # columna, por lotes para no cargar todos los blobs en memoria.
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.text(
+                "SELECT id, raw_xml_gz FROM alpr_readings"
+                " WHERE raw_xml_gz IS NOT NULL AND id > :last_id"
+                " ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": DOWNGRADE_BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+        bind.execute(
+            sa.text("UPDATE alpr_readings SET raw_xml = :xml WHERE id = :id"),
+            [
+                {"xml": gzip.decompress(data).decode("utf-8"), "id": reading_id}
+                for reading_id, data in rows
+            ],
+        )
+        last_id = rows[-1][0]
+    op.drop_column("alpr_readings", "raw_xml_gz")
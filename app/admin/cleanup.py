@@ -10,7 +10,7 @@ from sqlalchemy.orm import Session
 from app.config import settings
 from app.models import AlprReading, Camera, Certificate, Endpoint, MessageQueue, Municipality
 from app.utils.cleanup import delete_reading_images
-from app.utils.images import resolve_image_path
+from app.utils.images import image_files, resolve_image_path
 
 logger = logging.getLogger(__name__)
 
@@ -39,11 +39,13 @@ def _delete_image_paths(reading_rows: Iterable[tuple[int, Optional[str], Optiona
     for _, ocr_path, ctx_path in reading_rows:
         for path in (ocr_path, ctx_path):
             if path:
-                full_path = resolve_image_path(path)
+                full_path, *sidecars = image_files(path)
                 try:
                     if full_path.is_file():
                         full_path.unlink()
                         images_deleted += 1
+                    for sidecar in sidecars:
+                        sidecar.unlink(missing_ok=True)
                 except Exception:  # pragma: no cover - defensivo
                     logger.warning(
                         "[CLEANUP] No se ha podido borrar la imagen: %s", full_path, exc_info=True
@@ -12,8 +12,12 @@ from sqlalchemy.orm.exc import StaleDataError
 
 from app.admin import cleanup
 from app.admin.certs import extract_and_assign_cert
+from app.admin.queue import camera_queue_ages
+from app.admin.raw_xml import compact_raw_xml, raw_xml_sizes
 from app.config import settings
 from app.models import Municipality, SessionLocal
+from app.sender.wsdl_cache import default_cache_dir, warm_wsdl_cache
+from app.utils.raw_xml import RAW_XML_POLICIES
 
 logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
@@ -99,6 +103,31 @@ def _parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
     subparsers.add_parser(
         "list-municipalities", help="Listar municipios con su código e ID"
     )
+    queue_ages_parser = subparsers.add_parser(
+        "queue-ages", help="Mensajes en cola y antigüedad del más viejo por cámara"
+    )
+    queue_ages_parser.add_argument(
+        "--limit", type=int, default=20, help="Número de cámaras a mostrar (por defecto 20)"
+    )
+
+    subparsers.add_parser(
+        "raw-xml-sizes", help="Espacio que ocupa el XML original de las lecturas"
+    )
+    compact_parser = subparsers.add_parser(
+        "compact-raw-xml",
+        help="Aplicar RAW_XML_POLICY (o --policy) al XML de las lecturas existentes",
+    )
+    compact_parser.add_argument(
+        "--policy",
+        choices=RAW_XML_POLICIES,
+        help="Política a aplicar (por defecto RAW_XML_POLICY)",
+    )
+    compact_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Lecturas por transacción (por defecto 500)",
+    )
 
     extract_parser = subparsers.add_parser(
         "extract-assign-cert", help="Extraer PEM de un PFX y asignarlo a un municipio"
@@ -114,6 +143,13 @@ def _parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
         help="ID del municipio al que asociar el certificado extraído",
     )
 
+    wsdl_parser = subparsers.add_parser(
+        "warm-wsdl-cache", help="Descargar el WSDL de Mossos y sus XSD a la caché local"
+    )
+    wsdl_parser.add_argument(
+        "--wsdl-url", help="URL del WSDL (por defecto MOSSOS_WSDL_URL)"
+    )
+
     return parser.parse_args(argv)
 
 
@@ -137,6 +173,9 @@ def _execute(argv: Optional[list[str]] = None) -> int:
             "wipe-images",
             "full-wipe",
             "list-municipalities",
+            "queue-ages",
+            "raw-xml-sizes",
+            "compact-raw-xml",
             "extract-assign-cert",
         }:
             session = _open_session()
@@ -247,6 +286,38 @@ def _execute(argv: Optional[list[str]] = None) -> int:
                 for mun in municipalities:
                     code = mun.code or "-"
                     print(f"{mun.id} | {code} | {mun.name}")
+        elif args.command == "queue-ages":
+            rows = camera_queue_ages(session)
+            if not rows:
+                print("No hay mensajes en cola.")
+            else:
+                print("Cámara | Municipio | En cola | Más antiguo (s)")
+                for row in rows[: args.limit]:
+                    print(
+                        f"{row.serial_number} | {row.municipality or '-'} | {row.queued} | "
+                        f"{row.oldest_age_seconds:.0f}"
+                    )
+        elif args.command == "raw-xml-sizes":
+            sizes = raw_xml_sizes(session)
+            print(f"Lecturas: {sizes.readings}")
+            print(
+                f"XML en claro: {sizes.plain_rows} lecturas, "
+                f"{sizes.plain_bytes / 1024 / 1024:.1f} MB"
+            )
+            print(
+                f"XML comprimido: {sizes.compressed_rows} lecturas, "
+                f"{sizes.compressed_bytes / 1024 / 1024:.1f} MB"
+            )
+            if sizes.table_bytes is not None:
+                print(
+                    "Tamaño total de alpr_readings: "
+                    f"{sizes.table_bytes / 1024 / 1024:.1f} MB"
+                )
+        elif args.command == "compact-raw-xml":
+            changed = compact_raw_xml(
+                session, policy=args.policy, batch_size=args.batch_size
+            )
+            print(f"Se ha reescrito el XML de {changed} lecturas.")
         elif args.command == "extract-assign-cert":
             try:
                 result = extract_and_assign_cert(
@@ -269,6 +340,17 @@ def _execute(argv: Optional[list[str]] = None) -> int:
             if result.privpub_path:
                 print(f"[CERT] privpub.pem (bundle extra): {result.privpub_path}")
             print(f"[CERT] Certificate.id: {result.certificate.id}")
+        elif args.command == "warm-wsdl-cache":
+            try:
+                cached_urls = warm_wsdl_cache(args.wsdl_url)
+            except Exception as exc:
+                logger.error("[WSDL][ERROR] %s", exc)
+                print(f"[WSDL][ERROR] No se ha podido precalentar la caché: {exc}")
+                return 1
+
+            print(f"[WSDL] Caché precalentada en {default_cache_dir()}.")
+            for url in cached_urls:
+                print(f"[WSDL] {url}")
         else:
             print("Comando no reconocido")
             return 1
@@ -0,0 +1,55 @@
+"""Informes de estado de la cola de envío para tareas administrativas."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models import AlprReading, Camera, MessageQueue, MessageStatus, Municipality
+
+
+@dataclass
+class CameraQueueAge:
+    camera_id: int
+    serial_number: str
+    municipality: Optional[str]
+    queued: int
+    oldest_age_seconds: float
+
+
+def camera_queue_ages(session: Session, now: Optional[datetime] = None) -> list[CameraQueueAge]:
+    """Mensajes en cola (PENDING/FAILED) y antigüedad del más viejo por cámara.
+
+    Permite comprobar si una cámara con mucho tráfico retrasa al resto
+    (ver ``SENDER_SCHEDULING``). Se ordena de mayor a menor antigüedad.
+    """
+
+    now = now or datetime.now(timezone.utc)
+    stmt = (
+        select(
+            Camera.id,
+            Camera.serial_number,
+            Municipality.name,
+            func.count(MessageQueue.id),
+            func.min(MessageQueue.created_at),
+        )
+        .join(AlprReading, AlprReading.id == MessageQueue.reading_id)
+        .join(Camera, Camera.id == AlprReading.camera_id)
+        .outerjoin(Municipality, Municipality.id == Camera.municipality_id)
+        .where(MessageQueue.status.in_([MessageStatus.PENDING, MessageStatus.FAILED]))
+        .group_by(Camera.id, Camera.serial_number, Municipality.name)
+    )
+    rows = []
+    for camera_id, serial_number, municipality, queued, oldest in session.execute(stmt):
+        if oldest is not None and oldest.tzinfo is None:
+            oldest = oldest.replace(tzinfo=timezone.utc)
+        age = (now - oldest).total_seconds() if oldest is not None else 0.0
+        rows.append(CameraQueueAge(camera_id, serial_number, municipality, queued, max(age, 0.0)))
+    rows.sort(key=lambda row: row.oldest_age_seconds, reverse=True)
+    return rows
+
+
+__all__ = ["CameraQueueAge", "camera_queue_ages"]
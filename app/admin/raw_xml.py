@@ -0,0 +1,89 @@
+"""Tamaño y compactación del XML original guardado en ``alpr_readings``."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import func, or_, select, text, update
+from sqlalchemy.orm import Session
+
+from app.models import AlprReading
+from app.utils.raw_xml import raw_xml_columns, reading_raw_xml, resolve_policy
+
+
+@dataclass
+class RawXmlSizes:
+    readings: int
+    plain_rows: int
+    compressed_rows: int
+    plain_bytes: int
+    compressed_bytes: int
+    table_bytes: Optional[int]
+
+
+def raw_xml_sizes(session: Session) -> RawXmlSizes:
+    """Lecturas con XML en claro o comprimido y los bytes que ocupa cada uno.
+
+    En PostgreSQL incluye además el tamaño total de la tabla (con TOAST e
+    índices), que es lo que pesa en WAL, copias de seguridad y ``VACUUM``.
+    """
+
+    is_postgres = session.get_bind().dialect.name == "postgresql"
+    byte_length = func.octet_length if is_postgres else func.length
+    row = session.execute(
+        select(
+            func.count(AlprReading.id),
+            func.count(AlprReading.raw_xml),
+            func.count(AlprReading.raw_xml_gz),
+            func.coalesce(func.sum(byte_length(AlprReading.raw_xml)), 0),
+            func.coalesce(func.sum(byte_length(AlprReading.raw_xml_gz)), 0),
+        )
+    ).one()
+    table_bytes = None
+    if is_postgres:
+        table_bytes = session.execute(
+            text("SELECT pg_total_relation_size('alpr_readings')")
+        ).scalar()
+    return RawXmlSizes(*(int(value) for value in row), table_bytes=table_bytes)
+
+
+def compact_raw_xml(
+    session: Session, *, policy: Optional[str] = None, batch_size: int = 500
+) -> int:
+    """Reescribe el XML de las lecturas existentes según ``policy`` (``RAW_XML_POLICY``).
+
+    Recorre la tabla por lotes de ``batch_size`` lecturas ordenadas por id y
+    confirma cada lote, así que puede interrumpirse y relanzarse. Las imágenes
+    quitadas no se recuperan: con ``full`` solo se descomprime ``raw_xml_gz``.
+    Devuelve el número de lecturas modificadas.
+    """
+
+    policy = resolve_policy(policy)
+    batch_size = max(int(batch_size), 1)
+    last_id = 0
+    changed = 0
+    while True:
+        rows = session.execute(
+            select(AlprReading.id, AlprReading.raw_xml, AlprReading.raw_xml_gz)
+            .where(
+                AlprReading.id > last_id,
+                or_(AlprReading.raw_xml.is_not(None), AlprReading.raw_xml_gz.is_not(None)),
+            )
+            .order_by(AlprReading.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return changed
+        updates = []
+        for row in rows:
+            raw_xml, raw_xml_gz = raw_xml_columns(reading_raw_xml(row), policy)
+            if (raw_xml, raw_xml_gz) != (row.raw_xml, row.raw_xml_gz):
+                updates.append({"id": row.id, "raw_xml": raw_xml, "raw_xml_gz": raw_xml_gz})
+        if updates:
+            session.execute(update(AlprReading), updates)
+        session.commit()
+        changed += len(updates)
+        last_id = rows[-1].id
+
+
+__all__ = ["RawXmlSizes", "compact_raw_xml", "raw_xml_sizes"]
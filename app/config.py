@@ -8,11 +8,21 @@ que se cargará con herramientas como `python-dotenv`.
 import logging
 import os
 
-from pydantic import BaseSettings, Field
+from pydantic import BaseSettings, Field, validator
 
 
 logger = logging.getLogger(__name__)
 
+IMAGE_STORAGE_MODES = ("jpeg", "jpeg+b64", "b64")
+RAW_XML_POLICIES = ("full", "strip_images", "compressed", "none")
+
+
+def _normalize_choice(value: str, choices: tuple[str, ...], env: str) -> str:
+    normalized = value.strip().lower()
+    if normalized not in choices:
+        raise ValueError(f"{env} debe ser uno de {', '.join(choices)}")
+    return normalized
+
 
 class Settings(BaseSettings):
     """Clase de configuración para toda la aplicación.
@@ -34,23 +44,75 @@ class Settings(BaseSettings):
 
     sender_enabled: bool = Field(True, env="SENDER_ENABLED")
     sender_poll_interval_seconds: int = Field(5, env="SENDER_POLL_INTERVAL_SECONDS")
+    sender_listen_enabled: bool = Field(True, env="SENDER_LISTEN_ENABLED")
+    sender_adaptive_enabled: bool = Field(False, env="SENDER_ADAPTIVE_ENABLED")
+    sender_adaptive_min_batch: int = Field(10, env="SENDER_ADAPTIVE_MIN_BATCH")
+    sender_adaptive_max_batch: int = Field(500, env="SENDER_ADAPTIVE_MAX_BATCH")
+    sender_adaptive_min_wait_seconds: float = Field(0.0, env="SENDER_ADAPTIVE_MIN_WAIT_SECONDS")
+    sender_adaptive_max_wait_seconds: float = Field(30.0, env="SENDER_ADAPTIVE_MAX_WAIT_SECONDS")
+    sender_adaptive_target_p95_ms: int = Field(3000, env="SENDER_ADAPTIVE_TARGET_P95_MS")
+    sender_adaptive_max_error_rate: float = Field(0.5, env="SENDER_ADAPTIVE_MAX_ERROR_RATE")
     sender_max_batch_size: int = Field(50, env="SENDER_MAX_BATCH_SIZE")
+    sender_scheduling: str = Field("fifo", env="SENDER_SCHEDULING")
+    sender_first_attempt_share: float = Field(0.8, env="SENDER_FIRST_ATTEMPT_SHARE")
     sender_default_retry_max: int = Field(3, env="SENDER_DEFAULT_RETRY_MAX")
     sender_default_backoff_ms: int = Field(1000, env="SENDER_DEFAULT_BACKOFF_MS")
     sender_stuck_timeout_seconds: int = Field(300, env="SENDER_STUCK_TIMEOUT_SECONDS")
+    sender_lease_seconds: int = Field(30, env="SENDER_LEASE_SECONDS")
     sender_dead_retention_minutes: int = Field(10, env="SENDER_DEAD_RETENTION_MINUTES")
+    sender_maintenance_enabled: bool = Field(True, env="SENDER_MAINTENANCE_ENABLED")
+    sender_maintenance_interval_seconds: float = Field(
+        15.0, env="SENDER_MAINTENANCE_INTERVAL_SECONDS"
+    )
+    sender_maintenance_budget_seconds: float = Field(2.0, env="SENDER_MAINTENANCE_BUDGET_SECONDS")
+    sender_maintenance_chunk_size: int = Field(500, env="SENDER_MAINTENANCE_CHUNK_SIZE")
+    sender_concurrency: int = Field(1, env="SENDER_CONCURRENCY")
+    sender_shard_count: int = Field(1, env="SENDER_SHARD_COUNT")
+    sender_shard_index: int = Field(0, env="SENDER_SHARD_INDEX")
+    sender_endpoint_max_in_flight: int = Field(4, env="SENDER_ENDPOINT_MAX_IN_FLIGHT")
+    sender_default_rate_limit_per_second: float = Field(
+        0.0, env="SENDER_DEFAULT_RATE_LIMIT_PER_SECOND"
+    )
+    sender_default_rate_limit_burst: int = Field(0, env="SENDER_DEFAULT_RATE_LIMIT_BURST")
+    sender_breaker_failure_threshold: int = Field(5, env="SENDER_BREAKER_FAILURE_THRESHOLD")
+    sender_breaker_reset_seconds: int = Field(30, env="SENDER_BREAKER_RESET_SECONDS")
+    sender_status_flush_max: int = Field(100, env="SENDER_STATUS_FLUSH_MAX")
+    sender_status_flush_interval_ms: int = Field(200, env="SENDER_STATUS_FLUSH_INTERVAL_MS")
+    sender_client_pool_size: int = Field(16, env="SENDER_CLIENT_POOL_SIZE")
+    sender_client_idle_seconds: int = Field(600, env="SENDER_CLIENT_IDLE_SECONDS")
+    sender_http_pool_connections: int = Field(4, env="SENDER_HTTP_POOL_CONNECTIONS")
+    sender_http_pool_maxsize: int = Field(10, env="SENDER_HTTP_POOL_MAXSIZE")
+    sender_profile_cache_ttl_seconds: int = Field(300, env="SENDER_PROFILE_CACHE_TTL_SECONDS")
+    sender_soap_transport: str = Field("zeep", env="SENDER_SOAP_TRANSPORT")
+    sender_signing_processes: int = Field(0, env="SENDER_SIGNING_PROCESSES")
+    sender_prefetch_depth: int = Field(2, env="SENDER_PREFETCH_DEPTH")
+    sender_prefetch_max_mb: int = Field(64, env="SENDER_PREFETCH_MAX_MB")
     MOSSOS_WSDL_URL: str = Field(
         "https://anpr.dgp.interior.extranet.gencat.cat/matr-ws/matricules.wsdl",
         env="MOSSOS_WSDL_URL",
     )
     MOSSOS_ENDPOINT_URL: str | None = Field(None, env="MOSSOS_ENDPOINT_URL")
     mossos_timeout: float = Field(5.0, env="MOSSOS_TIMEOUT")
+    wsdl_cache_enabled: bool = Field(True, env="WSDL_CACHE_ENABLED")
+    wsdl_cache_dir: str | None = Field(None, env="WSDL_CACHE_DIR")
+    wsdl_cache_ttl_seconds: int = Field(86400, env="WSDL_CACHE_TTL_SECONDS")
+    wsdl_cache_prefer: bool = Field(False, env="WSDL_CACHE_PREFER")
 
     images_dir: str = Field(
         "/data/images",
         env=("IMAGES_BASE_DIR", "IMAGES_DIR"),
         description="Directorio base para almacenar imágenes ALPR",
     )
+    image_storage_mode: str = Field("jpeg", env="IMAGE_STORAGE_MODE")
+    raw_xml_policy: str = Field("strip_images", env="RAW_XML_POLICY")
+
+    @validator("image_storage_mode")
+    def _check_image_storage_mode(cls, value: str) -> str:
+        return _normalize_choice(value, IMAGE_STORAGE_MODES, "IMAGE_STORAGE_MODE")
+
+    @validator("raw_xml_policy")
+    def _check_raw_xml_policy(cls, value: str) -> str:
+        return _normalize_choice(value, RAW_XML_POLICIES, "RAW_XML_POLICY")
 
     @property
     def images_base_dir(self) -> str:
@@ -4,8 +4,15 @@ from __future__ import annotations
 import base64
 from datetime import datetime
 
+from app.config import settings
 from app.logger import logger
-from app.utils.images import build_image_paths, normalize_plate
+from app.utils.images import (
+    BASE64_STORAGE_MODES,
+    BASE64_SUFFIX,
+    base64_sidecar,
+    build_image_paths,
+    normalize_plate,
+)
 
 
 def save_reading_image_base64(
@@ -20,6 +27,11 @@ def save_reading_image_base64(
     Devuelve la ruta relativa del fichero escrito o ``None`` si ocurre un error
     al decodificar o persistir los bytes. Está pensada para consumir
     directamente las etiquetas ``IMAGE_OCR`` / ``IMAGE_CTX`` del XML de Tattile.
+
+    Según ``IMAGE_STORAGE_MODE`` se guarda el JPEG (``jpeg``), el JPEG más un
+    sidecar ``.b64`` con el texto recibido (``jpeg+b64``) o solo el texto base64
+    (``b64``, la ruta devuelta termina en ``.b64``). El sender inserta ese texto
+    directamente en el sobre SOAP sin decodificar ni recodificar.
     """
 
     plate_clean = normalize_plate(plate)
@@ -31,8 +43,14 @@ def save_reading_image_base64(
         (rel_ocr, full_ocr) if kind == "ocr" else (rel_ctx, full_ctx)
     )
 
+    mode = settings.image_storage_mode
+    keep_base64 = mode in BASE64_STORAGE_MODES
+    if keep_base64:
+        # El texto se enviará tal cual a Mossos: se normaliza y se valida estrictamente.
+        base64_data = "".join(base64_data.split())
+
     try:
-        image_bytes = base64.b64decode(base64_data)
+        image_bytes = base64.b64decode(base64_data, validate=keep_base64)
     except Exception as e:  # pragma: no cover - logging defensivo
         logger.error(
             "[IMAGEN][ERROR] Error decodificando imagen %s para cámara %s, matrícula=%s: %s",
@@ -43,8 +61,17 @@ def save_reading_image_base64(
         )
         return None
 
+    if mode == "b64":
+        target_rel = target_rel + BASE64_SUFFIX
+        target_full = base64_sidecar(target_full)
+
     try:
-        target_full.write_bytes(image_bytes)
+        if mode == "b64":
+            target_full.write_text(base64_data, encoding="ascii")
+        else:
+            target_full.write_bytes(image_bytes)
+            if keep_base64:
+                base64_sidecar(target_full).write_text(base64_data, encoding="ascii")
     except Exception as e:  # pragma: no cover - logging defensivo
         logger.error(
             "[IMAGEN][ERROR] Error guardando imagen %s en %s: %s",
@@ -13,6 +13,8 @@ from app.logger import logger
 from app.ingest.image_storage import save_reading_image_base64
 from app.ingest.parser import TattileParseError, parse_tattile_xml
 from app.models import AlprReading, Camera, MessageQueue, SessionLocal
+from app.utils.notify import notify_queue
+from app.utils.raw_xml import raw_xml_columns
 
 READ_TIMEOUT_SECONDS = 1.0
 
@@ -64,6 +66,7 @@ def process_tattile_payload(xml_str: str, session: Session) -> None:
             )
             has_image_ctx = image_ctx_path is not None
 
+        raw_xml, raw_xml_gz = raw_xml_columns(xml_str)
         reading = AlprReading(
             camera_id=camera.id,
             device_sn=device_sn,
@@ -84,13 +87,15 @@ def process_tattile_payload(xml_str: str, session: Session) -> None:
             has_image_ctx=has_image_ctx,
             image_ocr_path=image_ocr_path,
             image_ctx_path=image_ctx_path,
-            raw_xml=xml_str,
+            raw_xml=raw_xml,
+            raw_xml_gz=raw_xml_gz,
         )
         session.add(reading)
         session.flush()
 
         message = MessageQueue(reading_id=reading.id, status="PENDING", attempts=0)
         session.add(message)
+        notify_queue(session)
 
         session.commit()
 
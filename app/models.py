@@ -11,6 +11,7 @@ Incluye las tablas principales previstas en el diseño conceptual:
 from __future__ import annotations
 
 from datetime import datetime, timedelta, timezone
+from itertools import chain
 from typing import List, Optional
 
 from sqlalchemy import (
@@ -18,15 +19,20 @@ from sqlalchemy import (
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
+    LargeBinary,
     String,
     Text,
     create_engine,
+    event,
+    text,
 )
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, sessionmaker
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column, relationship, sessionmaker
 from sqlalchemy.sql import func
 
 from app.config import settings
+from app.utils.notify import notify_config_change, run_config_callbacks
 
 class Base(DeclarativeBase):
     pass
@@ -102,6 +108,12 @@ class Endpoint(Base):
     timeout_ms: Mapped[int] = mapped_column(Integer, nullable=False, default=30000)
     retry_max: Mapped[int] = mapped_column(Integer, nullable=False, default=3)
     retry_backoff_ms: Mapped[int] = mapped_column(Integer, nullable=False, default=1000)
+    rate_limit_per_second: Mapped[Optional[float]] = mapped_column(
+        Float, nullable=True, comment="Envíos por segundo permitidos (NULL = valor por defecto)"
+    )
+    rate_limit_burst: Mapped[Optional[int]] = mapped_column(
+        Integer, nullable=True, comment="Envíos seguidos permitidos sin esperar (ráfaga)"
+    )
 
     municipalities: Mapped[List["Municipality"]] = relationship(
         "Municipality", back_populates="endpoint"
@@ -180,7 +192,15 @@ class AlprReading(Base):
     has_image_ctx: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     image_ocr_path: Mapped[Optional[str]] = mapped_column(String(1024), nullable=True)
     image_ctx_path: Mapped[Optional[str]] = mapped_column(String(1024), nullable=True)
-    raw_xml: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # XML original de la cámara según RAW_XML_POLICY (ver app.utils.raw_xml): solo
+    # se carga al accederlo. Con la política ``compressed`` va en ``raw_xml_gz``.
+    raw_xml: Mapped[Optional[str]] = mapped_column(Text, nullable=True, deferred=True)
+    raw_xml_gz: Mapped[Optional[bytes]] = mapped_column(
+        LargeBinary,
+        nullable=True,
+        deferred=True,
+        comment="XML original sin imágenes comprimido con gzip (RAW_XML_POLICY=compressed)",
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False
     )
@@ -199,6 +219,27 @@ class MessageQueue(Base):
     """
 
     __tablename__ = "messages_queue"
+    __table_args__ = (
+        # Índice parcial que cubre la consulta de candidatos del sender:
+        # filas PENDING/FAILED ordenadas por antigüedad con su ventana de reintento.
+        Index(
+            "ix_messages_queue_sendable",
+            "created_at",
+            "next_retry_at",
+            postgresql_where=text("status IN ('PENDING', 'FAILED')"),
+        ),
+        # Carril de primeros intentos: evita recorrer los reintentos acumulados.
+        Index(
+            "ix_messages_queue_first_attempts",
+            "created_at",
+            postgresql_where=text("status IN ('PENDING', 'FAILED') AND attempts = 0"),
+        ),
+        Index(
+            "ix_messages_queue_sending_lease",
+            "lease_expires_at",
+            postgresql_where=text("status = 'SENDING'"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     reading_id: Mapped[int] = mapped_column(Integer, ForeignKey("alpr_readings.id"), nullable=False)
@@ -217,6 +258,15 @@ class MessageQueue(Base):
     sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     last_sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     next_retry_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    claimed_by: Mapped[Optional[str]] = mapped_column(
+        String(255), nullable=True, comment="Proceso sender (host:pid) que tiene reclamado el mensaje"
+    )
+    claimed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+        comment="Vencimiento de la reclamación; el sender la renueva mientras está vivo",
+    )
 
     reading: Mapped["AlprReading"] = relationship("AlprReading", back_populates="message")
 
@@ -237,3 +287,38 @@ class MessageStatus:
     SUCCESS = "SUCCESS"
     FAILED = "FAILED"
     DEAD = "DEAD"
+
+
+SENDER_CONFIG_MODELS = (Municipality, Certificate, Endpoint, Camera)
+
+
+_CONFIG_CHANGED_KEY = "sender_config_changed"
+
+
+@event.listens_for(Session, "after_flush")
+def _notify_sender_config_change(session: Session, flush_context) -> None:
+    """Avisa al sender cuando se modifican cámaras, municipios, endpoints o certificados.
+
+    Las cachés locales se invalidan en ``after_commit``: si se invalidaran al
+    hacer flush, otra lectura podría volver a cargar los valores antiguos antes
+    del commit, o unos que luego se deshacen con un rollback.
+    """
+
+    if any(
+        isinstance(instance, SENDER_CONFIG_MODELS)
+        for instance in chain(session.new, session.dirty, session.deleted)
+    ):
+        session.info[_CONFIG_CHANGED_KEY] = True
+        notify_config_change(session)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_sender_config_callbacks(session: Session) -> None:
+    if session.info.pop(_CONFIG_CHANGED_KEY, False):
+        run_config_callbacks()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_sender_config_change(session: Session, previous_transaction) -> None:
+    if previous_transaction.parent is None:
+        session.info.pop(_CONFIG_CHANGED_KEY, None)
@@ -13,10 +13,14 @@ def main() -> None:
     timeout_input = input("Timeout (ms, por defecto 5000): ").strip()
     retry_max_input = input("Reintentos máximos (por defecto 3): ").strip()
     retry_backoff_input = input("Backoff (ms, por defecto 1000): ").strip()
+    rate_input = input("Envíos por segundo (vacío = valor por defecto del sender): ").strip()
+    burst_input = input("Ráfaga de envíos (vacío = valor por defecto): ").strip()
 
     timeout_ms = int(timeout_input) if timeout_input else 5000
     retry_max = int(retry_max_input) if retry_max_input else 3
     retry_backoff_ms = int(retry_backoff_input) if retry_backoff_input else 1000
+    rate_limit_per_second = float(rate_input) if rate_input else None
+    rate_limit_burst = int(burst_input) if burst_input else None
 
     session = SessionLocal()
     try:
@@ -26,6 +30,8 @@ def main() -> None:
             timeout_ms=timeout_ms,
             retry_max=retry_max,
             retry_backoff_ms=retry_backoff_ms,
+            rate_limit_per_second=rate_limit_per_second,
+            rate_limit_burst=rate_limit_burst,
         )
         session.add(endpoint)
         session.commit()
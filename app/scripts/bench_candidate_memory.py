@@ -0,0 +1,92 @@
+"""Benchmark de memoria al cargar un lote de candidatos del sender.
+
+Compara la carga de ``MessageQueue`` + ``AlprReading`` con todas las columnas
+(incluido ``raw_xml``, como antes de diferirlo) frente a las opciones de carga
+del sender (``_message_load_options``), que solo seleccionan las columnas que
+usa. Crea una base SQLite temporal con lecturas de ``raw_xml`` simulado.
+
+Uso: python -m app.scripts.bench_candidate_memory [--messages 500] [--xml-kb 300]
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import selectinload, sessionmaker, undefer
+
+from app.models import AlprReading, Base, Camera, MessageQueue, MessageStatus, Municipality
+from app.sender.worker import _message_load_options
+
+
+def _populate(session, messages: int, xml_kb: int) -> None:
+    municipality = Municipality(name="Bench", active=True)
+    session.add(municipality)
+    session.flush()
+    camera = Camera(serial_number="BENCH", codigo_lector="BENCH", municipality_id=municipality.id)
+    session.add(camera)
+    session.flush()
+    images = base64.b64encode(os.urandom(xml_kb * 768)).decode("ascii")
+    raw_xml = f"<ANPR><IMAGE_OCR>{images}</IMAGE_OCR></ANPR>"
+    for index in range(messages):
+        reading = AlprReading(
+            camera_id=camera.id,
+            plate=f"{index:04d}BCD",
+            timestamp_utc=datetime.now(timezone.utc),
+            has_image_ocr=True,
+            image_ocr_path=f"bench/{index}.jpg",
+            raw_xml=raw_xml,
+        )
+        session.add(reading)
+        session.flush()
+        session.add(MessageQueue(reading_id=reading.id, status=MessageStatus.PENDING))
+    session.commit()
+
+
+def _measure(session_factory, options) -> tuple[float, float, float]:
+    session = session_factory()
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        messages = session.query(MessageQueue).options(*options).all()
+        elapsed = time.perf_counter() - started
+        current, peak = tracemalloc.get_traced_memory()
+        assert all(message.reading is not None for message in messages)
+    finally:
+        tracemalloc.stop()
+        session.close()
+    return current / 1024 / 1024, peak / 1024 / 1024, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500, help="Tamaño del lote")
+    parser.add_argument("--xml-kb", type=int, default=300, help="Tamaño aproximado de raw_xml")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db", future=True)
+        Base.metadata.create_all(engine)
+        session_factory = sessionmaker(bind=engine, autoflush=False, future=True)
+        session = session_factory()
+        _populate(session, args.messages, args.xml_kb)
+        session.close()
+
+        full = _measure(
+            session_factory, (selectinload(MessageQueue.reading).options(undefer(AlprReading.raw_xml)),)
+        )
+        sender = _measure(session_factory, _message_load_options())
+        engine.dispose()
+
+    print(f"Lote de {args.messages} mensajes con raw_xml de ~{args.xml_kb} KB")
+    print(f"  con raw_xml     : retenido {full[0]:8.1f} MB  pico {full[1]:8.1f} MB  {full[2] * 1000:7.1f} ms")
+    print(f"  perfil sender   : retenido {sender[0]:8.1f} MB  pico {sender[1]:8.1f} MB  {sender[2] * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Benchmark de lectura de imágenes para el sobre SOAP según IMAGE_STORAGE_MODE.
+
+Compara el coste por envío de ``load_image_base64`` cuando la imagen está
+guardada como JPEG (leer bytes + codificar base64) y cuando la ingesta guardó
+el texto base64 (leer el fichero ``.b64`` tal cual).
+
+Uso: python -m app.scripts.bench_image_storage [--size-kb 150] [--iterations 2000]
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from app.config import settings
+from app.sender.mossos_client import load_image_base64
+
+
+def _measure(path: str, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        load_image_base64(path)
+    return (time.perf_counter() - started) / iterations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-kb", type=int, default=150, help="Tamaño de la imagen simulada")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    image_bytes = os.urandom(args.size_kb * 1024)
+    encoded = base64.b64encode(image_bytes).decode("ascii")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jpeg_path = Path(tmp) / "ocr.jpg"
+        b64_path = Path(tmp) / "ocr.jpg.b64"
+        jpeg_path.write_bytes(image_bytes)
+        b64_path.write_text(encoded, encoding="ascii")
+
+        previous_mode = settings.image_storage_mode
+        settings.image_storage_mode = "jpeg"
+        try:
+            jpeg_seconds = _measure(str(jpeg_path), args.iterations)
+            b64_seconds = _measure(str(b64_path), args.iterations)
+        finally:
+            settings.image_storage_mode = previous_mode
+
+    print(f"Imagen de {args.size_kb} KB, {args.iterations} iteraciones")
+    print(f"  jpeg (leer + b64encode): {jpeg_seconds * 1e6:8.1f} µs/imagen")
+    print(f"  b64  (leer texto)      : {b64_seconds * 1e6:8.1f} µs/imagen")
+    if b64_seconds:
+        print(f"  mejora                 : x{jpeg_seconds / b64_seconds:.2f}")
+
+
+if __name__ == "__main__":
+    main()
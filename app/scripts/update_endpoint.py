@@ -34,6 +34,12 @@ def main() -> None:
         new_timeout = input(f"Timeout ms [{endpoint.timeout_ms}]: ").strip()
         new_retry_max = input(f"Reintentos [{endpoint.retry_max}]: ").strip()
         new_backoff = input(f"Backoff ms [{endpoint.retry_backoff_ms}]: ").strip()
+        new_rate = input(
+            f"Envíos por segundo ('-' = valor por defecto) [{endpoint.rate_limit_per_second or '-'}]: "
+        ).strip()
+        new_burst = input(
+            f"Ráfaga de envíos ('-' = valor por defecto) [{endpoint.rate_limit_burst or '-'}]: "
+        ).strip()
 
         if new_name:
             endpoint.name = new_name
@@ -57,6 +63,18 @@ def main() -> None:
             except ValueError:
                 print("[UPDATE ENDPOINT][ERROR] backoff debe ser numérico.")
                 return
+        if new_rate:
+            try:
+                endpoint.rate_limit_per_second = None if new_rate == "-" else float(new_rate)
+            except ValueError:
+                print("[UPDATE ENDPOINT][ERROR] Envíos por segundo debe ser numérico.")
+                return
+        if new_burst:
+            try:
+                endpoint.rate_limit_burst = None if new_burst == "-" else int(new_burst)
+            except ValueError:
+                print("[UPDATE ENDPOINT][ERROR] Ráfaga debe ser numérica.")
+                return
 
         session.add(endpoint)
         session.commit()
@@ -0,0 +1,172 @@
+"""Perfil de envío resuelto por cámara.
+
+Para cada mensaje el sender resolvía de nuevo el endpoint efectivo (cámara o
+municipio), el certificado y sus rutas, el timeout, la política de reintentos,
+el límite de tasa y las coordenadas, y cargaba cámara, municipio, endpoint y
+certificado en cada lote. Esos datos solo cambian cuando se edita la
+configuración, así que ``CameraProfileCache`` guarda un ``CameraSendProfile``
+por ``camera_id`` ya resuelto.
+
+La caché se invalida entera cuando cambia la configuración:
+
+* en el propio proceso, al hacer flush de cámaras, municipios, endpoints o
+  certificados (ver ``app.models``);
+* en otros procesos (scripts y CLI de administración), con el ``NOTIFY`` de
+  ``CONFIG_CHANNEL`` que recibe el ``QueueListener`` del sender;
+* como respaldo, cada perfil caduca tras ``SENDER_PROFILE_CACHE_TTL_SECONDS``.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Hashable, Optional
+
+from sqlalchemy.orm import Session, selectinload
+
+from app.config import settings
+from app.models import Camera, Municipality
+from app.sender.mossos_client import camera_coordinates
+from app.utils.notify import on_config_change
+
+
+def _resolve_retry_config(endpoint) -> tuple[int, int]:
+    retry_max = getattr(endpoint, "retry_max", None) or settings.sender_default_retry_max
+    backoff_ms = getattr(endpoint, "retry_backoff_ms", None) or settings.sender_default_backoff_ms
+    return int(retry_max), int(backoff_ms)
+
+
+def _resolve_rate_limit(endpoint) -> tuple[float, int]:
+    rate = getattr(endpoint, "rate_limit_per_second", None)
+    if rate is None:
+        rate = settings.sender_default_rate_limit_per_second
+    burst = getattr(endpoint, "rate_limit_burst", None) or settings.sender_default_rate_limit_burst
+    return float(rate), int(burst)
+
+
+@dataclass(frozen=True)
+class CameraSendProfile:
+    """Configuración de envío de una cámara, resuelta una sola vez."""
+
+    camera_id: int
+    serial_number: str
+    codigo_lector: str
+    coord_x: Optional[str]
+    coord_y: Optional[str]
+    municipality_name: Optional[str]
+    endpoint_key: Hashable
+    service_url: Optional[str]
+    timeout_seconds: float
+    retry_max: int
+    backoff_ms: int
+    rate_per_second: float
+    rate_burst: int
+    cert_path: Optional[str]
+    key_path: Optional[str]
+    has_municipality: bool
+    has_certificate: bool
+
+    @classmethod
+    def from_camera(cls, camera: Camera) -> "CameraSendProfile":
+        municipality = camera.municipality
+        endpoint = camera.endpoint or (municipality.endpoint if municipality else None)
+        certificate = municipality.certificate if municipality else None
+        service_url = endpoint.url if endpoint else settings.MOSSOS_ENDPOINT_URL
+        timeout_ms = (
+            endpoint.timeout_ms
+            if getattr(endpoint, "timeout_ms", None)
+            else int(settings.mossos_timeout * 1000)
+        )
+        retry_max, backoff_ms = _resolve_retry_config(endpoint)
+        rate_per_second, rate_burst = _resolve_rate_limit(endpoint)
+        coord_x, coord_y = camera_coordinates(camera)
+        return cls(
+            camera_id=camera.id,
+            serial_number=camera.serial_number,
+            codigo_lector=camera.codigo_lector,
+            coord_x=coord_x,
+            coord_y=coord_y,
+            municipality_name=municipality.name if municipality else None,
+            endpoint_key=endpoint.id if endpoint is not None else service_url,
+            service_url=service_url,
+            timeout_seconds=max(timeout_ms / 1000.0, 1.0),
+            retry_max=retry_max,
+            backoff_ms=backoff_ms,
+            rate_per_second=rate_per_second,
+            rate_burst=rate_burst,
+            cert_path=(getattr(certificate, "client_cert_path", None) or certificate.path)
+            if certificate
+            else None,
+            key_path=certificate.key_path if certificate else None,
+            has_municipality=municipality is not None,
+            has_certificate=certificate is not None,
+        )
+
+
+def _load_camera(session: Session, camera_id: int) -> Optional[Camera]:
+    return (
+        session.query(Camera)
+        .options(
+            selectinload(Camera.endpoint),
+            selectinload(Camera.municipality).selectinload(Municipality.endpoint),
+            selectinload(Camera.municipality).selectinload(Municipality.certificate),
+        )
+        .filter(Camera.id == camera_id)
+        .one_or_none()
+    )
+
+
+class CameraProfileCache:
+    """Perfiles de envío por ``camera_id`` con caducidad e invalidación global."""
+
+    def __init__(
+        self, *, ttl_seconds: float, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.ttl_seconds = max(float(ttl_seconds), 0.0)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._profiles: dict[int, tuple[CameraSendProfile, float]] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session: Session, camera_id: Optional[int]) -> Optional[CameraSendProfile]:
+        """Devuelve el perfil de la cámara o ``None`` si no existe."""
+
+        if camera_id is None:
+            return None
+        now = self._clock()
+        with self._lock:
+            cached = self._profiles.get(camera_id)
+            if cached is not None:
+                profile, loaded_at = cached
+                if not self.ttl_seconds or now - loaded_at < self.ttl_seconds:
+                    self.hits += 1
+                    return profile
+            generation = self._generation
+            self.misses += 1
+
+        camera = _load_camera(session, camera_id)
+        if camera is None:
+            return None
+        profile = CameraSendProfile.from_camera(camera)
+        with self._lock:
+            # Si se invalidó mientras se cargaba, el perfil no se guarda.
+            if generation == self._generation:
+                self._profiles[camera_id] = (profile, now)
+        return profile
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._profiles.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"size": len(self._profiles), "hits": self.hits, "misses": self.misses}
+
+
+camera_profiles = CameraProfileCache(ttl_seconds=settings.sender_profile_cache_ttl_seconds)
+on_config_change(camera_profiles.invalidate)
+
+__all__ = ["CameraProfileCache", "CameraSendProfile", "camera_profiles"]
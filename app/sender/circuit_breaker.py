@@ -0,0 +1,145 @@
+"""Circuit breaker por endpoint para el sender.
+
+Cuando un endpoint de Mossos encadena fallos de transporte (timeouts,
+conexiones rechazadas, HTTP 5xx) el circuito se abre y el sender deja de
+enviarle mensajes durante ``reset_seconds``. Pasado ese tiempo se permite una
+única petición de prueba (half-open): si tiene éxito el circuito se cierra y,
+si falla, vuelve a abrirse.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Hashable
+
+from app.config import settings
+from app.logger import logger
+
+# Espera mínima para reencolar mientras la prueba half-open está en curso.
+HALF_OPEN_RETRY_SECONDS = 1.0
+
+
+class CircuitBreaker:
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        failure_threshold: int,
+        reset_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = int(failure_threshold)
+        self.reset_seconds = max(float(reset_seconds), 0.0)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_threshold > 0
+
+    def allow_request(self) -> bool:
+        """Indica si se puede enviar; en half-open solo deja pasar una prueba."""
+
+        if not self.enabled:
+            return True
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if self._clock() - self._opened_at < self.reset_seconds:
+                    return False
+                self.state = self.HALF_OPEN
+                logger.info("[SENDER] Circuito %s en HALF_OPEN: se envía una petición de prueba", self.name)
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("[SENDER] Circuito %s cerrado: el endpoint vuelve a responder", self.name)
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(
+                        "[SENDER] Circuito %s abierto tras %s fallos de transporte consecutivos; "
+                        "envíos pausados %ss",
+                        self.name,
+                        self.consecutive_failures,
+                        self.reset_seconds,
+                    )
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+
+    def cancel_probe(self) -> None:
+        """Libera la prueba half-open si finalmente no se llegó a enviar."""
+
+        with self._lock:
+            self._probe_in_flight = False
+
+    def retry_after(self) -> float:
+        """Segundos que faltan para que el circuito admita una prueba.
+
+        En half-open, con la prueba ya en curso, se devuelve una espera mínima
+        para que los mensajes reencolados no se reclamen en bucle.
+        """
+
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                return HALF_OPEN_RETRY_SECONDS
+            if self.state != self.OPEN:
+                return 0.0
+            return max(self.reset_seconds - (self._clock() - self._opened_at), 0.0)
+
+
+class CircuitBreakerRegistry:
+    """Mantiene un ``CircuitBreaker`` por endpoint."""
+
+    def __init__(self, *, failure_threshold: int, reset_seconds: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._breakers: dict[Hashable, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, name: str | None = None) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    name=name or str(key),
+                    failure_threshold=self.failure_threshold,
+                    reset_seconds=self.reset_seconds,
+                )
+                self._breakers[key] = breaker
+            return breaker
+
+    def states(self) -> dict[str, str]:
+        with self._lock:
+            return {breaker.name: breaker.state for breaker in self._breakers.values()}
+
+
+circuit_breakers = CircuitBreakerRegistry(
+    failure_threshold=settings.sender_breaker_failure_threshold,
+    reset_seconds=settings.sender_breaker_reset_seconds,
+)
+
+__all__ = ["CircuitBreaker", "CircuitBreakerRegistry", "circuit_breakers"]
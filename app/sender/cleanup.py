@@ -1,6 +1,79 @@
 """Helper para limpiar imágenes asociadas a lecturas enviadas."""
 from __future__ import annotations
 
-from app.utils.cleanup import delete_reading_images
+import queue
+import threading
+from typing import Iterable, Optional
 
-__all__ = ["delete_reading_images"]
+from app.logger import logger
+from app.utils.cleanup import delete_image_paths, delete_reading_images
+
+# Espera máxima para vaciar la cola de borrado al parar el proceso.
+SHUTDOWN_DRAIN_SECONDS = 30.0
+
+
+class ImageDeletionQueue:
+    """Cola de borrado de imágenes atendida por un hilo en segundo plano.
+
+    El sender encola aquí las rutas de las lecturas ya eliminadas de la base de
+    datos para no esperar al sistema de ficheros dentro del bucle de envío.
+    """
+
+    def __init__(self) -> None:
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.deleted = 0
+
+    def submit(self, paths: Iterable[Optional[str]]) -> None:
+        pending = [path for path in paths if path]
+        if not pending:
+            return
+        self._ensure_thread()
+        for path in pending:
+            self._queue.put(path)
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="image-deleter", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            path = self._queue.get()
+            try:
+                self.deleted += delete_image_paths((path,))
+            except Exception:  # pragma: no cover - defensivo
+                logger.exception("[CLEANUP] Error inesperado borrando imagen %s", path)
+            finally:
+                self._queue.task_done()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que se hayan procesado todas las rutas encoladas.
+
+        Con ``timeout`` espera como mucho esos segundos. Devuelve ``False``
+        si quedan rutas pendientes.
+        """
+
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(
+                lambda: not self._queue.unfinished_tasks, timeout
+            )
+
+    def drain(self, timeout: float = SHUTDOWN_DRAIN_SECONDS) -> None:
+        """Vacía la cola antes de salir del proceso; avisa si no da tiempo."""
+
+        if not self.join(timeout):
+            logger.warning(
+                "[CLEANUP] Quedan %s imágenes sin borrar tras esperar %.0fs",
+                self._queue.unfinished_tasks,
+                timeout,
+            )
+
+
+image_deletion_queue = ImageDeletionQueue()
+
+__all__ = ["ImageDeletionQueue", "delete_reading_images", "image_deletion_queue"]
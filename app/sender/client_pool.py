@@ -0,0 +1,207 @@
+"""Pool de clientes ``MossosZeepClient`` reutilizables entre mensajes.
+
+Construir un cliente implica descargar y parsear el WSDL, abrir una
+``requests.Session`` y cargar certificado y clave. El pool conserva los
+clientes ya construidos, indexados por la combinación de WSDL, endpoint,
+certificado, clave y timeout, y los reconstruye cuando cambian los ficheros
+PEM en disco.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, NamedTuple, Optional
+
+from app.config import settings
+from app.logger import logger
+from app.sender.mossos_client import MossosZeepClient
+from app.sender.template_client import MossosTemplateClient
+
+SOAP_TRANSPORTS: dict[str, Callable[..., MossosZeepClient]] = {
+    "zeep": MossosZeepClient,
+    "template": MossosTemplateClient,
+}
+
+
+class ClientKey(NamedTuple):
+    wsdl_url: str
+    endpoint_url: str
+    cert_path: str
+    key_path: str
+    timeout: float
+
+
+@dataclass
+class _PoolEntry:
+    client: MossosZeepClient
+    cert_mtime: int
+    key_mtime: int
+    last_used: float
+
+
+def _file_mtime(path: str, error: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"{error}: {path}") from None
+
+
+class MossosClientPool:
+    """Caché LRU de clientes SOAP con expiración por inactividad."""
+
+    def __init__(
+        self,
+        *,
+        max_size: int,
+        idle_seconds: float,
+        factory: Callable[..., MossosZeepClient] = MossosZeepClient,
+    ) -> None:
+        self.max_size = max(int(max_size), 1)
+        self.idle_seconds = max(float(idle_seconds), 0.0)
+        self._factory = factory
+        self._entries: "OrderedDict[ClientKey, _PoolEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: dict[ClientKey, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.evictions = 0
+
+    def get(
+        self,
+        *,
+        wsdl_url: str,
+        endpoint_url: str,
+        cert_path: str,
+        key_path: str,
+        timeout: float,
+    ) -> MossosZeepClient:
+        """Devuelve un cliente para la clave dada, construyéndolo si hace falta.
+
+        Lanza ``FileNotFoundError`` si el certificado o la clave no existen,
+        igual que el constructor de ``MossosZeepClient``.
+        """
+
+        key = ClientKey(wsdl_url, endpoint_url, cert_path, key_path, float(timeout))
+        cert_mtime = _file_mtime(cert_path, "Certificado cliente no encontrado")
+        key_mtime = _file_mtime(key_path, "Clave privada no encontrada")
+        now = time.monotonic()
+
+        client = self._lookup(key, cert_mtime, key_mtime, now)
+        if client is not None:
+            return client
+
+        # La construcción (WSDL, certificado) se hace fuera del lock global para
+        # no bloquear al resto de municipios; el lock por clave evita que dos
+        # hilos construyan a la vez el mismo cliente.
+        with self._key_lock(key):
+            client = self._lookup(key, cert_mtime, key_mtime, now, count_miss=False)
+            if client is not None:
+                return client
+            client = self._factory(
+                wsdl_url=wsdl_url,
+                endpoint_url=endpoint_url,
+                cert_path=cert_path,
+                key_path=key_path,
+                timeout=timeout,
+            )
+            with self._lock:
+                self._entries[key] = _PoolEntry(client, cert_mtime, key_mtime, now)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    evicted_key, _ = self._entries.popitem(last=False)
+                    self.evictions += 1
+                    logger.debug(
+                        "[SENDER][DEBUG] Cliente SOAP expulsado del pool por LRU (%s)",
+                        evicted_key.endpoint_url,
+                    )
+                self._key_locks.pop(key, None)
+            return client
+
+    def _key_lock(self, key: ClientKey) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _lookup(
+        self,
+        key: ClientKey,
+        cert_mtime: int,
+        key_mtime: int,
+        now: float,
+        *,
+        count_miss: bool = True,
+    ) -> Optional[MossosZeepClient]:
+        """Devuelve el cliente vigente para ``key`` o ``None`` si hay que construirlo."""
+
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.cert_mtime == cert_mtime and entry.key_mtime == key_mtime:
+                    entry.last_used = now
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.client
+                logger.info(
+                    "[SENDER] Certificado o clave modificados; se reconstruye el cliente SOAP (%s)",
+                    key.endpoint_url,
+                )
+                del self._entries[key]
+                self.rebuilds += 1
+            if count_miss:
+                self.misses += 1
+            return None
+
+    def _evict_idle(self, now: float) -> None:
+        if not self.idle_seconds:
+            return
+        expired = [
+            key
+            for key, entry in self._entries.items()
+            if now - entry.last_used > self.idle_seconds
+        ]
+        for key in expired:
+            del self._entries[key]
+            self.evictions += 1
+            logger.debug(
+                "[SENDER][DEBUG] Cliente SOAP expulsado del pool por inactividad (%s)",
+                key.endpoint_url,
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "rebuilds": self.rebuilds,
+                "evictions": self.evictions,
+            }
+
+
+def client_factory(transport: str) -> Callable[..., MossosZeepClient]:
+    """Devuelve la clase de cliente para ``SENDER_SOAP_TRANSPORT``."""
+
+    factory = SOAP_TRANSPORTS.get((transport or "").strip().lower())
+    if factory is None:
+        logger.warning(
+            "[SENDER] SENDER_SOAP_TRANSPORT=%r no reconocido; se usa 'zeep'", transport
+        )
+        return MossosZeepClient
+    return factory
+
+
+client_pool = MossosClientPool(
+    max_size=settings.sender_client_pool_size,
+    idle_seconds=settings.sender_client_idle_seconds,
+    factory=client_factory(settings.sender_soap_transport),
+)
+
+__all__ = ["ClientKey", "MossosClientPool", "SOAP_TRANSPORTS", "client_factory", "client_pool"]
@@ -0,0 +1,164 @@
+"""Sesiones HTTP compartidas por host para el transporte SOAP.
+
+Cada ``MossosZeepClient`` (uno por combinación de endpoint y certificado)
+creaba su propia ``requests.Session``, así que los municipios que envían al
+mismo host de la extranet no compartían conexiones y cada cliente nuevo
+pagaba su propio handshake TCP + TLS. La firma WS-Security va en el sobre y no
+en la conexión (no hay certificado de cliente TLS), de modo que todas las
+peticiones a un mismo host pueden reutilizar una única sesión.
+
+``HttpSessionRegistry`` mantiene una sesión por ``esquema://host:puerto`` con
+un ``HTTPAdapter`` dimensionado (``SENDER_HTTP_POOL_MAXSIZE``) y keep-alive
+TCP, y cuenta las conexiones abiertas frente a las peticiones servidas para ver
+cuántos handshakes se ahorran. El ahorro viene de reutilizar conexiones vivas:
+urllib3 no expone la reanudación de sesiones TLS en conexiones nuevas.
+"""
+from __future__ import annotations
+
+import socket
+import threading
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from app.config import settings
+from app.logger import logger
+
+KEEPALIVE_SOCKET_OPTIONS = HTTPConnection.default_socket_options + [
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+]
+
+
+class ConnectionStats:
+    """Conexiones abiertas y peticiones enviadas por host."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._opened: dict[str, int] = defaultdict(int)
+        self._requests: dict[str, int] = defaultdict(int)
+
+    def connection_opened(self, host: str) -> None:
+        with self._lock:
+            self._opened[host] += 1
+
+    def request_sent(self, host: str) -> None:
+        with self._lock:
+            self._requests[host] += 1
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            return {
+                host: {
+                    "requests": self._requests[host],
+                    "opened": self._opened[host],
+                    "reused": max(self._requests[host] - self._opened[host], 0),
+                }
+                for host in sorted(set(self._opened) | set(self._requests))
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._opened.clear()
+            self._requests.clear()
+
+
+connection_stats = ConnectionStats()
+
+
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self) -> None:
+        connection_stats.connection_opened(self.host)
+        super().connect()
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    # connect() también se llama al reabrir una conexión que el servidor cerró.
+    def connect(self) -> None:
+        connection_stats.connection_opened(self.host)
+        super().connect()
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """``HTTPAdapter`` con keep-alive TCP que cuenta conexiones y peticiones."""
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs.setdefault("socket_options", KEEPALIVE_SOCKET_OPTIONS)
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, *args, **kwargs):
+        connection_stats.request_sent(urlsplit(request.url).hostname or "")
+        return super().send(request, *args, **kwargs)
+
+
+def _host_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+class HttpSessionRegistry:
+    """Una ``requests.Session`` compartida por host de destino."""
+
+    def __init__(self, *, pool_connections: int, pool_maxsize: int) -> None:
+        self.pool_connections = max(int(pool_connections), 1)
+        self.pool_maxsize = max(int(pool_maxsize), 1)
+        self._sessions: dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> requests.Session:
+        key = _host_key(url)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                session.verify = True
+                adapter = PooledHTTPAdapter(
+                    pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[key] = session
+                logger.debug(
+                    "[SENDER][DEBUG] Sesión HTTP compartida creada para %s (pool_maxsize=%s)",
+                    key,
+                    self.pool_maxsize,
+                )
+            return session
+
+    def close(self) -> None:
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            session.close()
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return connection_stats.snapshot()
+
+
+http_sessions = HttpSessionRegistry(
+    pool_connections=settings.sender_http_pool_connections,
+    pool_maxsize=settings.sender_http_pool_maxsize,
+)
+
+__all__ = [
+    "ConnectionStats",
+    "HttpSessionRegistry",
+    "PooledHTTPAdapter",
+    "connection_stats",
+    "http_sessions",
+]
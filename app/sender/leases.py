@@ -0,0 +1,235 @@
+"""Leases de los mensajes en ``SENDING``.
+
+Al reclamar un lote, cada mensaje recibe ``lease_expires_at``. Mientras el
+proceso sender está vivo, ``LeaseKeeper`` renueva en segundo plano, cada
+tercio de su duración, las leases de los mensajes que tiene en curso: los
+reclamados cuya transición aún no se ha guardado. Los que una iteración no
+llega a procesar (error o parada) se devuelven a ``PENDING`` con
+``release_claims`` y, si eso falla, dejan de renovarse y se recuperan al
+vencer su lease.
+
+Si el proceso cae, las leases dejan de renovarse y ``recover_expired_leases``
+devuelve sus mensajes a la cola con ``UPDATE`` por tramos en cuanto vencen:
+segundos en lugar de los minutos de ``SENDER_STUCK_TIMEOUT_SECONDS``.
+
+La duración de la lease es ``SENDER_LEASE_SECONDS`` o, si es mayor, el doble
+del timeout SOAP más largo visto por el proceso, para que una petición lenta
+pero viva nunca pierda su lease aunque se retrase una renovación.
+``SENDER_STUCK_TIMEOUT_SECONDS`` solo se aplica a filas en ``SENDING`` sin
+lease (reclamadas por versiones anteriores del sender).
+"""
+from __future__ import annotations
+
+import os
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.logger import logger
+from app.models import MessageQueue, MessageStatus, SessionLocal
+from app.utils.sql import id_in
+
+
+def worker_identity() -> str:
+    """Identificador del proceso sender que reclama mensajes (``host:pid``)."""
+
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _expired_lease_filters(now: datetime) -> tuple:
+    stuck_threshold = now - timedelta(seconds=max(settings.sender_stuck_timeout_seconds, 1))
+    return (
+        MessageQueue.status == MessageStatus.SENDING,
+        or_(
+            MessageQueue.lease_expires_at < now,
+            and_(
+                MessageQueue.lease_expires_at.is_(None),
+                MessageQueue.updated_at <= stuck_threshold,
+            ),
+        ),
+    )
+
+
+def recover_expired_leases(session: Session, now: datetime, *, limit: Optional[int] = None) -> int:
+    """Devuelve a ``FAILED`` los mensajes en ``SENDING`` con la lease vencida.
+
+    Con ``limit`` recupera como mucho ese número de mensajes en la sentencia,
+    para que el mantenimiento trabaje por tramos cortos.
+    """
+
+    filters = _expired_lease_filters(now)
+    if limit is not None:
+        filters = (
+            MessageQueue.id.in_(
+                select(MessageQueue.id).where(*filters).order_by(MessageQueue.id).limit(limit)
+            ),
+        )
+    result = session.execute(
+        update(MessageQueue)
+        .where(*filters)
+        .values(
+            status=MessageStatus.FAILED,
+            next_retry_at=None,
+            last_error="SENDING_TIMEOUT_RECOVERED",
+            claimed_by=None,
+            claimed_at=None,
+            lease_expires_at=None,
+            updated_at=now,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    recovered = result.rowcount or 0
+    if recovered:
+        logger.warning("[SENDER] Recuperados %s mensajes en SENDING con la lease vencida", recovered)
+    return recovered
+
+
+def renew_leases(
+    session: Session, worker_id: str, expires_at: datetime, message_ids: Iterable[int]
+) -> int:
+    """Alarga hasta ``expires_at`` las leases de ``message_ids`` reclamados por ``worker_id``."""
+
+    message_ids = list(message_ids)
+    if not message_ids:
+        return 0
+    result = session.execute(
+        update(MessageQueue)
+        .where(
+            id_in(session, MessageQueue.id, message_ids),
+            MessageQueue.status == MessageStatus.SENDING,
+            MessageQueue.claimed_by == worker_id,
+            or_(MessageQueue.lease_expires_at.is_(None), MessageQueue.lease_expires_at < expires_at),
+        )
+        .values(lease_expires_at=expires_at)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount or 0
+
+
+def release_claims(
+    session: Session, worker_id: str, message_ids: Iterable[int], now: datetime
+) -> int:
+    """Devuelve a ``PENDING`` mensajes reclamados por ``worker_id`` que no se procesaron."""
+
+    message_ids = list(message_ids)
+    if not message_ids:
+        return 0
+    result = session.execute(
+        update(MessageQueue)
+        .where(
+            id_in(session, MessageQueue.id, message_ids),
+            MessageQueue.status == MessageStatus.SENDING,
+            MessageQueue.claimed_by == worker_id,
+        )
+        .values(
+            status=MessageStatus.PENDING,
+            claimed_by=None,
+            claimed_at=None,
+            lease_expires_at=None,
+            updated_at=now,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount or 0
+
+
+class LeaseKeeper:
+    """Renueva periódicamente las leases del proceso sender actual."""
+
+    def __init__(
+        self,
+        *,
+        base_seconds: float,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ) -> None:
+        self.base_seconds = max(float(base_seconds), 1.0)
+        self._session_factory = session_factory
+        self._longest_timeout = 0.0
+        self._worker_id: Optional[str] = None
+        self._lock = threading.Lock()
+        self._in_flight: set[int] = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def lease_seconds(self) -> float:
+        return max(self.base_seconds, self._longest_timeout * 2)
+
+    def observe_timeout(self, timeout_seconds: float) -> None:
+        """Registra el timeout SOAP de un endpoint para dimensionar la lease."""
+
+        if timeout_seconds > self._longest_timeout:
+            self._longest_timeout = float(timeout_seconds)
+
+    def expires_at(self, now: datetime) -> datetime:
+        return now + timedelta(seconds=self.lease_seconds)
+
+    def track(self, message_ids: Iterable[int]) -> None:
+        """Marca como en curso mensajes recién reclamados."""
+
+        with self._lock:
+            self._in_flight.update(message_ids)
+
+    def untrack(self, message_ids: Iterable[int]) -> None:
+        """Deja de renovar mensajes cuya transición ya se guardó o se liberaron."""
+
+        with self._lock:
+            self._in_flight.difference_update(message_ids)
+
+    @property
+    def in_flight(self) -> list[int]:
+        with self._lock:
+            return sorted(self._in_flight)
+
+    def renew(self, now: datetime) -> int:
+        message_ids = self.in_flight
+        if self._worker_id is None or not message_ids:
+            return 0
+        session = self._session_factory()
+        try:
+            return renew_leases(session, self._worker_id, self.expires_at(now), message_ids)
+        finally:
+            session.close()
+
+    def start(self, worker_id: str) -> None:
+        self._worker_id = worker_id
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                renewed = self.renew(datetime.now(timezone.utc))
+                if renewed:
+                    logger.debug("[SENDER][DEBUG] Leases renovadas: %s mensajes", renewed)
+            except Exception as exc:
+                logger.warning("[SENDER] No se pudieron renovar las leases: %s", exc)
+
+    def stop(self) -> None:
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+
+
+lease_keeper = LeaseKeeper(base_seconds=settings.sender_lease_seconds)
+
+__all__ = [
+    "LeaseKeeper",
+    "lease_keeper",
+    "recover_expired_leases",
+    "release_claims",
+    "renew_leases",
+    "worker_identity",
+]
@@ -1,11 +1,30 @@
 """Punto de entrada ejecutable para el sender worker."""
 from __future__ import annotations
 
+import argparse
+from typing import Optional
+
 from app.logger import logger  # noqa: F401 - inicializa configuración global
+from app.sender.supervisor import ShardSupervisor
 from app.sender.worker import run_sender_worker
 
 
-def main() -> None:
+def _parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Worker de envío a Mossos")
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Lanza N procesos sender repartidos por municipio y los supervisa",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    args = _parse_args(argv)
+    if args.shards > 1:
+        ShardSupervisor(args.shards).run()
+        return
     run_sender_worker()
 
 
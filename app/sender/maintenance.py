@@ -0,0 +1,244 @@
+"""Mantenimiento de la cola fuera del bucle de envío.
+
+Antes, cada iteración del sender recuperaba los mensajes atascados en
+``SENDING`` y purgaba los ``DEAD`` caducados cargando objetos ORM y borrando sus
+imágenes en línea, de modo que una purga grande retrasaba los envíos.
+``run_maintenance`` hace ese trabajo con sentencias ``UPDATE``/``DELETE`` por
+tramos de ``SENDER_MAINTENANCE_CHUNK_SIZE`` filas, confirmando cada tramo, y
+se detiene al agotar ``SENDER_MAINTENANCE_BUDGET_SECONDS``; lo pendiente queda
+para la siguiente pasada. Las imágenes de las lecturas purgadas se borran en
+segundo plano con ``image_deletion_queue``.
+
+En PostgreSQL cada pasada toma un advisory lock de sesión, así que con varios
+procesos sender solo uno hace el mantenimiento a la vez. El sender lo ejecuta
+en un hilo (``MaintenanceScheduler``) cada ``SENDER_MAINTENANCE_INTERVAL_SECONDS``;
+con ``SENDER_MAINTENANCE_ENABLED=false`` puede ejecutarse aparte con
+``python -m app.sender.maintenance``.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterator, Optional
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.logger import logger
+from app.models import AlprReading, MessageQueue, MessageStatus, engine
+from app.sender.cleanup import image_deletion_queue
+from app.sender.leases import recover_expired_leases
+
+# Clave del advisory lock de PostgreSQL ("SNDM" en ASCII).
+MAINTENANCE_LOCK_KEY = 0x534E444D
+
+
+@dataclass
+class MaintenanceResult:
+    ran: bool
+    recovered: int = 0
+    purged: int = 0
+    pending: bool = False
+
+
+def purge_expired_dead(session: Session, now: datetime, *, limit: int) -> tuple[int, list[str]]:
+    """Borra hasta ``limit`` mensajes ``DEAD`` caducados y sus lecturas.
+
+    Devuelve cuántos mensajes se borraron y las rutas de imagen que quedan por
+    eliminar del disco.
+    """
+
+    threshold = now - timedelta(minutes=max(settings.sender_dead_retention_minutes, 1))
+    rows = session.execute(
+        select(
+            MessageQueue.id,
+            MessageQueue.reading_id,
+            AlprReading.image_ocr_path,
+            AlprReading.image_ctx_path,
+        )
+        .outerjoin(AlprReading, AlprReading.id == MessageQueue.reading_id)
+        .where(MessageQueue.status == MessageStatus.DEAD, MessageQueue.updated_at <= threshold)
+        .order_by(MessageQueue.id)
+        .limit(limit)
+    ).all()
+    if not rows:
+        return 0, []
+
+    session.execute(
+        delete(MessageQueue)
+        .where(MessageQueue.id.in_([row.id for row in rows]))
+        .execution_options(synchronize_session=False)
+    )
+    session.execute(
+        delete(AlprReading)
+        .where(AlprReading.id.in_([row.reading_id for row in rows]))
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    paths = [path for row in rows for path in (row.image_ocr_path, row.image_ctx_path) if path]
+    return len(rows), paths
+
+
+@contextmanager
+def _maintenance_connection(bind: Engine) -> Iterator[Optional[Connection]]:
+    """Conexión con el advisory lock de mantenimiento, o ``None`` si lo tiene otro."""
+
+    with bind.connect() as connection:
+        if connection.dialect.name != "postgresql":
+            yield connection
+            return
+        acquired = connection.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY}
+        ).scalar()
+        connection.commit()
+        if not acquired:
+            yield None
+            return
+        try:
+            yield connection
+        finally:
+            try:
+                connection.rollback()
+                connection.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": MAINTENANCE_LOCK_KEY}
+                )
+                connection.commit()
+            except Exception:
+                # Al descartar la conexión PostgreSQL libera el lock.
+                connection.invalidate()
+                raise
+
+
+def run_maintenance(
+    *,
+    bind: Engine = engine,
+    chunk_size: Optional[int] = None,
+    budget_seconds: Optional[float] = None,
+    clock: Callable[[], float] = time.monotonic,
+) -> MaintenanceResult:
+    """Ejecuta una pasada de mantenimiento limitada por tiempo."""
+
+    chunk_size = max(int(chunk_size or settings.sender_maintenance_chunk_size), 1)
+    if budget_seconds is None:
+        budget_seconds = settings.sender_maintenance_budget_seconds
+    deadline = clock() + max(float(budget_seconds), 0.0)
+
+    with _maintenance_connection(bind) as connection:
+        if connection is None:
+            logger.debug("[SENDER][DEBUG] Mantenimiento en curso en otra instancia; se omite")
+            return MaintenanceResult(ran=False)
+        result = MaintenanceResult(ran=True)
+        session = Session(bind=connection, autoflush=False)
+        try:
+            while True:
+                recovered = recover_expired_leases(
+                    session, datetime.now(timezone.utc), limit=chunk_size
+                )
+                result.recovered += recovered
+                if recovered < chunk_size:
+                    break
+                if clock() >= deadline:
+                    result.pending = True
+                    return result
+            while True:
+                purged, paths = purge_expired_dead(
+                    session, datetime.now(timezone.utc), limit=chunk_size
+                )
+                result.purged += purged
+                image_deletion_queue.submit(paths)
+                if purged < chunk_size:
+                    break
+                if clock() >= deadline:
+                    result.pending = True
+                    break
+        finally:
+            session.close()
+            if result.purged:
+                logger.info(
+                    "[SENDER] Eliminados %s mensajes DEAD con antigüedad > %s min",
+                    result.purged,
+                    max(settings.sender_dead_retention_minutes, 1),
+                )
+    return result
+
+
+class MaintenanceScheduler:
+    """Ejecuta ``run_maintenance`` periódicamente en un hilo aparte."""
+
+    def __init__(
+        self,
+        *,
+        interval_seconds: float,
+        run: Callable[[], MaintenanceResult] = run_maintenance,
+    ) -> None:
+        self.interval_seconds = max(float(interval_seconds), 0.1)
+        self._run_once = run
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_forever(self) -> None:
+        wait = 0.0
+        while not self._stop.wait(wait):
+            wait = self.interval_seconds
+            try:
+                result = self._run_once()
+            except Exception as exc:
+                logger.warning("[SENDER] Error en el mantenimiento de la cola: %s", exc)
+                continue
+            if result.pending:
+                # Queda trabajo: se sigue enseguida, pero dejando respirar a la BD.
+                wait = min(self.interval_seconds, 1.0)
+                logger.debug(
+                    "[SENDER][DEBUG] Mantenimiento sin terminar (recuperados=%s purgados=%s)",
+                    result.recovered,
+                    result.purged,
+                )
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run_forever, name="queue-maintenance", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+
+
+maintenance_scheduler = MaintenanceScheduler(
+    interval_seconds=settings.sender_maintenance_interval_seconds
+)
+
+
+def main() -> None:
+    logger.info(
+        "[SENDER] Mantenimiento de la cola iniciado. Intervalo=%ss",
+        settings.sender_maintenance_interval_seconds,
+    )
+    try:
+        maintenance_scheduler.run_forever()
+    finally:
+        image_deletion_queue.drain()
+
+
+__all__ = [
+    "MaintenanceResult",
+    "MaintenanceScheduler",
+    "maintenance_scheduler",
+    "purge_expired_dead",
+    "run_maintenance",
+]
+
+
+if __name__ == "__main__":
+    main()
@@ -5,20 +5,27 @@ import base64
 import os
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Optional
+from typing import NamedTuple, Optional, Union
 
 import requests
 from zeep import Client, Settings
 from zeep.exceptions import Fault, TransportError
 from zeep.helpers import serialize_object
 from zeep.plugins import Plugin
-from zeep.transports import Transport
 
+from app.config import settings
+from app.sender.http_sessions import http_sessions
+from app.sender.wsdl_cache import build_transport
 from app.sender.wsse import TimestampedBinarySignature
 
 from app.logger import logger
 from app.models import AlprReading, Camera
-from app.utils.images import resolve_image_path
+from app.utils.images import (
+    BASE64_STORAGE_MODES,
+    BASE64_SUFFIX,
+    base64_sidecar,
+    resolve_image_path,
+)
 
 MATRICULA_NS = "http://dgp.gencat.cat/matricules"
 BINDING_QNAME = "{http://dgp.gencat.cat/matricules}MatriculesSoap11"
@@ -51,18 +58,134 @@ class MossosSendResult:
     codi_retorn: Optional[str]
     fault: Optional[str]
     raw_response: Optional[str] = None
+    transport_error: bool = False
+
+class MatriculaImages(NamedTuple):
+    """Imágenes ya codificadas en base64 para ``imgMatricula`` e ``imgContext``."""
+
+    ocr: str
+    ctx: Union[str, bytes]
+
 
 def load_image_base64(path: Optional[str]) -> str:
+    """Devuelve la imagen en base64 lista para el sobre SOAP.
+
+    Si la ingesta guardó el texto base64 (ruta ``.b64`` o sidecar junto al
+    JPEG) se lee tal cual; si no, se codifican los bytes del JPEG.
+    """
+
     if not path:
         raise FileNotFoundError("Ruta de imagen no disponible")
 
     full_path = resolve_image_path(path)
+    if full_path.name.endswith(BASE64_SUFFIX):
+        try:
+            return full_path.read_text(encoding="ascii")
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Fichero no encontrado en {full_path}") from None
+    if settings.image_storage_mode in BASE64_STORAGE_MODES:
+        try:
+            return base64_sidecar(full_path).read_text(encoding="ascii")
+        except FileNotFoundError:
+            pass
+
     if not full_path.is_file():
         raise FileNotFoundError(f"Fichero no encontrado en {full_path}")
 
     return base64.b64encode(full_path.read_bytes()).decode("ascii")
 
 
+def matricula_result(response, serialized) -> MossosSendResult:
+    """Traduce la respuesta de ``matricula()`` a ``MossosSendResult``.
+
+    ``serialized`` es la respuesta ya convertida a tipos básicos (dict, str o
+    ``None``); ``response`` es el objeto original, del que solo se leen
+    atributos cuando no es un dict.
+    """
+
+    if serialized in (1, "1"):
+        return MossosSendResult(
+            success=True,
+            http_status=200,
+            codi_retorn=str(serialized),
+            fault=None,
+            raw_response=str(serialized),
+        )
+    if response is None:
+        return MossosSendResult(
+            success=False,
+            http_status=200,
+            codi_retorn=None,
+            fault="RESPUESTA_VACIA",
+            raw_response=None,
+        )
+
+    codi_retorn = getattr(response, "codiRetorn", None)
+    serialized_codi_retorn = None
+    if isinstance(serialized, dict):
+        serialized_codi_retorn = serialized.get("codiRetorn")
+
+    normalized_code = None
+    for code_candidate in (codi_retorn, serialized_codi_retorn):
+        if code_candidate is not None:
+            normalized_code = str(code_candidate)
+            break
+
+    explicit_error_code = None
+    explicit_error_msg = None
+    resultat_value = None
+    if isinstance(serialized, dict):
+        explicit_error_code = serialized.get("codiError") or serialized.get("errorCode")
+        explicit_error_msg = serialized.get("error") or serialized.get("descripcio")
+        resultat_value = serialized.get("resultat")
+    else:
+        explicit_error_code = getattr(response, "codiError", None)
+        explicit_error_msg = getattr(response, "error", None)
+        resultat_value = getattr(response, "resultat", None)
+
+    error_resultat = resultat_value not in (None, "", 0, "0", "OK", "1", "1.0", 1, 1.0)
+
+    if explicit_error_code or explicit_error_msg or error_resultat:
+        error_parts = []
+        if explicit_error_code:
+            error_parts.append(f"codiError={explicit_error_code}")
+        if explicit_error_msg:
+            error_parts.append(str(explicit_error_msg))
+        if error_resultat:
+            error_parts.append(f"resultat={resultat_value}")
+        error_detail = " | ".join(error_parts) or "RESPUESTA_ERROR_DESCONOCIDO"
+        return MossosSendResult(
+            success=False,
+            http_status=200,
+            codi_retorn=normalized_code,
+            fault=error_detail,
+            raw_response=str(serialized),
+        )
+
+    success_codes = ("OK", "0000", "1", "1.0")
+    success = normalized_code in success_codes or normalized_code is None
+    return MossosSendResult(
+        success=success,
+        http_status=200,
+        codi_retorn=normalized_code,
+        fault=None,
+        raw_response=str(serialized),
+    )
+
+
+def camera_coordinates(camera) -> tuple[Optional[str], Optional[str]]:
+    """``coordenadaX``/``coordenadaY``: coordenadas de texto o UTM con dos decimales.
+
+    Acepta un ``Camera`` o un ``CameraSendProfile`` (que ya las trae resueltas).
+    """
+
+    utm_x = getattr(camera, "utm_x", None)
+    utm_y = getattr(camera, "utm_y", None)
+    coord_x = camera.coord_x or (f"{utm_x:.2f}" if utm_x is not None else None)
+    coord_y = camera.coord_y or (f"{utm_y:.2f}" if utm_y is not None else None)
+    return coord_x, coord_y
+
+
 class MossosZeepClient:
     """Cliente Zeep que firma peticiones con certificado X509."""
 
@@ -75,9 +198,6 @@ class MossosZeepClient:
         key_path: str,
         timeout: float = 5.0,
     ) -> None:
-        session = requests.Session()
-        session.verify = True
-
         if not endpoint_url:
             raise ValueError("Endpoint SOAP no configurado")
 
@@ -86,7 +206,8 @@ class MossosZeepClient:
         if not os.path.isfile(key_path):
             raise FileNotFoundError(f"Clave privada no encontrada: {key_path}")
 
-        transport = Transport(session=session, timeout=timeout)
+        session = http_sessions.get(endpoint_url)
+        transport = build_transport(session, timeout, operation_timeout=timeout)
 
         plugins = []
         if os.getenv("SOAP_DEBUG") == "1":
@@ -113,23 +234,28 @@ class MossosZeepClient:
             ts = ts.astimezone(timezone.utc)
         return ts.strftime("%Y-%m-%d"), ts.strftime("%H:%M:%S")
 
-    def build_matricula_request(self, reading: AlprReading, camera: Camera):
+    def build_matricula_request(
+        self, reading: AlprReading, camera: Camera, images: Optional[MatriculaImages] = None
+    ):
+        """Construye el payload de ``matricula``.
+
+        ``camera`` puede ser un ``Camera`` o un ``CameraSendProfile``: solo se
+        usan ``codigo_lector`` y las coordenadas.
+        """
         if not reading.timestamp_utc:
             raise ValueError("La lectura no tiene timestamp para matriculaRequest")
 
         data_str, hora_str = self._format_date_time(reading.timestamp_utc)
         plate = (reading.plate or "").strip().upper()[:10]
-        img_ocr_b64 = load_image_base64(reading.image_ocr_path)
-        img_ctx_b64 = b""
-        if getattr(reading, "has_image_ctx", False) and reading.image_ctx_path:
-            img_ctx_b64 = load_image_base64(reading.image_ctx_path)
+        if images is not None:
+            img_ocr_b64, img_ctx_b64 = images
+        else:
+            img_ocr_b64 = load_image_base64(reading.image_ocr_path)
+            img_ctx_b64 = b""
+            if getattr(reading, "has_image_ctx", False) and reading.image_ctx_path:
+                img_ctx_b64 = load_image_base64(reading.image_ctx_path)
 
-        coord_x_value = camera.coord_x or (
-            f"{camera.utm_x:.2f}" if camera.utm_x is not None else None
-        )
-        coord_y_value = camera.coord_y or (
-            f"{camera.utm_y:.2f}" if camera.utm_y is not None else None
-        )
+        coord_x_value, coord_y_value = camera_coordinates(camera)
 
         payload = {
             "codiLector": camera.codigo_lector,
@@ -165,82 +291,17 @@ class MossosZeepClient:
         )
         return payload
 
-    def send_matricula(self, reading: AlprReading, camera: Camera) -> MossosSendResult:
-        request_data = self.build_matricula_request(reading, camera)
+    def send_matricula(
+        self, reading: AlprReading, camera: Camera, images: Optional[MatriculaImages] = None
+    ) -> MossosSendResult:
+        request_data = self.build_matricula_request(reading, camera, images)
         try:
             logger.debug("[MOSSOS][DEBUG] Payload matricula: %s", request_data)
             response = self.service.matricula(**request_data)
             serialized = serialize_object(response)
             logger.debug("[MOSSOS][DEBUG] Respuesta serializada de matricula(): %r", serialized)
             logger.debug("[MOSSOS][DEBUG] Respuesta recibida correctamente")
-            if serialized in (1, "1"):
-                return MossosSendResult(
-                    success=True,
-                    http_status=200,
-                    codi_retorn=str(serialized),
-                    fault=None,
-                    raw_response=str(serialized),
-                )
-            if response is None:
-                return MossosSendResult(
-                    success=False,
-                    http_status=200,
-                    codi_retorn=None,
-                    fault="RESPUESTA_VACIA",
-                    raw_response=None,
-                )
-
-            codi_retorn = getattr(response, "codiRetorn", None)
-            serialized_codi_retorn = None
-            if isinstance(serialized, dict):
-                serialized_codi_retorn = serialized.get("codiRetorn")
-
-            normalized_code = None
-            for code_candidate in (codi_retorn, serialized_codi_retorn):
-                if code_candidate is not None:
-                    normalized_code = str(code_candidate)
-                    break
-
-            explicit_error_code = None
-            explicit_error_msg = None
-            resultat_value = None
-            if isinstance(serialized, dict):
-                explicit_error_code = serialized.get("codiError") or serialized.get("errorCode")
-                explicit_error_msg = serialized.get("error") or serialized.get("descripcio")
-                resultat_value = serialized.get("resultat")
-            else:
-                explicit_error_code = getattr(response, "codiError", None)
-                explicit_error_msg = getattr(response, "error", None)
-                resultat_value = getattr(response, "resultat", None)
-
-            error_resultat = resultat_value not in (None, "", 0, "0", "OK", "1", "1.0", 1, 1.0)
-
-            if explicit_error_code or explicit_error_msg or error_resultat:
-                error_parts = []
-                if explicit_error_code:
-                    error_parts.append(f"codiError={explicit_error_code}")
-                if explicit_error_msg:
-                    error_parts.append(str(explicit_error_msg))
-                if error_resultat:
-                    error_parts.append(f"resultat={resultat_value}")
-                error_detail = " | ".join(error_parts) or "RESPUESTA_ERROR_DESCONOCIDO"
-                return MossosSendResult(
-                    success=False,
-                    http_status=200,
-                    codi_retorn=normalized_code,
-                    fault=error_detail,
-                    raw_response=str(serialized),
-                )
-
-            success_codes = ("OK", "0000", "1", "1.0")
-            success = normalized_code in success_codes or normalized_code is None
-            return MossosSendResult(
-                success=success,
-                http_status=200,
-                codi_retorn=normalized_code,
-                fault=None,
-                raw_response=str(serialized),
-            )
+            return matricula_result(response, serialized)
         except Fault as fault:
             logger.error(
                 "[MOSSOS][FAULT] %s: %s", fault.code if hasattr(fault, "code") else "FAULT", fault.message
@@ -258,6 +319,16 @@ class MossosZeepClient:
                 http_status=getattr(exc, "status_code", None),
                 codi_retorn=None,
                 fault=str(exc),
+                transport_error=True,
+            )
+        except requests.RequestException as exc:
+            logger.error("[MOSSOS][ERROR] Error de conexión con Mossos: %s", exc)
+            return MossosSendResult(
+                success=False,
+                http_status=None,
+                codi_retorn=None,
+                fault=str(exc),
+                transport_error=True,
             )
         except Exception as exc:
             logger.exception("[MOSSOS][ERROR] Error inesperado enviando lectura %s", getattr(reading, "id", None))
@@ -269,4 +340,11 @@ class MossosZeepClient:
             )
 
 
-__all__ = ["MossosZeepClient", "MossosSendResult", "MATRICULA_NS"]
+__all__ = [
+    "MATRICULA_NS",
+    "MatriculaImages",
+    "MossosSendResult",
+    "MossosZeepClient",
+    "camera_coordinates",
+    "matricula_result",
+]
@@ -0,0 +1,166 @@
+"""Precarga de imágenes de los siguientes mensajes reclamados.
+
+``build_matricula_request`` lee y codifica las imágenes justo antes de cada
+llamada SOAP; con la caché de páginas fría o almacenamiento en red el sender
+espera al disco entre envío y envío. ``ImagePrefetcher`` carga en segundo plano
+las imágenes de los próximos ``depth`` mensajes del lote mientras el actual
+está en vuelo, sin superar ``max_bytes`` de imágenes retenidas en memoria.
+
+Si la precarga falla o aún no se ha hecho, el envío vuelve a la lectura
+síncrona habitual, que es la que decide los errores de imagen.
+"""
+from __future__ import annotations
+
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+from app.logger import logger
+from app.models import MessageQueue
+from app.sender.mossos_client import MatriculaImages, load_image_base64
+
+
+@dataclass
+class _PendingLoad:
+    message_id: int
+    ocr_path: Optional[str]
+    ctx_path: Optional[str]
+
+
+class ImagePrefetcher:
+    """Carga acotada de imágenes por delante del mensaje en curso."""
+
+    def __init__(
+        self,
+        *,
+        depth: int,
+        max_bytes: int,
+        loader: Callable[[Optional[str]], str] = load_image_base64,
+    ) -> None:
+        self.depth = max(int(depth), 0)
+        self.max_bytes = max(int(max_bytes), 0)
+        self._loader = loader
+        self._pending: deque[_PendingLoad] = deque()
+        self._futures: dict[int, Future] = {}
+        self._sizes: dict[int, int] = {}
+        self._bytes = 0
+        self._loaded = 0
+        self._average_size = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.depth > 0 and self.max_bytes > 0
+
+    @property
+    def retained_bytes(self) -> int:
+        with self._lock:
+            return self._bytes
+
+    def queue(self, messages: Iterable[MessageQueue]) -> None:
+        """Registra, en orden de envío, los mensajes cuyas imágenes se precargarán."""
+
+        if not self.enabled:
+            return
+        with self._lock:
+            for message in messages:
+                reading = message.reading
+                if reading is None:
+                    continue
+                ctx_path = reading.image_ctx_path if reading.has_image_ctx else None
+                self._pending.append(_PendingLoad(message.id, reading.image_ocr_path, ctx_path))
+        self._fill()
+
+    def _fill(self) -> None:
+        with self._lock:
+            while (
+                self._pending
+                and len(self._futures) < self.depth
+                and self._projected_bytes() < self.max_bytes
+            ):
+                load = self._pending.popleft()
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=min(self.depth, 4), thread_name_prefix="prefetch"
+                    )
+                future = self._executor.submit(self._load, load)
+                self._futures[load.message_id] = future
+
+    def _projected_bytes(self) -> int:
+        # Las cargas en curso aún no tienen tamaño: se estiman con la media observada.
+        loading = len(self._futures) - len(self._sizes)
+        return self._bytes + loading * self._average_size
+
+    def _load(self, load: _PendingLoad) -> MatriculaImages:
+        ocr = self._loader(load.ocr_path)
+        ctx = self._loader(load.ctx_path) if load.ctx_path else b""
+        size = len(ocr) + len(ctx)
+        with self._lock:
+            self._loaded += 1
+            self._average_size += (size - self._average_size) // self._loaded
+            if load.message_id in self._futures:
+                self._sizes[load.message_id] = size
+                self._bytes += size
+        return MatriculaImages(ocr=ocr, ctx=ctx)
+
+    def _forget(self, message_id: int) -> Optional[Future]:
+        with self._lock:
+            future = self._futures.pop(message_id, None)
+            self._bytes -= self._sizes.pop(message_id, 0)
+            self._pending = deque(load for load in self._pending if load.message_id != message_id)
+        return future
+
+    def take(self, message_id: int) -> Optional[MatriculaImages]:
+        """Devuelve las imágenes precargadas del mensaje, esperando si están en curso.
+
+        Devuelve ``None`` si no se precargaron o si la carga falló; en ese caso
+        el llamador debe leerlas de forma síncrona.
+        """
+
+        with self._lock:
+            future = self._futures.get(message_id)
+        if future is None:
+            self.misses += 1
+            self._fill()
+            return None
+        try:
+            images = future.result()
+        except Exception as exc:
+            logger.debug("[SENDER][DEBUG] Precarga de imágenes fallida para mensaje %s: %s", message_id, exc)
+            images = None
+        self._forget(message_id)
+        self._fill()
+        if images is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return images
+
+    def discard(self, message_id: int) -> None:
+        """Cancela la precarga de un mensaje descartado o devuelto a la cola."""
+
+        future = self._forget(message_id)
+        if future is not None:
+            future.cancel()
+            self._fill()
+
+    def close(self) -> None:
+        with self._lock:
+            futures = list(self._futures.values())
+            self._futures.clear()
+            self._sizes.clear()
+            self._pending.clear()
+            self._bytes = 0
+            executor, self._executor = self._executor, None
+        for future in futures:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+__all__ = ["ImagePrefetcher"]
@@ -0,0 +1,137 @@
+"""Limitador de tasa (token bucket) por endpoint para el sender.
+
+Cada endpoint de Mossos tiene un cubo que se rellena a ``rate_per_second``
+tokens por segundo hasta ``burst``. Cada envío consume un token; si no hay
+ninguno disponible el hilo espera justo lo necesario hasta el siguiente, en
+lugar de dormir intervalos fijos. Las reservas se hacen bajo lock y la espera
+fuera de él, así que varios hilos del envío concurrente se reparten los tokens
+en orden de llegada.
+
+El tiempo esperado se acumula por endpoint para poder dimensionar la
+capacidad (ver ``RateLimiterRegistry.drain_throttled``).
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Callable, Hashable
+
+from app.logger import logger
+
+
+def _normalize(rate_per_second: float | None, burst: int | None) -> tuple[float, int]:
+    """Tasa no negativa y ráfaga de al menos 1 (por defecto, un segundo de tasa)."""
+
+    rate = max(float(rate_per_second or 0.0), 0.0)
+    return rate, max(int(burst) if burst else math.ceil(rate), 1)
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        *,
+        name: str,
+        rate_per_second: float,
+        burst: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.name = name
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.rate_per_second, self.burst = _normalize(rate_per_second, burst)
+        self._tokens = float(self.burst)
+        self._updated_at = self._clock()
+        self.throttled_seconds = 0.0
+        self.throttled_count = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate_per_second > 0
+
+    def configure(self, rate_per_second: float | None, burst: int | None) -> None:
+        """Actualiza tasa y ráfaga (p. ej. tras editar el endpoint en BD)."""
+
+        rate, burst = _normalize(rate_per_second, burst)
+        with self._lock:
+            self._refill(self._clock())
+            self.rate_per_second, self.burst = rate, burst
+            self._tokens = min(self._tokens, float(burst))
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(now - self._updated_at, 0.0)
+        self._tokens = min(self._tokens + elapsed * self.rate_per_second, float(self.burst))
+        self._updated_at = now
+
+    def acquire(self) -> float:
+        """Consume un token esperando si hace falta; devuelve los segundos esperados."""
+
+        if not self.enabled:
+            return 0.0
+        with self._lock:
+            self._refill(self._clock())
+            # El token se reserva ya (el saldo puede quedar negativo) y la espera
+            # se hace fuera del lock; el siguiente hilo espera detrás de esta reserva.
+            self._tokens -= 1.0
+            wait = -self._tokens / self.rate_per_second if self._tokens < 0 else 0.0
+            if wait > 0:
+                self.throttled_seconds += wait
+                self.throttled_count += 1
+        if wait > 0:
+            logger.debug("[SENDER][DEBUG] Endpoint %s limitado por tasa: espera %.3fs", self.name, wait)
+            self._sleep(wait)
+        return wait
+
+    def drain_throttled(self) -> tuple[int, float]:
+        """Devuelve ``(esperas, segundos esperados)`` y reinicia los contadores."""
+
+        with self._lock:
+            stats = (self.throttled_count, self.throttled_seconds)
+            self.throttled_count, self.throttled_seconds = 0, 0.0
+        return stats
+
+
+class RateLimiterRegistry:
+    """Mantiene un ``TokenBucket`` por endpoint."""
+
+    def __init__(self) -> None:
+        self._buckets: dict[Hashable, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        key: Hashable,
+        *,
+        rate_per_second: float | None,
+        burst: int | None,
+        name: str | None = None,
+    ) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(
+                    name=name or str(key), rate_per_second=rate_per_second, burst=burst
+                )
+                self._buckets[key] = bucket
+        if (bucket.rate_per_second, bucket.burst) != _normalize(rate_per_second, burst):
+            bucket.configure(rate_per_second, burst)
+        return bucket
+
+    def drain_throttled(self) -> dict[str, tuple[int, float]]:
+        """Esperas y segundos limitados por endpoint desde la última llamada."""
+
+        with self._lock:
+            buckets = list(self._buckets.values())
+        stats = {}
+        for bucket in buckets:
+            count, seconds = bucket.drain_throttled()
+            if count:
+                stats[bucket.name] = (count, seconds)
+        return stats
+
+
+rate_limiters = RateLimiterRegistry()
+
+__all__ = ["RateLimiterRegistry", "TokenBucket", "rate_limiters"]
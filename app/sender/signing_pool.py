@@ -0,0 +1,118 @@
+"""Firma WS-Security en un pool de procesos.
+
+La firma canonicaliza (C14N) y calcula digests SHA sobre todo el Body, que
+incluye las imágenes en base64. Es trabajo de CPU que, en hilos, queda
+serializado por el GIL en un solo núcleo. ``SigningPool`` recibe el sobre sin
+firmar ya serializado y devuelve los bytes firmados calculados en un proceso
+hijo; cada proceso mantiene su propio ``SigningContextCache``, así que las
+claves se cargan una vez por proceso y se quedan calientes.
+
+Con ``SENDER_SIGNING_PROCESSES=0`` (valor por defecto) se firma en el propio
+hilo, como hasta ahora.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from lxml import etree
+
+from app.config import settings
+from app.logger import logger
+from app.sender.wsse import SigningContextCache, TimestampedBinarySignature
+
+_worker_contexts: Optional[SigningContextCache] = None
+
+
+def _init_worker() -> None:
+    global _worker_contexts
+    _worker_contexts = SigningContextCache()
+
+
+def sign_envelope_bytes(
+    envelope_xml: bytes,
+    key_file: str,
+    certfile: str,
+    password: Optional[bytes] = None,
+    timestamp_ttl_seconds: int = 300,
+    contexts: Optional[SigningContextCache] = None,
+) -> bytes:
+    """Firma un sobre serializado y devuelve el documento firmado en UTF-8."""
+
+    envelope = etree.fromstring(envelope_xml, parser=etree.XMLParser(huge_tree=True))
+    signature = TimestampedBinarySignature(
+        key_file,
+        certfile,
+        password,
+        timestamp_ttl_seconds=timestamp_ttl_seconds,
+        contexts=contexts or _worker_contexts or SigningContextCache(),
+    )
+    signature.apply(envelope, {})
+    return etree.tostring(envelope, xml_declaration=True, encoding="utf-8")
+
+
+def _sign_inline(envelope_xml: bytes, signature: TimestampedBinarySignature) -> bytes:
+    envelope = etree.fromstring(envelope_xml, parser=etree.XMLParser(huge_tree=True))
+    signature.apply(envelope, {})
+    return etree.tostring(envelope, xml_declaration=True, encoding="utf-8")
+
+
+class SigningPool:
+    """Reparte la firma de sobres entre ``processes`` procesos hijos."""
+
+    def __init__(self, processes: int) -> None:
+        self.processes = max(int(processes), 0)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: el sender tiene hilos vivos y fork podría heredar locks tomados.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+                logger.info("[SENDER] Pool de firma iniciado con %s procesos", self.processes)
+            return self._executor
+
+    def sign(self, envelope_xml: bytes, signature: TimestampedBinarySignature) -> bytes:
+        """Firma ``envelope_xml`` con la clave y certificado de ``signature``."""
+
+        # Los métodos de firma personalizados son objetos de xmlsec que no se pueden enviar a otro proceso.
+        if not self.enabled or signature.signature_method or signature.digest_method:
+            return _sign_inline(envelope_xml, signature)
+
+        try:
+            future = self._get_executor().submit(
+                sign_envelope_bytes,
+                envelope_xml,
+                signature.key_file,
+                signature.certfile,
+                signature.password,
+                signature.timestamp_ttl_seconds,
+            )
+            return future.result()
+        except BrokenProcessPool:
+            logger.error("[SENDER][ERROR] Pool de firma caído; se recrea y se firma en el hilo actual")
+            self.shutdown(wait=False)
+            return _sign_inline(envelope_xml, signature)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+signing_pool = SigningPool(settings.sender_signing_processes)
+
+__all__ = ["SigningPool", "sign_envelope_bytes", "signing_pool"]
@@ -0,0 +1,324 @@
+"""Escritura diferida (write-behind) de transiciones de estado del sender.
+
+Cada envío generaba varios commits (descartes, reintentos, borrado tras
+éxito). ``StatusWriter`` acumula esas transiciones en memoria y las vuelca en
+una única transacción con sentencias agrupadas, ya sea al final de la
+iteración o cuando el buffer supera un tamaño o una antigüedad máxima.
+
+Los éxitos siguen la misma ventana que el resto, de modo que el borrado de
+mensajes y lecturas enviados también se agrupa. Si el proceso cae antes del
+volcado, esas lecturas se reenvían al recuperarse su lease, como cualquier
+mensaje que quede en ``SENDING``. Si un volcado falla, las filas vuelven al buffer y se reintentan
+en el siguiente; el sender no reclama mensajes nuevos mientras queden
+transiciones sin guardar.
+
+Cada volcado solo toca los mensajes que siguen en ``SENDING`` a nombre de
+este worker. Si el proceso perdió la lease (una pausa larga, una renovación
+fallida) y otro worker ya reclamó el mensaje, su transición se descarta y se
+registra en el log en lugar de pisar el estado o borrar la lectura ajena.
+
+La reclamación de mensajes (paso a ``SENDING``) no pasa por aquí: se confirma
+en el momento de reclamar, de modo que si el proceso cae con transiciones aún
+en el buffer los mensajes siguen en ``SENDING`` y, al vencer su lease, la
+recuperación los devuelve a la cola.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.logger import logger
+from app.models import AlprReading, Camera, MessageQueue, MessageStatus, SessionLocal
+from app.sender.cleanup import image_deletion_queue
+from app.sender.leases import lease_keeper, worker_identity
+from app.utils.sql import id_in
+
+
+class StatusWriter:
+    """Buffer de transiciones de ``messages_queue`` con volcado agrupado."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        *,
+        max_pending: Optional[int] = None,
+        max_delay_seconds: Optional[float] = None,
+        worker_id: Optional[str] = None,
+    ) -> None:
+        self._session_factory = session_factory
+        self.worker_id = worker_id or worker_identity()
+        self.max_pending = max(
+            int(max_pending if max_pending is not None else settings.sender_status_flush_max), 1
+        )
+        self.max_delay_seconds = (
+            max_delay_seconds
+            if max_delay_seconds is not None
+            else settings.sender_status_flush_interval_ms / 1000.0
+        )
+        self._lock = threading.Lock()
+        self._updates: dict[int, dict] = {}
+        self._successes: dict[int, int] = {}
+        self._camera_sent_at: dict[int, datetime] = {}
+        self._oldest_pending: Optional[float] = None
+
+    def _record(self, message_id: int, values: dict) -> None:
+        with self._lock:
+            self._updates[message_id] = {"id": message_id, **values}
+            self._touch()
+
+    def _touch(self) -> None:
+        if self._oldest_pending is None:
+            self._oldest_pending = time.monotonic()
+
+    def mark_dead(
+        self, message_id: int, error: str, now: datetime, *, attempts: Optional[int] = None
+    ) -> None:
+        values = {
+            "status": MessageStatus.DEAD,
+            "last_error": error,
+            "next_retry_at": None,
+            "updated_at": now,
+            "claimed_by": None,
+            "claimed_at": None,
+            "lease_expires_at": None,
+        }
+        if attempts is not None:
+            values["attempts"] = attempts
+        self._record(message_id, values)
+
+    def mark_failed(
+        self,
+        message_id: int,
+        *,
+        attempts: int,
+        error: str,
+        next_retry_at: datetime,
+        now: datetime,
+    ) -> None:
+        self._record(
+            message_id,
+            {
+                "status": MessageStatus.FAILED,
+                "attempts": attempts,
+                "last_error": error,
+                "next_retry_at": next_retry_at,
+                "updated_at": now,
+                "claimed_by": None,
+                "claimed_at": None,
+                "lease_expires_at": None,
+            },
+        )
+
+    def requeue(
+        self, message_id: int, *, status: str, next_retry_at: datetime, now: datetime
+    ) -> None:
+        """Devuelve un mensaje reclamado a la cola sin tocar sus intentos."""
+
+        self._record(
+            message_id,
+            {
+                "status": status,
+                "next_retry_at": next_retry_at,
+                "updated_at": now,
+                "claimed_by": None,
+                "claimed_at": None,
+                "lease_expires_at": None,
+            },
+        )
+
+    def mark_success(self, message_id: int, camera_id: int, sent_at: datetime) -> None:
+        with self._lock:
+            self._updates.pop(message_id, None)
+            self._successes[message_id] = camera_id
+            previous = self._camera_sent_at.get(camera_id)
+            if previous is None or sent_at > previous:
+                self._camera_sent_at[camera_id] = sent_at
+            self._touch()
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._updates) + len(self._successes)
+
+    def maybe_flush(self) -> int:
+        """Vuelca el buffer si supera el tamaño o la antigüedad configurados."""
+
+        with self._lock:
+            size = len(self._updates) + len(self._successes)
+            due = (
+                self._oldest_pending is not None
+                and time.monotonic() - self._oldest_pending >= self.max_delay_seconds
+            )
+        if size >= self.max_pending or (size and due):
+            return self.flush()
+        return 0
+
+    def _restore(
+        self, updates: list[dict], successes: dict[int, int], camera_sent_at: dict[int, datetime]
+    ) -> None:
+        """Devuelve al buffer un volcado fallido sin pisar transiciones más recientes."""
+
+        with self._lock:
+            for message_id, camera_id in successes.items():
+                self._updates.pop(message_id, None)
+                self._successes.setdefault(message_id, camera_id)
+            for row in updates:
+                if row["id"] not in self._updates and row["id"] not in self._successes:
+                    self._updates[row["id"]] = row
+            for camera_id, sent_at in camera_sent_at.items():
+                previous = self._camera_sent_at.get(camera_id)
+                if previous is None or sent_at > previous:
+                    self._camera_sent_at[camera_id] = sent_at
+            self._touch()
+
+    def flush(self, session: Optional[Session] = None) -> int:
+        """Aplica las transiciones acumuladas en una única transacción.
+
+        Si se pasa ``session`` se usa (sin cerrarla); si no, se abre una nueva.
+        Devuelve el número de mensajes actualizados o eliminados. Si el commit
+        falla, las transiciones vuelven al buffer para el siguiente intento.
+        """
+
+        with self._lock:
+            updates = list(self._updates.values())
+            successes = dict(self._successes)
+            camera_sent_at = dict(self._camera_sent_at)
+            self._updates.clear()
+            self._successes.clear()
+            self._camera_sent_at.clear()
+            self._oldest_pending = None
+
+        if not updates and not successes:
+            return 0
+
+        own_session = session is None
+        session = session or self._session_factory()
+        started = time.monotonic()
+        try:
+            owned = _owned_message_ids(
+                session, self.worker_id, [row["id"] for row in updates] + list(successes)
+            )
+            stale = [row["id"] for row in updates if row["id"] not in owned]
+            stale += [message_id for message_id in successes if message_id not in owned]
+            if stale:
+                logger.warning(
+                    "[SENDER] Se descartan %s transiciones de mensajes que ya no son de este "
+                    "worker (lease recuperada por otro): %s",
+                    len(stale),
+                    stale,
+                )
+            owned_updates = [row for row in updates if row["id"] in owned]
+            owned_successes = [message_id for message_id in successes if message_id in owned]
+            for rows in _group_by_columns(owned_updates):
+                session.execute(update(MessageQueue), rows)
+            if camera_sent_at:
+                session.execute(
+                    update(Camera),
+                    [
+                        {"id": camera_id, "last_sent_at": sent_at}
+                        for camera_id, sent_at in camera_sent_at.items()
+                    ],
+                )
+            image_paths = (
+                _delete_success_records(session, self.worker_id, owned_successes)
+                if owned_successes
+                else []
+            )
+            session.commit()
+        except Exception:
+            session.rollback()
+            self._restore(updates, successes, camera_sent_at)
+            logger.exception(
+                "[SENDER][ERROR] No se pudieron volcar %s transiciones de estado; "
+                "se reintentará en el siguiente volcado",
+                len(updates) + len(successes),
+            )
+            return 0
+        finally:
+            if own_session:
+                session.close()
+
+        lease_keeper.untrack([row["id"] for row in updates] + list(successes))
+        image_deletion_queue.submit(image_paths)
+
+        logger.debug(
+            "[SENDER][DEBUG] Volcadas %s transiciones y %s éxitos en un commit (%sms)",
+            len(owned_updates),
+            len(owned_successes),
+            int((time.monotonic() - started) * 1000),
+        )
+        return len(owned_updates) + len(owned_successes)
+
+
+def _group_by_columns(rows: list[dict]) -> list[list[dict]]:
+    """Agrupa filas con el mismo conjunto de columnas para un UPDATE ejecutado en bloque."""
+
+    groups: dict[tuple, list[dict]] = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    return list(groups.values())
+
+
+def _owned_message_ids(session: Session, worker_id: str, message_ids: list[int]) -> set[int]:
+    """Ids de ``message_ids`` que siguen en ``SENDING`` reclamados por ``worker_id``.
+
+    Las filas quedan bloqueadas hasta el commit para que nadie las recupere
+    entre esta comprobación y las escrituras del volcado.
+    """
+
+    return set(
+        session.execute(
+            select(MessageQueue.id)
+            .where(
+                id_in(session, MessageQueue.id, message_ids),
+                *_owned_by(worker_id),
+            )
+            .with_for_update()
+        ).scalars()
+    )
+
+
+def _owned_by(worker_id: str) -> tuple:
+    return (
+        MessageQueue.claimed_by == worker_id,
+        MessageQueue.status == MessageStatus.SENDING,
+    )
+
+
+def _delete_success_records(
+    session: Session, worker_id: str, message_ids: list[int]
+) -> list[Optional[str]]:
+    """Borra en bloque los mensajes enviados y sus lecturas.
+
+    Solo borra los mensajes que ``worker_id`` sigue teniendo en ``SENDING``.
+    Devuelve las rutas de imagen de las lecturas borradas para eliminarlas
+    fuera de la transacción.
+    """
+
+    reading_ids = list(
+        session.execute(
+            delete(MessageQueue)
+            .where(id_in(session, MessageQueue.id, message_ids), *_owned_by(worker_id))
+            .returning(MessageQueue.reading_id)
+            .execution_options(synchronize_session=False)
+        ).scalars()
+    )
+    if not reading_ids:
+        return []
+
+    image_rows = session.execute(
+        delete(AlprReading)
+        .where(id_in(session, AlprReading.id, reading_ids))
+        .returning(AlprReading.image_ocr_path, AlprReading.image_ctx_path)
+        .execution_options(synchronize_session=False)
+    ).all()
+    return [path for row in image_rows for path in row]
+
+
+__all__ = ["StatusWriter"]
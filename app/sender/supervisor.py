@@ -0,0 +1,168 @@
+"""Supervisor de procesos sender repartidos por municipio.
+
+La firma WS-Security y la construcción del XML consumen CPU y, en un único
+proceso, el GIL limita el envío a un núcleo. ``python -m app.sender.main
+--shards N`` arranca N procesos sender hijos; cada uno recibe
+``SENDER_SHARD_COUNT=N`` y su ``SENDER_SHARD_INDEX`` y solo reclama mensajes de
+los municipios con ``municipality_id % N == SENDER_SHARD_INDEX`` (ver
+``_shard_filters`` en el worker). Como el certificado pertenece al municipio,
+cada proceso mantiene calientes solo sus clientes SOAP, certificados y
+perfiles.
+
+La reclamación sigue usando ``FOR UPDATE SKIP LOCKED``, así que aunque dos
+procesos llegaran a solaparse (p. ej. al cambiar N) no habría envíos
+duplicados. Si un hijo cae, el supervisor lo vuelve a lanzar con una
+espera creciente si cae nada más arrancar; sus mensajes en ``SENDING`` se
+recuperan al vencer la lease.
+
+Para parar, el supervisor envía SIGTERM a los hijos: cada sender termina el
+mensaje en curso, vuelca sus transiciones, devuelve a ``PENDING`` los
+mensajes reclamados que no llegó a enviar y cierra sus pools antes de salir. Solo si no ha terminado tras ``timeout`` se le envía SIGKILL. Los hijos
+van en su propia sesión para que el Ctrl+C de la terminal llegue solo al
+supervisor y no interrumpa un envío a medias.
+"""
+from __future__ import annotations
+
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from app.logger import logger
+
+# Un hijo que cae antes de este tiempo se considera un fallo de arranque.
+STABLE_AFTER_SECONDS = 60.0
+
+
+@dataclass
+class _Shard:
+    index: int
+    process: Optional[subprocess.Popen] = None
+    started_at: float = 0.0
+    restart_at: Optional[float] = None
+    restart_delay: float = 1.0
+
+
+class ShardSupervisor:
+    """Lanza un proceso sender por shard y relanza los que caen."""
+
+    def __init__(
+        self,
+        shards: int,
+        *,
+        spawn: Optional[Callable[[int, int], subprocess.Popen]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        max_restart_delay: float = 30.0,
+    ) -> None:
+        if shards < 1:
+            raise ValueError("El número de shards debe ser al menos 1")
+        self.shards = [_Shard(index) for index in range(shards)]
+        self._spawn = spawn or _spawn_sender
+        self._clock = clock
+        self.max_restart_delay = max_restart_delay
+        self._stopping = threading.Event()
+
+    def _start_shard(self, shard: _Shard) -> None:
+        shard.process = self._spawn(shard.index, len(self.shards))
+        shard.started_at = self._clock()
+        shard.restart_at = None
+        logger.info(
+            "[SENDER] Shard %s/%s iniciado (pid=%s)",
+            shard.index,
+            len(self.shards),
+            shard.process.pid,
+        )
+
+    def start(self) -> None:
+        for shard in self.shards:
+            self._start_shard(shard)
+
+    def check(self) -> int:
+        """Relanza los hijos caídos que ya cumplieron su espera.
+
+        Un hijo que termina con código 0 (p. ej. con ``SENDER_ENABLED=false``)
+        no se relanza. Devuelve cuántos shards siguen activos o pendientes.
+        """
+
+        now = self._clock()
+        active = 0
+        for shard in self.shards:
+            if shard.process is None:
+                continue
+            active += 1
+            if shard.restart_at is None:
+                returncode = shard.process.poll()
+                if returncode is None:
+                    continue
+                if returncode == 0:
+                    logger.info("[SENDER] Shard %s terminó sin error; no se relanza", shard.index)
+                    shard.process = None
+                    active -= 1
+                    continue
+                if now - shard.started_at >= STABLE_AFTER_SECONDS:
+                    shard.restart_delay = 1.0
+                else:
+                    shard.restart_delay = min(shard.restart_delay * 2, self.max_restart_delay)
+                shard.restart_at = now + shard.restart_delay
+                logger.warning(
+                    "[SENDER] Shard %s terminó con código %s; se relanza en %.0fs",
+                    shard.index,
+                    returncode,
+                    shard.restart_delay,
+                )
+            if now >= shard.restart_at:
+                self._start_shard(shard)
+        return active
+
+    def run(self, poll_interval: float = 1.0) -> None:
+        """Supervisa los shards hasta recibir SIGTERM o SIGINT."""
+
+        def _request_stop(signum, _frame) -> None:
+            logger.info("[SENDER] Señal %s recibida; deteniendo shards", signum)
+            self._stopping.set()
+
+        signal.signal(signal.SIGTERM, _request_stop)
+        signal.signal(signal.SIGINT, _request_stop)
+        self.start()
+        try:
+            while not self._stopping.wait(poll_interval):
+                if not self.check():
+                    break
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        self._stopping.set()
+        running = [
+            shard.process
+            for shard in self.shards
+            if shard.process is not None and shard.process.poll() is None
+        ]
+        for process in running:
+            process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in running:
+            try:
+                process.wait(timeout=max(deadline - time.monotonic(), 0.1))
+            except subprocess.TimeoutExpired:
+                logger.warning(
+                    "[SENDER] El shard con pid=%s no terminó en %.0fs; se fuerza su parada",
+                    process.pid,
+                    timeout,
+                )
+                process.kill()
+                process.wait()
+
+
+def _spawn_sender(index: int, count: int) -> subprocess.Popen:
+    env = dict(os.environ, SENDER_SHARD_COUNT=str(count), SENDER_SHARD_INDEX=str(index))
+    return subprocess.Popen(
+        [sys.executable, "-m", "app.sender.main"], env=env, start_new_session=True
+    )
+
+
+__all__ = ["ShardSupervisor"]
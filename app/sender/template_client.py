@@ -0,0 +1,193 @@
+"""Transporte SOAP por plantilla para la operación ``matricula``.
+
+``MossosZeepClient`` pasa cada petición por el sistema de tipos de Zeep
+(``strict=True``) y deserializa cada respuesta con ``serialize_object``. La
+operación ``matricula`` tiene una forma fija, así que ``MossosTemplateClient``
+precompila a partir del WSDL un esqueleto lxml del sobre SOAP 1.1 y el orden de
+los campos de ``matriculaRequest``. Para cada envío rellena una copia del
+esqueleto, la firma con la misma configuración WS-Security (en el pool de
+procesos de ``signing_pool`` si está activo), la envía con la
+``requests.Session`` del transporte (conexiones reutilizadas) y lee la
+respuesta con XPath dirigidos.
+
+El WSDL se sigue cargando con Zeep al construir el cliente, de modo que los
+nombres, espacios de nombres y ``SOAPAction`` salen siempre del contrato.
+"""
+from __future__ import annotations
+
+import base64
+import copy
+import os
+from typing import Any, Optional
+
+import requests
+from lxml import etree
+
+from app.logger import logger
+from app.models import AlprReading, Camera
+from app.sender.mossos_client import (
+    MatriculaImages,
+    MossosSendResult,
+    MossosZeepClient,
+    matricula_result,
+)
+from app.sender.signing_pool import signing_pool
+
+SOAP_ENV_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+OPERATION_NAME = "matricula"
+
+_XML_PARSER = etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=True)
+_BODY_XPATH = etree.XPath("/soap-env:Envelope/soap-env:Body", namespaces={"soap-env": SOAP_ENV_NS})
+_FAULT_XPATH = etree.XPath("soap-env:Fault", namespaces={"soap-env": SOAP_ENV_NS})
+
+
+class MossosTemplateClient(MossosZeepClient):
+    """Cliente que construye y parsea el sobre de ``matricula`` sin Zeep."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        binding = self.service._binding
+        operation = binding.get(OPERATION_NAME)
+        self.address = self.service._binding_options["address"]
+        self.http_headers = {
+            "SOAPAction": f'"{operation.soapaction}"',
+            "Content-Type": "text/xml; charset=utf-8",
+        }
+        request_element = operation.input.body
+        self.field_qnames = [
+            (name, element.qname) for name, element in request_element.type.elements
+        ]
+        self._template = _build_envelope_template(request_element.qname)
+        self._soap_debug = os.getenv("SOAP_DEBUG") == "1"
+
+    def render_envelope(self, payload: dict[str, Any]) -> etree._Element:
+        """Rellena una copia del esqueleto con los campos de ``payload``.
+
+        Los campos se escriben en el orden del esquema; los que valen ``None``
+        se omiten y los ``bytes`` se codifican en base64, igual que hace Zeep.
+        """
+
+        unknown = set(payload) - {name for name, _ in self.field_qnames}
+        if unknown:
+            raise ValueError(f"Campos desconocidos en matriculaRequest: {sorted(unknown)}")
+
+        envelope = copy.deepcopy(self._template)
+        request_el = envelope[1][0]
+        for name, qname in self.field_qnames:
+            value = payload.get(name)
+            if value is None:
+                continue
+            if isinstance(value, bytes):
+                value = base64.b64encode(value).decode("ascii")
+            etree.SubElement(request_el, qname).text = str(value)
+        return envelope
+
+    def send_matricula(
+        self, reading: AlprReading, camera: Camera, images: Optional[MatriculaImages] = None
+    ) -> MossosSendResult:
+        request_data = self.build_matricula_request(reading, camera, images)
+        try:
+            envelope = self.render_envelope(request_data)
+            headers = dict(self.http_headers)
+            if signing_pool.enabled:
+                body = signing_pool.sign(etree.tostring(envelope), self.client.wsse)
+            else:
+                envelope, headers = self.client.wsse.apply(envelope, headers)
+                body = etree.tostring(envelope, xml_declaration=True, encoding="utf-8")
+            if self._soap_debug:
+                logger.info("[MOSSOS][SOAP DEBUG] Envelope:\n%s", body.decode("utf-8"))
+            response = self.client.transport.post(self.address, body, headers)
+            return parse_matricula_response(response.status_code, response.content)
+        except requests.RequestException as exc:
+            logger.error("[MOSSOS][ERROR] Error de conexión con Mossos: %s", exc)
+            return MossosSendResult(
+                success=False,
+                http_status=None,
+                codi_retorn=None,
+                fault=str(exc),
+                transport_error=True,
+            )
+        except Exception as exc:
+            logger.exception("[MOSSOS][ERROR] Error inesperado enviando lectura %s", getattr(reading, "id", None))
+            return MossosSendResult(
+                success=False,
+                http_status=None,
+                codi_retorn=None,
+                fault=str(exc),
+            )
+
+
+def _build_envelope_template(request_qname) -> etree._Element:
+    envelope = etree.Element(etree.QName(SOAP_ENV_NS, "Envelope"), nsmap={"soap-env": SOAP_ENV_NS})
+    etree.SubElement(envelope, etree.QName(SOAP_ENV_NS, "Header"))
+    body = etree.SubElement(envelope, etree.QName(SOAP_ENV_NS, "Body"))
+    namespace = etree.QName(request_qname).namespace
+    etree.SubElement(body, request_qname, nsmap={"ns0": namespace} if namespace else None)
+    return envelope
+
+
+def _element_value(element: etree._Element) -> Optional[Any]:
+    """Convierte el elemento de respuesta al mismo valor que devuelve Zeep.
+
+    Zeep desenvuelve los tipos con un único hijo: ``matriculaResponse`` con
+    solo ``codiRetorn`` se entrega como su texto y sin hijos como ``None``.
+    """
+
+    children = [child for child in element if isinstance(child.tag, str)]
+    if not children:
+        text = (element.text or "").strip()
+        return text or None
+    if len(children) == 1:
+        return children[0].text
+    return {etree.QName(child).localname: child.text for child in children}
+
+
+def parse_matricula_response(status_code: int, content: bytes) -> MossosSendResult:
+    """Interpreta la respuesta HTTP de ``matricula`` sin deserializar con Zeep."""
+
+    if status_code != 200 and not content:
+        logger.error("[MOSSOS][ERROR] Error de transporte: HTTP %s sin contenido", status_code)
+        return MossosSendResult(
+            success=False,
+            http_status=status_code,
+            codi_retorn=None,
+            fault=f"Server returned HTTP status {status_code} (no content available)",
+            transport_error=True,
+        )
+
+    try:
+        document = etree.fromstring(content, parser=_XML_PARSER)
+    except etree.XMLSyntaxError as exc:
+        logger.error("[MOSSOS][ERROR] Error de transporte: XML inválido (HTTP %s): %s", status_code, exc)
+        return MossosSendResult(
+            success=False,
+            http_status=status_code,
+            codi_retorn=None,
+            fault=f"Server returned response ({status_code}) with invalid XML: {exc}",
+            transport_error=True,
+        )
+
+    bodies = _BODY_XPATH(document)
+    body = bodies[0] if bodies else None
+    faults = _FAULT_XPATH(body) if body is not None else []
+    if status_code != 200 or faults:
+        code = message = None
+        if faults:
+            code = faults[0].findtext("faultcode")
+            message = faults[0].findtext("faultstring")
+        message = message or "Unknown fault occured"
+        logger.error("[MOSSOS][FAULT] %s: %s", code or "FAULT", message)
+        return MossosSendResult(
+            success=False,
+            http_status=None,
+            codi_retorn=None,
+            fault=f"{code}: {message}",
+        )
+
+    elements = [child for child in body if isinstance(child.tag, str)] if body is not None else []
+    value = _element_value(elements[0]) if elements else None
+    logger.debug("[MOSSOS][DEBUG] Respuesta de matricula() (plantilla): %r", value)
+    return matricula_result(value, value)
+
+
+__all__ = ["MossosTemplateClient", "parse_matricula_response"]
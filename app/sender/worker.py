@@ -2,11 +2,19 @@
 from __future__ import annotations
 
 import logging
+import math
 import os
+import signal
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Iterable
+from typing import Hashable, Iterator
 
+from sqlalchemy import exists, func, or_, select, update
 from sqlalchemy.orm import Session, selectinload
 
 from app.config import settings
@@ -15,80 +23,207 @@ from app.models import (
     Camera,
     MessageQueue,
     MessageStatus,
-    Municipality,
     SessionLocal,
+    engine,
 )
 from app.logger import logger
-from app.sender.cleanup import delete_reading_images
-from app.sender.mossos_client import MossosZeepClient
+from app.sender.camera_profiles import camera_profiles
+from app.sender.circuit_breaker import circuit_breakers
+from app.sender.cleanup import image_deletion_queue
+from app.sender.client_pool import client_pool
+from app.sender.http_sessions import http_sessions
+from app.sender.leases import lease_keeper, release_claims, worker_identity
+from app.sender.maintenance import maintenance_scheduler
+from app.sender.prefetch import ImagePrefetcher
+from app.sender.rate_limiter import rate_limiters
+from app.sender.signing_pool import signing_pool
+from app.sender.status_writer import StatusWriter
 from app.utils.images import resolve_image_path
+from app.utils.notify import CONFIG_CHANNEL, QueueListener
 
 SUCCESS_CODES = ("1", "0000", "OK", "1.0")
 
 
-def _resolve_retry_config(endpoint) -> tuple[int, int]:
-    retry_max = getattr(endpoint, "retry_max", None) or settings.sender_default_retry_max
-    backoff_ms = getattr(endpoint, "retry_backoff_ms", None) or settings.sender_default_backoff_ms
-    return int(retry_max), int(backoff_ms)
+# Columnas de la lectura que usa el sender (envío, validación y precarga de imágenes).
+SENDER_READING_COLUMNS = (
+    AlprReading.id,
+    AlprReading.camera_id,
+    AlprReading.plate,
+    AlprReading.timestamp_utc,
+    AlprReading.country_code,
+    AlprReading.has_image_ocr,
+    AlprReading.has_image_ctx,
+    AlprReading.image_ocr_path,
+    AlprReading.image_ctx_path,
+)
 
 
-def _load_candidates(session: Session, batch_size: int) -> Iterable[MessageQueue]:
-    query = (
-        session.query(MessageQueue)
-        .options(
-            selectinload(MessageQueue.reading)
-            .selectinload(AlprReading.camera)
-            .selectinload(Camera.municipality),
-            selectinload(MessageQueue.reading)
-            .selectinload(AlprReading.camera)
-            .selectinload(Camera.endpoint),
-            selectinload(MessageQueue.reading)
-            .selectinload(AlprReading.camera)
-            .selectinload(Camera.certificate),
-            selectinload(MessageQueue.reading),
+def _message_load_options() -> tuple:
+    # Cámara, municipio, endpoint y certificado salen de ``camera_profiles``.
+    return (selectinload(MessageQueue.reading).load_only(*SENDER_READING_COLUMNS),)
+
+
+def _sendable_filters(now: datetime) -> tuple:
+    """Filtros de mensajes enviables: PENDING/FAILED fuera de su ventana de backoff."""
+
+    return (
+        MessageQueue.status.in_([MessageStatus.PENDING, MessageStatus.FAILED]),
+        or_(MessageQueue.next_retry_at.is_(None), MessageQueue.next_retry_at <= now),
+        *_shard_filters(),
+    )
+
+
+def _shard_filters() -> tuple:
+    """Restringe la cola a los municipios del shard de este proceso.
+
+    Con ``SENDER_SHARD_COUNT`` > 1 cada proceso atiende solo los municipios con
+    ``municipality_id % SENDER_SHARD_COUNT == SENDER_SHARD_INDEX``. El reparto
+    se calcula en cada consulta, así que un municipio nuevo queda asignado a un
+    shard sin reiniciar nada.
+    """
+
+    shard_count = settings.sender_shard_count
+    if shard_count <= 1:
+        return ()
+    return (
+        exists()
+        .where(
+            AlprReading.id == MessageQueue.reading_id,
+            Camera.id == AlprReading.camera_id,
+            Camera.municipality_id % shard_count == settings.sender_shard_index % shard_count,
         )
-        .filter(MessageQueue.status.in_([MessageStatus.PENDING, MessageStatus.FAILED]))
-        .order_by(MessageQueue.created_at)
-        .limit(batch_size)
+        .correlate(MessageQueue),
     )
+
+
+def _claim_candidates(
+    session: Session, batch_size: int, now: datetime, worker_id: str
+) -> list[MessageQueue]:
+    """Reclama de forma atómica los mensajes enviables más antiguos.
+
+    Las filas se bloquean con ``FOR UPDATE SKIP LOCKED`` y pasan a ``SENDING``
+    con ``claimed_by``/``claimed_at`` y su lease (``lease_expires_at``) en la
+    misma transacción, de modo que varios procesos sender (en uno o varios
+    hosts) nunca reclaman el mismo mensaje. La ventana de reintento se filtra en SQL para que los mensajes en
+    backoff no ocupen el lote. Los primeros intentos se reclaman antes que los
+    reintentos (ver ``_claim_ids_by_lane``).
+    """
+
     logger.debug(
-        "[SENDER][DEBUG] Cargando mensajes pendientes (estados=%s, límite=%s)",
+        "[SENDER][DEBUG] Reclamando mensajes pendientes (estados=%s, límite=%s, worker=%s)",
         [MessageStatus.PENDING, MessageStatus.FAILED],
         batch_size,
+        worker_id,
     )
-    return query.all()
+    claimed_ids = _claim_ids_by_lane(session, now, batch_size)
+    if not claimed_ids:
+        session.commit()
+        return []
 
+    session.execute(
+        update(MessageQueue)
+        .where(MessageQueue.id.in_(claimed_ids))
+        .values(
+            status=MessageStatus.SENDING,
+            claimed_by=worker_id,
+            claimed_at=now,
+            lease_expires_at=lease_keeper.expires_at(now),
+            updated_at=now,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    lease_keeper.track(claimed_ids)
 
-def _recover_stuck_sending(session: Session, now: datetime) -> int:
-    timeout_seconds = max(settings.sender_stuck_timeout_seconds, 1)
-    threshold = now - timedelta(seconds=timeout_seconds)
-    stuck_messages = (
+    claim_order = {message_id: index for index, message_id in enumerate(claimed_ids)}
+    messages = (
         session.query(MessageQueue)
-        .filter(MessageQueue.status == MessageStatus.SENDING)
-        .filter(MessageQueue.updated_at <= threshold)
+        .options(*_message_load_options())
+        .filter(MessageQueue.id.in_(claimed_ids))
         .all()
     )
-    if not stuck_messages:
-        return 0
+    return sorted(messages, key=lambda message: claim_order[message.id])
 
-    for message in stuck_messages:
-        message.status = MessageStatus.FAILED
-        message.next_retry_at = None
-        message.last_error = "SENDING_TIMEOUT_RECOVERED"
-        message.updated_at = now
-        session.add(message)
 
-    session.commit()
-    logger.warning(
-        "[SENDER] Recuperados %s mensajes en SENDING atascados (> %ss)",
-        len(stuck_messages),
-        timeout_seconds,
+def _claim_ids_by_lane(session: Session, now: datetime, batch_size: int) -> list[int]:
+    """Bloquea los ids del lote repartiendo la capacidad entre carriles.
+
+    Los primeros intentos (``attempts = 0``) tienen reservada la fracción
+    ``SENDER_FIRST_ATTEMPT_SHARE`` del lote; los reintentos ocupan la capacidad
+    restante y, si no hay reintentos suficientes, vuelven a completarse con
+    primeros intentos. Así, durante una caída parcial la cola de reintentos no
+    retrasa las lecturas nuevas, y los reintentos tampoco se quedan sin turno
+    mientras la fracción sea menor que 1. Con una fracción ``<= 0`` se usa un
+    único orden por antigüedad, como antes de existir los carriles.
+    """
+
+    share = min(max(settings.sender_first_attempt_share, 0.0), 1.0)
+    if share <= 0:
+        return list(session.execute(_claim_ids_query(now, batch_size)).scalars())
+
+    first_attempt = MessageQueue.attempts == 0
+    retry = MessageQueue.attempts > 0
+    reserved = max(1, math.ceil(batch_size * share))
+
+    first_ids = list(session.execute(_claim_ids_query(now, reserved, first_attempt)).scalars())
+    retry_ids: list[int] = []
+    if len(first_ids) < batch_size:
+        retry_ids = list(
+            session.execute(_claim_ids_query(now, batch_size - len(first_ids), retry)).scalars()
+        )
+    remaining = batch_size - len(first_ids) - len(retry_ids)
+    if remaining > 0 and len(first_ids) == reserved:
+        # Las filas ya bloqueadas por esta transacción no se saltan con SKIP LOCKED.
+        first_ids += session.execute(
+            _claim_ids_query(now, remaining, first_attempt, MessageQueue.id.notin_(first_ids))
+        ).scalars()
+
+    logger.debug(
+        "[SENDER][DEBUG] Lote por carriles: primeros intentos=%s, reintentos=%s",
+        len(first_ids),
+        len(retry_ids),
     )
-    return len(stuck_messages)
+    return first_ids + retry_ids
 
 
-def _should_skip_retry(message: MessageQueue, now: datetime) -> bool:
-    return message.next_retry_at is not None and message.next_retry_at > now
+def _claim_ids_query(now: datetime, batch_size: int, *filters):
+    """Consulta de ids a reclamar según ``SENDER_SCHEDULING``.
+
+    ``fifo`` ordena por ``created_at``. ``camera`` y ``municipality`` numeran
+    con ``row_number()`` los mensajes de cada cámara (o municipio) por
+    antigüedad y ordenan por ese turno, de modo que el lote intercala un
+    mensaje de cada origen antes de repetir. Todo ocurre en la misma consulta
+    que bloquea las filas (``FOR UPDATE OF messages_queue SKIP LOCKED``).
+    ``filters`` restringe la consulta a un carril (primeros intentos o reintentos).
+    """
+
+    mode = (settings.sender_scheduling or "fifo").strip().lower()
+    if mode not in ("camera", "municipality"):
+        return (
+            select(MessageQueue.id)
+            .where(*_sendable_filters(now), *filters)
+            .order_by(MessageQueue.created_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+
+    partition = AlprReading.camera_id if mode == "camera" else Camera.municipality_id
+    ranked = select(
+        MessageQueue.id.label("id"),
+        func.row_number()
+        .over(partition_by=partition, order_by=(MessageQueue.created_at, MessageQueue.id))
+        .label("turn"),
+    ).join(AlprReading, AlprReading.id == MessageQueue.reading_id)
+    if mode == "municipality":
+        ranked = ranked.join(Camera, Camera.id == AlprReading.camera_id)
+    ranked = ranked.where(*_sendable_filters(now), *filters).subquery("ranked")
+    return (
+        select(MessageQueue.id)
+        .join(ranked, ranked.c.id == MessageQueue.id)
+        .order_by(ranked.c.turn, MessageQueue.created_at, MessageQueue.id)
+        .limit(batch_size)
+        .with_for_update(of=MessageQueue, skip_locked=True)
+    )
 
 
 def _get_plate(reading: AlprReading | None) -> str:
@@ -96,12 +231,13 @@ def _get_plate(reading: AlprReading | None) -> str:
 
 
 def _discard_message(
-    session: Session,
+    writer: StatusWriter,
     message: MessageQueue,
     error: str,
     *,
     log_message: bool = True,
     log_level: int = logging.ERROR,
+    attempts: int | None = None,
 ) -> None:
     plate = _get_plate(message.reading)
     if log_message:
@@ -112,40 +248,7 @@ def _discard_message(
         error,
         message.reading_id,
     )
-    message.status = MessageStatus.DEAD
-    message.last_error = error
-    message.next_retry_at = None
-    message.updated_at = datetime.now(timezone.utc)
-    session.add(message)
-    session.commit()
-
-
-def _delete_expired_dead(session: Session, now: datetime) -> int:
-    retention_minutes = max(settings.sender_dead_retention_minutes, 1)
-    threshold = now - timedelta(minutes=retention_minutes)
-    expired_messages = (
-        session.query(MessageQueue)
-        .options(selectinload(MessageQueue.reading))
-        .filter(MessageQueue.status == MessageStatus.DEAD)
-        .filter(MessageQueue.updated_at <= threshold)
-        .all()
-    )
-    if not expired_messages:
-        return 0
-
-    for message in expired_messages:
-        reading = message.reading
-        if reading:
-            delete_reading_images(reading)
-            session.delete(reading)
-        session.delete(message)
-    session.commit()
-    logger.info(
-        "[SENDER] Eliminados %s mensajes DEAD con antigüedad > %s min",
-        len(expired_messages),
-        retention_minutes,
-    )
-    return len(expired_messages)
+    writer.mark_dead(message.id, error, datetime.now(timezone.utc), attempts=attempts)
 
 
 def _validate_images(reading: AlprReading) -> tuple[bool, str | None]:
@@ -166,86 +269,112 @@ def _validate_images(reading: AlprReading) -> tuple[bool, str | None]:
     return True, None
 
 
-def _mark_sending(session: Session, message: MessageQueue) -> None:
-    message.status = MessageStatus.SENDING
-    message.updated_at = datetime.now(timezone.utc)
-    session.add(message)
-    session.commit()
-    logger.debug("[SENDER][DEBUG] Mensaje %s marcado como SENDING", message.id)
+def _requeue_for_open_circuit(writer: StatusWriter, message: MessageQueue, breaker) -> None:
+    """Devuelve el mensaje a la cola sin consumir intento mientras el circuito está abierto."""
 
+    retry_after = breaker.retry_after()
+    now = datetime.now(timezone.utc)
+    writer.requeue(
+        message.id,
+        status=MessageStatus.FAILED if message.attempts > 0 else MessageStatus.PENDING,
+        next_retry_at=now + timedelta(seconds=retry_after),
+        now=now,
+    )
+    logger.debug(
+        "[SENDER][DEBUG] Mensaje %s devuelto a la cola: circuito %s abierto (reintento en %.1fs)",
+        message.id,
+        breaker.name,
+        retry_after,
+    )
 
-def _delete_success_records(session: Session, message: MessageQueue) -> None:
-    reading = message.reading
-    if reading:
-        delete_reading_images(reading)
-        session.delete(reading)
-    session.delete(message)
-    session.commit()
+
+def process_message(
+    session: Session,
+    message: MessageQueue,
+    writer: StatusWriter | None = None,
+    prefetcher: ImagePrefetcher | None = None,
+) -> None:
+    """Procesa un mensaje reclamado.
+
+    Las transiciones de estado se registran en ``writer``; si no se indica
+    uno, se vuelcan al terminar usando la propia ``session``. Con
+    ``prefetcher`` se usan las imágenes ya precargadas y, si el mensaje se
+    descarta antes de enviarse, se cancela su precarga.
+    """
+
+    if writer is not None:
+        try:
+            _process_message(session, message, writer, prefetcher)
+        finally:
+            if prefetcher is not None:
+                prefetcher.discard(message.id)
+        return
+
+    writer = StatusWriter(lambda: session)
+    try:
+        _process_message(session, message, writer, prefetcher)
+    finally:
+        writer.flush(session)
 
 
-def process_message(session: Session, message: MessageQueue) -> None:
+def _process_message(
+    session: Session,
+    message: MessageQueue,
+    writer: StatusWriter,
+    prefetcher: ImagePrefetcher | None = None,
+) -> None:
     utc_now = datetime.now(timezone.utc)
     local_now = datetime.now().astimezone()
     reading = message.reading
-    camera = reading.camera if reading else None
-    municipality: Municipality | None = camera.municipality if camera else None
+    profile = camera_profiles.get(session, reading.camera_id) if reading else None
     plate = _get_plate(reading)
 
-    if not reading or not camera:
+    if not reading or not profile:
         logger.debug(
             "[SENDER][DEBUG] Mensaje %s sin lectura o cámara en BD (reading=%s camera=%s)",
             message.id,
             reading.id if reading else None,
-            camera.serial_number if camera else None,
+            reading.camera_id if reading else None,
         )
-        _discard_message(session, message, "LECTURA_O_CAMARA_NO_ENCONTRADA")
+        _discard_message(writer, message, "LECTURA_O_CAMARA_NO_ENCONTRADA")
         return
 
     logger.debug(
         "[SENDER][DEBUG] Contexto mensaje id=%s plate=%s ts=%s cámara=%s municipio=%s estado=%s intentos=%s",
         message.id,
-        reading.plate if reading else None,
-        reading.timestamp_utc if reading else None,
-        camera.serial_number if camera else None,
-        municipality.name if municipality else None,
+        reading.plate,
+        reading.timestamp_utc,
+        profile.serial_number,
+        profile.municipality_name,
         message.status,
         message.attempts,
     )
 
-    endpoint = camera.endpoint or (municipality.endpoint if municipality else None)
-    certificate = municipality.certificate if municipality else None
-    if not certificate:
+    if not profile.has_certificate:
         logger.debug(
             "[CERT][DEBUG] No hay certificado configurado para mensaje %s (municipio=%s cámara=%s)",
             message.id,
-            municipality.name if municipality else None,
-            camera.serial_number if camera else None,
+            profile.municipality_name,
+            profile.serial_number,
         )
-        _discard_message(session, message, "CERTIFICADO_NO_CONFIGURADO")
+        _discard_message(writer, message, "CERTIFICADO_NO_CONFIGURADO")
         return
 
-    service_url = endpoint.url if endpoint else settings.MOSSOS_ENDPOINT_URL
+    service_url = profile.service_url
     if not service_url:
         logger.debug(
             "[MOSSOS][DEBUG] Endpoint URL no configurada para mensaje %s (endpoint=%s)",
             message.id,
-            endpoint.id if hasattr(endpoint, "id") else None,
+            profile.endpoint_key,
         )
-        _discard_message(session, message, "ENDPOINT_URL_NO_CONFIGURADA")
+        _discard_message(writer, message, "ENDPOINT_URL_NO_CONFIGURADA")
         return
     logger.debug(
         "[SENDER][DEBUG] Endpoint efectivo para mensaje %s: %s", message.id, service_url
     )
 
-    retry_max, backoff_ms = _resolve_retry_config(endpoint)
-    if message.attempts >= retry_max:
-        _discard_message(session, message, "MAX_REINTENTOS_AGOTADOS")
-        return
-
-    if _should_skip_retry(message, utc_now):
-        logger.debug(
-            "[SENDER][DEBUG] Mensaje %s pospuesto hasta %s por backoff", message.id, message.next_retry_at
-        )
+    if message.attempts >= profile.retry_max:
+        _discard_message(writer, message, "MAX_REINTENTOS_AGOTADOS")
         return
 
     ok_images, image_error = _validate_images(reading)
@@ -253,7 +382,7 @@ def process_message(session: Session, message: MessageQueue) -> None:
         logger.info("[SENDER] Lectura sin imagen (%s) descartada", plate)
         logger.debug("[SENDER][DEBUG] Motivo imagen inválida para %s: %s", plate, image_error)
         _discard_message(
-            session,
+            writer,
             message,
             image_error or "NO_IMAGE_AVAILABLE",
             log_message=False,
@@ -265,166 +394,567 @@ def process_message(session: Session, message: MessageQueue) -> None:
     else:
         logger.info("[SENDER] Enviando lectura (%s)", plate)
 
-    _mark_sending(session, message)
-
-    if not municipality:
+    if not profile.has_municipality:
         logger.debug(
             "[CERT][DEBUG] Municipio no asociado a mensaje %s (camera=%s)",
             message.id,
-            camera.serial_number if camera else None,
+            profile.serial_number,
         )
-        _discard_message(session, message, "MUNICIPIO_NO_DISPONIBLE")
+        _discard_message(writer, message, "MUNICIPIO_NO_DISPONIBLE")
         return
 
-    timeout_ms = endpoint.timeout_ms if getattr(endpoint, "timeout_ms", None) else int(settings.mossos_timeout * 1000)
-    timeout_seconds = max(timeout_ms / 1000.0, 1.0)
+    timeout_seconds = profile.timeout_seconds
+    lease_keeper.observe_timeout(timeout_seconds)
 
-    cert_path = getattr(certificate, "client_cert_path", None) or certificate.path
-    key_path = certificate.key_path
+    cert_path = profile.cert_path
+    key_path = profile.key_path
     if not cert_path or not key_path:
         logger.debug(
             "[CERT][DEBUG] Certificado incompleto para mensaje %s (municipio=%s)",
             message.id,
-            municipality.name if municipality else None,
+            profile.municipality_name,
         )
-        _discard_message(session, message, "CERTIFICADO_INCOMPLETO")
+        _discard_message(writer, message, "CERTIFICADO_INCOMPLETO")
         return
 
-    send_started = time.monotonic()
-    try:
-        client = MossosZeepClient(
-            wsdl_url=settings.MOSSOS_WSDL_URL,
-            endpoint_url=service_url,
-            cert_path=cert_path,
-            key_path=key_path,
-            timeout=timeout_seconds,
-        )
-    except FileNotFoundError as exc:
-        logger.debug("[CERT][DEBUG] %s", exc)
-        _discard_message(session, message, f"CERT_FILE_NOT_FOUND:{exc}")
+    breaker = circuit_breakers.get(profile.endpoint_key, name=service_url)
+    if not breaker.allow_request():
+        _requeue_for_open_circuit(writer, message, breaker)
         return
 
+    # Cualquier error a partir de aquí (pool de clientes, firma, construcción
+    # de la petición, limitador) debe liberar la prueba half-open; si no, el
+    # endpoint quedaría rechazando envíos hasta reiniciar el proceso.
     try:
-        result = client.send_matricula(reading=reading, camera=camera)
-    except FileNotFoundError as exc:
-        logger.info("[SENDER] Lectura sin imagen (%s) descartada", plate)
+        rate_limiters.get(
+            profile.endpoint_key,
+            rate_per_second=profile.rate_per_second,
+            burst=profile.rate_burst,
+            name=service_url,
+        ).acquire()
+
+        send_started = time.monotonic()
+        try:
+            client = client_pool.get(
+                wsdl_url=settings.MOSSOS_WSDL_URL,
+                endpoint_url=service_url,
+                cert_path=cert_path,
+                key_path=key_path,
+                timeout=timeout_seconds,
+            )
+        except FileNotFoundError as exc:
+            breaker.cancel_probe()
+            logger.debug("[CERT][DEBUG] %s", exc)
+            _discard_message(writer, message, f"CERT_FILE_NOT_FOUND:{exc}")
+            return
+
+        images = prefetcher.take(message.id) if prefetcher is not None else None
+        try:
+            result = client.send_matricula(reading=reading, camera=profile, images=images)
+        except FileNotFoundError as exc:
+            breaker.cancel_probe()
+            logger.info("[SENDER] Lectura sin imagen (%s) descartada", plate)
+            logger.debug(
+                "[IMAGEN][DEBUG] Lectura %s sin imagen por error de disco: %s", plate, exc
+            )
+            _discard_message(
+                writer,
+                message,
+                f"NO_IMAGE_FILE_RUNTIME: {exc}",
+                log_message=False,
+            )
+            return
+
+        duration_ms = int((time.monotonic() - send_started) * 1000)
         logger.debug(
-            "[IMAGEN][DEBUG] Lectura %s sin imagen por error de disco: %s", plate, exc
+            "[SENDER][DEBUG] Resultado envío lectura %s (msg_id=%s): éxito=%s http=%s codiRetorn=%s duración=%sms",
+            reading.id,
+            message.id,
+            result.success,
+            result.http_status,
+            result.codi_retorn,
+            duration_ms,
         )
-        _discard_message(
-            session,
-            message,
-            f"NO_IMAGE_FILE_RUNTIME: {exc}",
-            log_message=False,
+
+        if settings.sender_adaptive_enabled:
+            send_stats.record(duration_ms, error=not result.success and result.codi_retorn is None)
+
+        if result.transport_error:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+        attempts = message.attempts + 1
+
+        if result.success:
+            writer.mark_success(message.id, profile.camera_id, local_now)
+            logger.info("[SENDER] Lectura (%s) enviada correctamente a Mossos", plate)
+            return
+
+        error_msg = result.fault or ""
+        if result.codi_retorn:
+            error_msg = (
+                f"codiRetorn={result.codi_retorn}"
+                if not error_msg
+                else f"{error_msg} | codiRetorn={result.codi_retorn}"
+            )
+
+        if not error_msg:
+            error_msg = "RESPUESTA_SIN_DETALLE"
+
+        data_error = result.codi_retorn is not None and (
+            result.codi_retorn not in SUCCESS_CODES
         )
-        return
 
-    duration_ms = int((time.monotonic() - send_started) * 1000)
-    logger.debug(
-        "[SENDER][DEBUG] Resultado envío lectura %s (msg_id=%s): éxito=%s http=%s codiRetorn=%s duración=%sms",
-        reading.id,
-        message.id,
-        result.success,
-        result.http_status,
-        result.codi_retorn,
-        duration_ms,
-    )
+        if data_error or attempts >= profile.retry_max:
+            _discard_message(writer, message, error_msg, attempts=attempts)
+            return
 
-    message.attempts += 1
-    message.updated_at = datetime.now(timezone.utc)
-
-    if result.success:
-        message.status = MessageStatus.SUCCESS
-        message.last_error = None
-        message.last_sent_at = local_now
-        message.sent_at = local_now
-        camera.last_sent_at = local_now
-        session.add(message)
-        session.add(camera)
-        session.flush()
-        _delete_success_records(session, message)
-        logger.info("[SENDER] Lectura (%s) enviada correctamente a Mossos", plate)
+        writer.mark_failed(
+            message.id,
+            attempts=attempts,
+            error=error_msg,
+            next_retry_at=utc_now + timedelta(milliseconds=profile.backoff_ms),
+            now=datetime.now(timezone.utc),
+        )
+        logger.warning("[SENDER] Error enviando lectura (%s): %s", plate, error_msg)
+    except Exception:
+        breaker.cancel_probe()
+        raise
+
+
+def _process_claimed(
+    session: Session,
+    message: MessageQueue,
+    writer: StatusWriter,
+    prefetcher: ImagePrefetcher | None = None,
+) -> None:
+    """Procesa un mensaje reclamado; si lanza una excepción, cuenta como intento fallido.
+
+    Devolverlo a ``PENDING`` sin consumir intento haría que, al ser el más
+    antiguo, se reclamara el primero en cada iteración y bloqueara la cola.
+    """
+
+    message_id, attempts = message.id, message.attempts
+    camera_id = message.reading.camera_id if message.reading else None
+    try:
+        process_message(session, message, writer, prefetcher)
+    except Exception as exc:
+        session.rollback()
+        logger.exception("[SENDER][ERROR] Error inesperado procesando mensaje %s", message_id)
+        _record_unexpected_error(session, writer, message_id, camera_id, attempts + 1, exc)
+
+
+def _record_unexpected_error(
+    session: Session,
+    writer: StatusWriter,
+    message_id: int,
+    camera_id: int | None,
+    attempts: int,
+    exc: Exception,
+) -> None:
+    try:
+        profile = camera_profiles.get(session, camera_id)
+    except Exception:
+        session.rollback()
+        profile = None
+    retry_max = profile.retry_max if profile else settings.sender_default_retry_max
+    backoff_ms = profile.backoff_ms if profile else settings.sender_default_backoff_ms
+    now = datetime.now(timezone.utc)
+    error = f"ERROR_INESPERADO: {exc}"
+    if attempts >= retry_max:
+        logger.error(
+            "[SENDER] Mensaje %s descartado tras %s intentos con error inesperado",
+            message_id,
+            attempts,
+        )
+        writer.mark_dead(message_id, error, now, attempts=attempts)
         return
+    writer.mark_failed(
+        message_id,
+        attempts=attempts,
+        error=error,
+        next_retry_at=now + timedelta(milliseconds=backoff_ms),
+        now=now,
+    )
+
+
+class EndpointLimiter:
+    """Limita cuántos envíos simultáneos puede tener cada endpoint."""
+
+    def __init__(self, max_in_flight: int) -> None:
+        self.max_in_flight = max(int(max_in_flight), 1)
+        self._semaphores: dict[Hashable, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, key: Hashable) -> threading.BoundedSemaphore:
+        with self._lock:
+            semaphore = self._semaphores.get(key)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.max_in_flight)
+                self._semaphores[key] = semaphore
+            return semaphore
+
+    @contextmanager
+    def slot(self, key: Hashable) -> Iterator[None]:
+        semaphore = self._semaphore(key)
+        semaphore.acquire()
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+
+endpoint_limiter = EndpointLimiter(settings.sender_endpoint_max_in_flight)
+
+
+class SendStats:
+    """Latencias y errores de los envíos desde la última lectura.
 
-    error_msg = result.fault or ""
-    if result.codi_retorn:
-        error_msg = (
-            f"codiRetorn={result.codi_retorn}"
-            if not error_msg
-            else f"{error_msg} | codiRetorn={result.codi_retorn}"
+    Solo ``AdaptiveController`` los consume; se guardan como mucho
+    ``max_samples`` envíos para que no crezcan si nadie llama a ``drain``.
+    """
+
+    def __init__(self, max_samples: int = 10000) -> None:
+        self._lock = threading.Lock()
+        self._samples: deque[tuple[int, bool]] = deque(maxlen=max_samples)
+
+    def record(self, duration_ms: int, *, error: bool) -> None:
+        with self._lock:
+            self._samples.append((duration_ms, error))
+
+    def drain(self) -> tuple[int, float | None, float]:
+        """Devuelve ``(envíos, p95 en ms, tasa de error)`` y reinicia los contadores."""
+
+        with self._lock:
+            samples = list(self._samples)
+            self._samples.clear()
+        if not samples:
+            return 0, None, 0.0
+        durations = sorted(duration for duration, _ in samples)
+        errors = sum(1 for _, error in samples if error)
+        p95 = durations[max(math.ceil(len(durations) * 0.95) - 1, 0)]
+        return len(durations), float(p95), errors / len(durations)
+
+
+send_stats = SendStats()
+
+
+@dataclass
+class AdaptiveDecision:
+    batch_size: int
+    wait_seconds: float
+    reason: str
+
+
+class AdaptiveController:
+    """Ajusta el tamaño de lote y la espera entre iteraciones.
+
+    Con backlog se agranda el lote y no se espera; en reposo se reduce el lote
+    y se alarga la espera. Si la latencia p95 supera el objetivo o la tasa de
+    error el máximo, se reduce el lote aunque haya backlog.
+    """
+
+    def __init__(
+        self,
+        *,
+        min_batch: int,
+        max_batch: int,
+        min_wait_seconds: float,
+        max_wait_seconds: float,
+        target_p95_ms: float,
+        max_error_rate: float,
+        initial_batch: int,
+        initial_wait_seconds: float,
+    ) -> None:
+        self.min_batch = max(int(min_batch), 1)
+        self.max_batch = max(int(max_batch), self.min_batch)
+        self.min_wait_seconds = max(float(min_wait_seconds), 0.0)
+        self.max_wait_seconds = max(float(max_wait_seconds), self.min_wait_seconds)
+        self.target_p95_ms = float(target_p95_ms)
+        self.max_error_rate = float(max_error_rate)
+        self.batch_size = self._clamp_batch(initial_batch)
+        self.wait_seconds = self._clamp_wait(initial_wait_seconds)
+
+    @classmethod
+    def from_settings(cls) -> "AdaptiveController":
+        return cls(
+            min_batch=settings.sender_adaptive_min_batch,
+            max_batch=settings.sender_adaptive_max_batch,
+            min_wait_seconds=settings.sender_adaptive_min_wait_seconds,
+            max_wait_seconds=settings.sender_adaptive_max_wait_seconds,
+            target_p95_ms=settings.sender_adaptive_target_p95_ms,
+            max_error_rate=settings.sender_adaptive_max_error_rate,
+            initial_batch=settings.sender_max_batch_size,
+            initial_wait_seconds=settings.sender_poll_interval_seconds,
+        )
+
+    def _clamp_batch(self, value: float) -> int:
+        return int(min(max(value, self.min_batch), self.max_batch))
+
+    def _clamp_wait(self, value: float) -> float:
+        return min(max(value, self.min_wait_seconds), self.max_wait_seconds)
+
+    def update(
+        self, *, backlog: int, sent: int, p95_ms: float | None, error_rate: float
+    ) -> AdaptiveDecision:
+        if sent and error_rate > self.max_error_rate:
+            batch = self.batch_size / 2
+            wait = max(self.wait_seconds * 2, 1.0)
+            reason = f"tasa de error {error_rate:.0%} > {self.max_error_rate:.0%}"
+        elif p95_ms is not None and p95_ms > self.target_p95_ms:
+            batch = self.batch_size * 0.75
+            wait = 0.0 if backlog else self.wait_seconds
+            reason = f"p95 {p95_ms:.0f}ms > objetivo {self.target_p95_ms:.0f}ms"
+        elif backlog > self.batch_size:
+            batch = self.batch_size * 2
+            wait = 0.0
+            reason = f"backlog {backlog}"
+        elif backlog:
+            batch = self.batch_size
+            wait = 0.0
+            reason = f"backlog {backlog} cabe en un lote"
+        else:
+            batch = self.batch_size / 2
+            wait = max(self.wait_seconds * 2, 1.0)
+            reason = "cola vacía"
+
+        decision = AdaptiveDecision(self._clamp_batch(batch), self._clamp_wait(wait), reason)
+        changed = (decision.batch_size, decision.wait_seconds) != (self.batch_size, self.wait_seconds)
+        self.batch_size, self.wait_seconds = decision.batch_size, decision.wait_seconds
+        logger.log(
+            logging.INFO if changed else logging.DEBUG,
+            "[SENDER] Control adaptativo: lote=%s espera=%.1fs (%s; enviados=%s p95=%s error=%.0f%%)",
+            decision.batch_size,
+            decision.wait_seconds,
+            decision.reason,
+            sent,
+            f"{p95_ms:.0f}ms" if p95_ms is not None else "-",
+            error_rate * 100,
+        )
+        return decision
+
+
+def _count_backlog(limit: int) -> int:
+    """Cuenta mensajes enviables, como máximo ``limit`` (usa el índice parcial)."""
+
+    session = SessionLocal()
+    try:
+        sendable = (
+            select(MessageQueue.id)
+            .where(*_sendable_filters(datetime.now(timezone.utc)))
+            .limit(limit)
+            .subquery()
         )
+        return session.execute(select(func.count()).select_from(sendable)).scalar_one()
+    finally:
+        session.close()
+
+
+def _endpoint_key(session: Session, message: MessageQueue) -> Hashable:
+    """Clave del endpoint efectivo de un mensaje (cámara, municipio o defecto)."""
+
+    reading = message.reading
+    profile = camera_profiles.get(session, reading.camera_id) if reading else None
+    return profile.endpoint_key if profile else None
+
+
+def _process_message_isolated(
+    message_id: int, endpoint_key: Hashable, writer: StatusWriter
+) -> bool:
+    """Procesa un mensaje en su propia sesión respetando el límite del endpoint.
+
+    Devuelve ``False`` si el mensaje no se llegó a procesar (parada o error al
+    cargarlo); los errores durante el envío cuentan como intento fallido.
+    """
+
+    if shutdown_requested.is_set():
+        return False
+    with endpoint_limiter.slot(endpoint_key):
+        session = SessionLocal()
+        try:
+            message = (
+                session.query(MessageQueue)
+                .options(*_message_load_options())
+                .filter(MessageQueue.id == message_id)
+                .one_or_none()
+            )
+            if message is None:
+                logger.debug("[SENDER][DEBUG] Mensaje %s ya no existe; se omite", message_id)
+                return True
+            _process_claimed(session, message, writer)
+        except Exception:
+            session.rollback()
+            logger.exception("[SENDER][ERROR] Error inesperado procesando mensaje %s", message_id)
+            return False
+        finally:
+            session.close()
+    writer.maybe_flush()
+    return True
 
-    if not error_msg:
-        error_msg = "RESPUESTA_SIN_DETALLE"
 
-    data_error = result.codi_retorn is not None and (
-        result.codi_retorn not in SUCCESS_CODES
+def _dispatch_concurrently(
+    jobs: list[tuple[int, Hashable]], writer: StatusWriter
+) -> list[int]:
+    """Envía los mensajes del lote en paralelo con un pool de hilos.
+
+    Cada mensaje usa su propia sesión; el límite global lo marca
+    ``sender_concurrency`` y el límite por endpoint ``endpoint_limiter``.
+    Devuelve los ids de los mensajes procesados.
+    """
+
+    workers = min(settings.sender_concurrency, len(jobs))
+    logger.debug(
+        "[SENDER][DEBUG] Envío concurrente de %s mensajes (hilos=%s, máx. por endpoint=%s)",
+        len(jobs),
+        workers,
+        endpoint_limiter.max_in_flight,
     )
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sender") as executor:
+        futures = [
+            executor.submit(_process_message_isolated, message_id, endpoint_key, writer)
+            for message_id, endpoint_key in jobs
+        ]
+        return [
+            message_id
+            for (message_id, _), future in zip(jobs, futures)
+            if future.result()
+        ]
 
-    message.last_error = error_msg
-    if data_error:
-        _discard_message(session, message, error_msg)
-        return
-    elif message.attempts >= retry_max:
-        _discard_message(session, message, error_msg)
-        return
-    else:
-        message.status = MessageStatus.FAILED
-        message.next_retry_at = utc_now + timedelta(milliseconds=backoff_ms)
-        logger.warning("[SENDER] Error enviando lectura (%s): %s", plate, error_msg)
 
-    session.add(message)
-    session.commit()
+def _release_unprocessed(message_ids: list[int]) -> None:
+    """Devuelve a la cola los mensajes reclamados que la iteración no llegó a empezar."""
+
+    if not message_ids:
+        return
+    session = SessionLocal()
+    try:
+        released = release_claims(
+            session, worker_identity(), message_ids, datetime.now(timezone.utc)
+        )
+        logger.warning(
+            "[SENDER] %s mensajes reclamados sin procesar devueltos a PENDING", released
+        )
+    except Exception as exc:
+        session.rollback()
+        logger.warning(
+            "[SENDER] No se pudieron liberar %s mensajes reclamados; se recuperarán al "
+            "vencer su lease: %s",
+            len(message_ids),
+            exc,
+        )
+    finally:
+        session.close()
+        lease_keeper.untrack(message_ids)
 
 
-def run_sender_iteration() -> int:
+def run_sender_iteration(
+    batch_size: int | None = None, writer: StatusWriter | None = None
+) -> int:
     """Procesa un lote de mensajes pendientes.
 
     Devuelve el número de mensajes intentados en la iteración para poder tomar
-    decisiones de logging desde el bucle principal.
+    decisiones de logging desde el bucle principal. ``writer`` se conserva
+    entre iteraciones para reintentar las transiciones que no se pudieron
+    guardar; mientras quede alguna no se reclaman mensajes nuevos.
     """
 
     session = SessionLocal()
+    writer = writer or StatusWriter()
+    prefetcher: ImagePrefetcher | None = None
     processed = 0
-    batch_size = settings.sender_max_batch_size
+    claimed_ids: list[int] = []
+    handled: set[int] = set()
+    batch_size = batch_size or settings.sender_max_batch_size
     iteration_started = time.monotonic()
     logger.debug("[SENDER][DEBUG] Buscando mensajes pendientes (límite=%s)", batch_size)
     try:
-        now = datetime.now(timezone.utc)
-        recovered = _recover_stuck_sending(session, now)
-        if recovered:
-            logger.debug(
-                "[SENDER][DEBUG] Mensajes recuperados de SENDING: %s", recovered
+        writer.flush()
+        if writer.pending:
+            logger.warning(
+                "[SENDER] Quedan %s transiciones sin guardar; no se reclaman mensajes nuevos",
+                writer.pending,
             )
-        cleaned = _delete_expired_dead(session, now)
-        if cleaned:
-            logger.debug("[SENDER][DEBUG] Mensajes DEAD eliminados: %s", cleaned)
-        candidates = _load_candidates(session, batch_size)
-        logger.debug("[SENDER][DEBUG] %s mensajes pendientes cargados para envío", len(candidates))
-        for message in candidates:
-            logger.debug(
-                "[SENDER][DEBUG] Procesando mensaje %s creado en %s", message.id, message.created_at
+            return 0
+        now = datetime.now(timezone.utc)
+        candidates = _claim_candidates(session, batch_size, now, worker_identity())
+        claimed_ids = [message.id for message in candidates]
+        logger.debug("[SENDER][DEBUG] %s mensajes reclamados para envío", len(candidates))
+        if settings.sender_concurrency > 1 and len(candidates) > 1:
+            jobs = [(message.id, _endpoint_key(session, message)) for message in candidates]
+            session.close()
+            handled.update(_dispatch_concurrently(jobs, writer))
+            processed = len(handled)
+        else:
+            prefetcher = ImagePrefetcher(
+                depth=settings.sender_prefetch_depth,
+                max_bytes=settings.sender_prefetch_max_mb * 1024 * 1024,
             )
-            if _should_skip_retry(message, now):
+            prefetcher.queue(candidates)
+            for message in candidates:
+                if shutdown_requested.is_set():
+                    break
                 logger.debug(
-                    "[SENDER][DEBUG] Mensaje %s omitido hasta %s por ventana de reintento",
+                    "[SENDER][DEBUG] Procesando mensaje %s creado en %s",
                     message.id,
-                    message.next_retry_at,
+                    message.created_at,
                 )
-                continue
-            process_message(session, message)
-            processed += 1
+                _process_claimed(session, message, writer, prefetcher)
+                handled.add(message.id)
+                writer.maybe_flush()
+                processed += 1
     finally:
+        if prefetcher is not None:
+            prefetcher.close()
+            if prefetcher.enabled and processed:
+                logger.debug(
+                    "[SENDER][DEBUG] Precarga de imágenes: aciertos=%s fallos=%s",
+                    prefetcher.hits,
+                    prefetcher.misses,
+                )
+        writer.flush()
         session.close()
+        _release_unprocessed([message_id for message_id in claimed_ids if message_id not in handled])
         elapsed_ms = int((time.monotonic() - iteration_started) * 1000)
         logger.debug(
             "[SENDER][DEBUG] Iteración completada: procesados=%s duración=%sms",
             processed,
             elapsed_ms,
         )
+        if processed:
+            logger.debug("[SENDER][DEBUG] Pool de clientes SOAP: %s", client_pool.stats())
+            logger.debug("[SENDER][DEBUG] Conexiones HTTP por host: %s", http_sessions.stats())
+            logger.debug("[SENDER][DEBUG] Perfiles de cámara: %s", camera_profiles.stats())
+        for name, (waits, seconds) in rate_limiters.drain_throttled().items():
+            logger.info(
+                "[SENDER] Limitador de tasa %s: %s envíos esperaron %.2fs en total",
+                name,
+                waits,
+                seconds,
+            )
     return processed
 
 
+# Se activa con SIGTERM (p. ej. al parar un shard desde el supervisor): el
+# sender termina el mensaje en curso y sale por los ``finally`` habituales.
+shutdown_requested = threading.Event()
+
+
+def _request_shutdown(signum, _frame) -> None:
+    logger.info("[SENDER] Señal %s recibida; se detiene tras el mensaje en curso", signum)
+    shutdown_requested.set()
+
+
+def _wait_for_messages(listener: QueueListener | None, timeout: float) -> None:
+    """Espera a que la ingesta avise de mensajes nuevos o venza ``timeout``."""
+
+    if listener is None:
+        shutdown_requested.wait(timeout)
+        return
+    if listener.wait(timeout):
+        logger.debug("[SENDER][DEBUG] Aviso de cola recibido; se inicia una iteración")
+
+
 def run_sender_worker() -> None:
     if not settings.sender_enabled:
         logger.warning("[SENDER][ADVERTENCIA] Sender deshabilitado por variable de entorno")
@@ -434,11 +964,63 @@ def run_sender_worker() -> None:
         "[SENDER] Worker de envío iniciado. Intervalo de sondeo=%ss",
         settings.sender_poll_interval_seconds,
     )
-    while True:
-        try:
-            processed = run_sender_iteration()
-            if processed == 0:
-                time.sleep(settings.sender_poll_interval_seconds)
-        except Exception:  # pragma: no cover - seguridad del bucle
-            logger.exception("[SENDER][ERROR] Error inesperado en el bucle principal")
-            time.sleep(settings.sender_poll_interval_seconds)
+    if settings.sender_shard_count > 1:
+        logger.info(
+            "[SENDER] Shard %s de %s (municipios con id %% %s == %s)",
+            settings.sender_shard_index,
+            settings.sender_shard_count,
+            settings.sender_shard_count,
+            settings.sender_shard_index % settings.sender_shard_count,
+        )
+    listener = (
+        QueueListener(engine, callbacks={CONFIG_CHANNEL: camera_profiles.invalidate})
+        if settings.sender_listen_enabled
+        else None
+    )
+    if listener is not None:
+        listener.start()
+    controller = AdaptiveController.from_settings() if settings.sender_adaptive_enabled else None
+    writer = StatusWriter()
+    shutdown_requested.clear()
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _request_shutdown)
+    lease_keeper.start(worker_identity())
+    if settings.sender_maintenance_enabled:
+        maintenance_scheduler.start()
+    try:
+        while not shutdown_requested.is_set():
+            try:
+                if listener is not None:
+                    listener.poll()
+                if controller is None:
+                    processed = run_sender_iteration(writer=writer)
+                    if processed == 0:
+                        _wait_for_messages(listener, settings.sender_poll_interval_seconds)
+                    continue
+                run_sender_iteration(controller.batch_size, writer)
+                if writer.pending:
+                    # La BD no acepta el volcado: se espera antes de reintentarlo.
+                    _wait_for_messages(listener, settings.sender_poll_interval_seconds)
+                    continue
+                sent, p95_ms, error_rate = send_stats.drain()
+                decision = controller.update(
+                    backlog=_count_backlog(controller.max_batch + 1),
+                    sent=sent,
+                    p95_ms=p95_ms,
+                    error_rate=error_rate,
+                )
+                if decision.wait_seconds > 0:
+                    _wait_for_messages(listener, decision.wait_seconds)
+            except Exception:  # pragma: no cover - seguridad del bucle
+                logger.exception("[SENDER][ERROR] Error inesperado en el bucle principal")
+                shutdown_requested.wait(settings.sender_poll_interval_seconds)
+    finally:
+        if listener is not None:
+            listener.close()
+        writer.flush()
+        maintenance_scheduler.stop()
+        image_deletion_queue.drain()
+        lease_keeper.stop()
+        signing_pool.shutdown()
+        http_sessions.close()
+        logger.info("[SENDER] Worker de envío detenido")
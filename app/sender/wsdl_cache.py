@@ -0,0 +1,198 @@
+"""Caché persistente en disco del WSDL de Mossos y sus XSD importados.
+
+Zeep descarga el WSDL y todos los esquemas importados cada vez que se
+construye un ``zeep.Client``. Esta caché guarda cada documento en un
+directorio versionado (formato de caché + versión de Zeep) para que el sender
+arranque sin depender del host del WSDL, y permite servir copias caducadas
+cuando la descarga falla o cuando se trabaja en modo "preferir caché".
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+
+from zeep import Settings
+from zeep import __version__ as zeep_version
+from zeep.cache import Base as ZeepCacheBase
+from zeep.transports import Transport
+from zeep.wsdl import Document
+
+from app.config import settings
+from app.logger import logger
+
+CACHE_FORMAT_VERSION = 1
+CACHED_SCHEMES = ("http", "https")
+
+
+class WsdlFileCache(ZeepCacheBase):
+    """Backend de caché de Zeep que persiste documentos como ficheros."""
+
+    def __init__(self, base_dir: str, *, ttl_seconds: float) -> None:
+        self.path = Path(base_dir) / f"v{CACHE_FORMAT_VERSION}-zeep{zeep_version}"
+        self.ttl_seconds = max(float(ttl_seconds), 0.0)
+
+    def _entry_paths(self, url: str) -> tuple[Path, Path]:
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.path / f"{digest}.xml", self.path / f"{digest}.json"
+
+    def get(self, url: str, *, allow_stale: bool = False) -> Optional[bytes]:
+        content_path, meta_path = self._entry_paths(url)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            content = content_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+
+        if meta.get("url") != url:
+            return None
+        age = time.time() - float(meta.get("stored_at", 0))
+        if not allow_stale and self.ttl_seconds and age > self.ttl_seconds:
+            logger.debug("[WSDL][DEBUG] Entrada de caché caducada (%ss) para %s", int(age), url)
+            return None
+        return content
+
+    def add(self, url: str, content: bytes | str) -> None:
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        content_path, meta_path = self._entry_paths(url)
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            _atomic_write(content_path, content)
+            _atomic_write(
+                meta_path,
+                json.dumps({"url": url, "stored_at": time.time()}).encode("utf-8"),
+            )
+        except OSError as exc:
+            logger.warning("[WSDL] No se pudo guardar %s en la caché %s: %s", url, self.path, exc)
+            return
+        logger.debug("[WSDL][DEBUG] Documento cacheado: %s", url)
+
+
+def _atomic_write(target: Path, data: bytes) -> None:
+    fd, tmp_name = tempfile.mkstemp(dir=target.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        os.replace(tmp_name, target)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+
+class CachingTransport(Transport):
+    """Transport de Zeep que consulta la caché de WSDL antes de ir a red.
+
+    - ``prefer_cache``: usa la copia cacheada aunque haya caducado el TTL.
+    - ``refresh``: ignora la caché al cargar y la reescribe (precalentado).
+
+    Si la descarga falla y existe una copia caducada, se usa esa copia.
+    """
+
+    def __init__(
+        self,
+        *args,
+        wsdl_cache: Optional[WsdlFileCache] = None,
+        prefer_cache: bool = False,
+        refresh: bool = False,
+        **kwargs,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.wsdl_cache = wsdl_cache
+        self.prefer_cache = prefer_cache
+        self.refresh = refresh
+        self.loaded_urls: list[str] = []
+
+    def load(self, url):
+        if not self.wsdl_cache or urlparse(url).scheme not in CACHED_SCHEMES:
+            return super().load(url)
+
+        if not self.refresh:
+            cached = self.wsdl_cache.get(url, allow_stale=self.prefer_cache)
+            if cached is not None:
+                return cached
+
+        try:
+            content = self._load_remote_data(url)
+        except Exception as exc:
+            stale = self.wsdl_cache.get(url, allow_stale=True)
+            if stale is None:
+                raise
+            logger.warning(
+                "[WSDL] No se pudo descargar %s (%s); se usa la copia cacheada", url, exc
+            )
+            return stale
+
+        self.wsdl_cache.add(url, content)
+        self.loaded_urls.append(url)
+        return content
+
+
+def default_cache_dir() -> str:
+    """Directorio de caché: ``WSDL_CACHE_DIR`` o ``wsdl_cache`` junto a ``CERTS_DIR``."""
+
+    if settings.wsdl_cache_dir:
+        return settings.wsdl_cache_dir
+    certs_dir = os.path.normpath(settings.CERTS_DIR)
+    return os.path.join(os.path.dirname(certs_dir), "wsdl_cache")
+
+
+def get_wsdl_cache() -> Optional[WsdlFileCache]:
+    if not settings.wsdl_cache_enabled:
+        return None
+    return WsdlFileCache(default_cache_dir(), ttl_seconds=settings.wsdl_cache_ttl_seconds)
+
+
+def build_transport(session, timeout: float, **kwargs) -> Transport:
+    """Crea el transport del cliente Mossos con la caché de WSDL configurada."""
+
+    wsdl_cache = get_wsdl_cache()
+    if wsdl_cache is None:
+        return Transport(session=session, timeout=timeout, **kwargs)
+    return CachingTransport(
+        session=session,
+        timeout=timeout,
+        wsdl_cache=wsdl_cache,
+        prefer_cache=settings.wsdl_cache_prefer,
+        **kwargs,
+    )
+
+
+def warm_wsdl_cache(wsdl_url: Optional[str] = None) -> list[str]:
+    """Descarga el WSDL y sus XSD importados y los guarda en la caché.
+
+    Devuelve la lista de URLs almacenadas.
+    """
+
+    url = wsdl_url or settings.MOSSOS_WSDL_URL
+    wsdl_cache = WsdlFileCache(default_cache_dir(), ttl_seconds=settings.wsdl_cache_ttl_seconds)
+    transport = CachingTransport(
+        timeout=max(settings.mossos_timeout, 1.0) * 6,
+        wsdl_cache=wsdl_cache,
+        refresh=True,
+    )
+    Document(url, transport, settings=Settings(strict=True, xml_huge_tree=True))
+    logger.info(
+        "[WSDL] Caché precalentada en %s (%s documentos)",
+        wsdl_cache.path,
+        len(transport.loaded_urls),
+    )
+    return transport.loaded_urls
+
+
+__all__ = [
+    "CachingTransport",
+    "WsdlFileCache",
+    "build_transport",
+    "default_cache_dir",
+    "get_wsdl_cache",
+    "warm_wsdl_cache",
+]
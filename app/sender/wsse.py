@@ -1,13 +1,150 @@
 """WS-Security helpers for Mossos integration."""
 from __future__ import annotations
 
+import base64
+import os
+import re
+import threading
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 from uuid import uuid4
 
+from lxml import etree
 from lxml.etree import QName
 from zeep import ns
-from zeep.wsse.signature import BinarySignature
-from zeep.wsse.utils import WSU, get_security_header
+from zeep.utils import detect_soap_env
+from zeep.wsse.signature import BinarySignature, _sign_node, check_xmlsec_import
+from zeep.wsse.utils import WSU, ensure_id, get_security_header
+
+try:
+    import xmlsec
+except ImportError:  # pragma: no cover - se valida con check_xmlsec_import
+    xmlsec = None
+
+X509_TOKEN_TYPE = (
+    "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-x509-token-profile-1.0#X509v3"
+)
+BASE64_ENCODING_TYPE = (
+    "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-soap-message-security-1.0#Base64Binary"
+)
+
+_PEM_CERT_RE = re.compile(
+    rb"-----BEGIN CERTIFICATE-----\s*(.+?)\s*-----END CERTIFICATE-----", re.DOTALL
+)
+
+
+@dataclass(frozen=True)
+class SigningContext:
+    """Material de firma ya cargado para un par certificado/clave."""
+
+    key: "xmlsec.Key"
+    cert_data: bytes
+    token: str
+    key_mtime: int
+    cert_mtime: int
+
+
+def _binary_security_token(cert_data: bytes, cert_path: str) -> str:
+    match = _PEM_CERT_RE.search(cert_data)
+    if match is None:
+        raise ValueError(f"El certificado no contiene un bloque PEM válido: {cert_path}")
+    der = base64.b64decode(b"".join(match.group(1).split()))
+    return base64.b64encode(der).decode("ascii")
+
+
+class SigningContextCache:
+    """Caché de ``SigningContext`` por certificado.
+
+    Parsear la clave PEM y el certificado con xmlsec es lo más caro de preparar
+    una firma; aquí se hace una vez por fichero y se repite solo cuando cambia
+    su ``mtime``.
+    """
+
+    def __init__(self) -> None:
+        self._contexts: dict[tuple[str, str, Optional[bytes]], SigningContext] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, key_path: str, cert_path: str, password: Optional[bytes] = None) -> SigningContext:
+        key_mtime = os.stat(key_path).st_mtime_ns
+        cert_mtime = os.stat(cert_path).st_mtime_ns
+        cache_key = (key_path, cert_path, password)
+        with self._lock:
+            context = self._contexts.get(cache_key)
+            if (
+                context is not None
+                and context.key_mtime == key_mtime
+                and context.cert_mtime == cert_mtime
+            ):
+                return context
+
+        check_xmlsec_import()
+        with open(key_path, "rb") as handle:
+            key_data = handle.read()
+        with open(cert_path, "rb") as handle:
+            cert_data = handle.read()
+        key = xmlsec.Key.from_memory(key_data, xmlsec.KeyFormat.PEM, password)
+        key.load_cert_from_memory(cert_data, xmlsec.KeyFormat.PEM)
+        context = SigningContext(
+            key=key,
+            cert_data=cert_data,
+            token=_binary_security_token(cert_data, cert_path),
+            key_mtime=key_mtime,
+            cert_mtime=cert_mtime,
+        )
+        with self._lock:
+            self._contexts[cache_key] = context
+            self.loads += 1
+        return context
+
+    def clear(self) -> None:
+        with self._lock:
+            self._contexts.clear()
+
+
+signing_contexts = SigningContextCache()
+
+
+def sign_envelope_binary(envelope, context: SigningContext, signature_method=None, digest_method=None):
+    """Firma Body y Timestamp y referencia el certificado con un BinarySecurityToken.
+
+    Produce la misma estructura que ``_sign_envelope_with_key_binary`` de Zeep,
+    pero el token sale del contexto ya cargado en lugar de que xmlsec vuelva a
+    serializar el certificado en cada firma.
+    """
+
+    soap_env = detect_soap_env(envelope)
+    signature = xmlsec.template.create(
+        envelope,
+        xmlsec.Transform.EXCL_C14N,
+        signature_method or xmlsec.Transform.RSA_SHA1,
+    )
+    key_info = xmlsec.template.ensure_key_info(signature)
+    security = get_security_header(envelope)
+    security.insert(0, signature)
+
+    ctx = xmlsec.SignatureContext()
+    ctx.key = context.key
+    _sign_node(ctx, signature, envelope.find(QName(soap_env, "Body")), digest_method)
+    timestamp = security.find(QName(ns.WSU, "Timestamp"))
+    if timestamp is not None:
+        _sign_node(ctx, signature, timestamp, digest_method)
+    ctx.sign(signature)
+
+    bintok = etree.Element(
+        QName(ns.WSSE, "BinarySecurityToken"),
+        {"ValueType": X509_TOKEN_TYPE, "EncodingType": BASE64_ENCODING_TYPE},
+    )
+    bintok.text = context.token
+    sec_token_ref = etree.SubElement(key_info, QName(ns.WSSE, "SecurityTokenReference"))
+    etree.SubElement(
+        sec_token_ref,
+        QName(ns.WSSE, "Reference"),
+        {"ValueType": X509_TOKEN_TYPE, "URI": "#" + ensure_id(bintok)},
+    )
+    security.insert(1, bintok)
+    return envelope
 
 
 class TimestampedBinarySignature(BinarySignature):
@@ -17,11 +154,38 @@ class TimestampedBinarySignature(BinarySignature):
     firme junto al Body. Este wrapper se asegura de crear el Timestamp con un
     ``wsu:Id`` único y lo deja listo para que la firma de Zeep lo incluya en las
     referencias firmadas.
+
+    La clave y el certificado se obtienen de ``SigningContextCache``, de modo
+    que ``apply`` solo calcula digests y firma.
     """
 
-    def __init__(self, *args, timestamp_ttl_seconds: int = 300, **kwargs):
+    def __init__(
+        self,
+        key_file,
+        certfile,
+        password=None,
+        signature_method=None,
+        digest_method=None,
+        *,
+        timestamp_ttl_seconds: int = 300,
+        contexts: SigningContextCache = signing_contexts,
+    ):
+        check_xmlsec_import()
+        self.key_file = key_file
+        self.certfile = certfile
+        self.password = password
+        self.signature_method = signature_method
+        self.digest_method = digest_method
         self.timestamp_ttl_seconds = timestamp_ttl_seconds
-        super().__init__(*args, **kwargs)
+        self.contexts = contexts
+        self.signing_context()
+
+    def signing_context(self) -> SigningContext:
+        return self.contexts.get(self.key_file, self.certfile, self.password)
+
+    @property
+    def cert_data(self) -> bytes:
+        return self.signing_context().cert_data
 
     def _create_timestamp(self):
         created = datetime.now(timezone.utc).replace(microsecond=0)
@@ -35,7 +199,16 @@ class TimestampedBinarySignature(BinarySignature):
         timestamp = security.find(QName(ns.WSU, "Timestamp"))
         if timestamp is None:
             security.insert(0, self._create_timestamp())
-        return super().apply(envelope, headers)
+        sign_envelope_binary(
+            envelope, self.signing_context(), self.signature_method, self.digest_method
+        )
+        return envelope, headers
 
 
-__all__ = ["TimestampedBinarySignature"]
+__all__ = [
+    "SigningContext",
+    "SigningContextCache",
+    "TimestampedBinarySignature",
+    "sign_envelope_binary",
+    "signing_contexts",
+]
@@ -11,6 +11,9 @@ from app.logger import logger
 
 
 IMAGES_BASE = Path(settings.images_dir)
+BASE64_SUFFIX = ".b64"
+# Modos de IMAGE_STORAGE_MODE que guardan el texto base64 recibido.
+BASE64_STORAGE_MODES = ("jpeg+b64", "b64")
 
 
 def normalize_plate(plate: Optional[str]) -> str:
@@ -64,6 +67,23 @@ def resolve_image_path(path_from_db: Optional[str]) -> Path:
     return IMAGES_BASE / p
 
 
+def base64_sidecar(full_path: Path) -> Path:
+    """Ruta del fichero ``.b64`` con el texto base64 de una imagen JPEG."""
+
+    return full_path.with_name(full_path.name + BASE64_SUFFIX)
+
+
+def image_files(path_from_db: Optional[str]) -> list[Path]:
+    """Ficheros en disco de una imagen: el principal y, si existe, su sidecar base64."""
+
+    if not path_from_db:
+        return []
+    full_path = resolve_image_path(path_from_db)
+    if full_path.name.endswith(BASE64_SUFFIX):
+        return [full_path]
+    return [full_path, base64_sidecar(full_path)]
+
+
 def save_reading_image(
     *,
     plate: str,
@@ -0,0 +1,181 @@
+"""Avisos LISTEN/NOTIFY de PostgreSQL para despertar al sender.
+
+La ingesta emite ``NOTIFY`` en ``QUEUE_CHANNEL`` dentro de la misma
+transacción que encola la lectura (PostgreSQL lo entrega al hacer commit). El
+sender espera en ``LISTEN`` con un timeout de respaldo en lugar de dormir el
+intervalo de sondeo completo. Con otros motores (SQLite en tests) no se
+notifica nada y la espera es un ``sleep`` normal.
+
+Los cambios de configuración (cámaras, municipios, endpoints, certificados)
+se avisan en ``CONFIG_CHANNEL`` para que el sender invalide sus cachés; en el
+propio proceso se llama además a los callbacks de ``on_config_change``.
+"""
+from __future__ import annotations
+
+import select
+import time
+from typing import Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.logger import logger
+
+QUEUE_CHANNEL = "messages_queue"
+CONFIG_CHANNEL = "sender_config"
+
+_config_callbacks: list[Callable[[], None]] = []
+
+
+def _is_postgresql(bind) -> bool:
+    return bind is not None and bind.dialect.name == "postgresql"
+
+
+def notify_queue(session: Session, channel: str = QUEUE_CHANNEL) -> None:
+    """Programa un aviso en ``channel`` que se enviará al confirmar la transacción."""
+
+    if _is_postgresql(session.get_bind()):
+        session.execute(text("SELECT pg_notify(:channel, '')"), {"channel": channel})
+
+
+def on_config_change(callback: Callable[[], None]) -> None:
+    """Registra un callback que se llama al cambiar la configuración en este proceso."""
+
+    _config_callbacks.append(callback)
+
+
+def remove_config_callback(callback: Callable[[], None]) -> None:
+    """Quita un callback registrado con ``on_config_change``."""
+
+    if callback in _config_callbacks:
+        _config_callbacks.remove(callback)
+
+
+def notify_config_change(session: Session) -> None:
+    """Programa el aviso en ``CONFIG_CHANNEL`` (se llama desde ``after_flush``).
+
+    PostgreSQL solo entrega el ``NOTIFY`` si la transacción se confirma.
+    """
+
+    if _is_postgresql(session.get_bind()):
+        session.connection().execute(
+            text("SELECT pg_notify(:channel, '')"), {"channel": CONFIG_CHANNEL}
+        )
+
+
+def run_config_callbacks() -> None:
+    """Llama a los callbacks locales (se llama desde ``after_commit``)."""
+
+    for callback in list(_config_callbacks):
+        callback()
+
+
+class QueueListener:
+    """Conexión dedicada en ``LISTEN`` para esperar mensajes nuevos.
+
+    ``callbacks`` asocia canales adicionales (p. ej. ``CONFIG_CHANNEL``) a una
+    función que se llama cada vez que llega un aviso en ese canal.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        channel: str = QUEUE_CHANNEL,
+        callbacks: Optional[dict[str, Callable[[], None]]] = None,
+    ) -> None:
+        self.engine = engine
+        self.channel = channel
+        self.callbacks = dict(callbacks or {})
+        self._connection = None
+
+    @property
+    def supported(self) -> bool:
+        return _is_postgresql(self.engine)
+
+    def start(self) -> bool:
+        """Abre la conexión y ejecuta ``LISTEN``; devuelve si quedó escuchando."""
+
+        if not self.supported:
+            return False
+        if self._connection is not None:
+            return True
+        try:
+            connection = self.engine.raw_connection()
+            driver_connection = connection.driver_connection
+            driver_connection.autocommit = True
+            with driver_connection.cursor() as cursor:
+                for channel in (self.channel, *self.callbacks):
+                    cursor.execute(f'LISTEN "{channel}"')
+        except Exception as exc:
+            logger.warning("[SENDER] No se pudo iniciar LISTEN %s; se usa sondeo: %s", self.channel, exc)
+            return False
+        self._connection = connection
+        logger.info("[SENDER] Escuchando avisos de cola en el canal %s", self.channel)
+        return True
+
+    def wait(self, timeout: float) -> bool:
+        """Espera un aviso como máximo ``timeout`` segundos.
+
+        Devuelve ``True`` si llegó algún aviso (incluidos los recibidos durante
+        la iteración anterior) y ``False`` si venció el timeout.
+        """
+
+        if not self.start():
+            time.sleep(timeout)
+            return False
+
+        driver_connection = self._connection.driver_connection
+        try:
+            if self._drain(driver_connection):
+                return True
+            ready, _, _ = select.select([driver_connection], [], [], timeout)
+            return bool(ready) and self._drain(driver_connection)
+        except Exception as exc:
+            logger.warning("[SENDER] Conexión LISTEN perdida; se reabrirá: %s", exc)
+            self.close()
+            time.sleep(timeout)
+            return False
+
+    def poll(self) -> None:
+        """Procesa sin esperar los avisos pendientes (llama a los callbacks)."""
+
+        if self._connection is None:
+            return
+        try:
+            self._drain(self._connection.driver_connection)
+        except Exception as exc:
+            logger.warning("[SENDER] Conexión LISTEN perdida; se reabrirá: %s", exc)
+            self.close()
+
+    def _drain(self, driver_connection) -> bool:
+        """Vacía los avisos recibidos; devuelve si hubo alguno en la cola."""
+
+        driver_connection.poll()
+        channels = {notify.channel for notify in driver_connection.notifies}
+        driver_connection.notifies.clear()
+        for channel in channels:
+            callback = self.callbacks.get(channel)
+            if callback is not None:
+                callback()
+        return self.channel in channels
+
+    def close(self) -> None:
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.invalidate()
+            except Exception:  # pragma: no cover - defensivo
+                pass
+
+
+__all__ = [
+    "CONFIG_CHANNEL",
+    "QUEUE_CHANNEL",
+    "QueueListener",
+    "notify_config_change",
+    "notify_queue",
+    "on_config_change",
+    "remove_config_callback",
+    "run_config_callbacks",
+]
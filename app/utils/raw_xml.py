@@ -0,0 +1,89 @@
+"""Política de almacenamiento del XML original de las lecturas.
+
+El XML de Tattile trae las imágenes ``IMAGE_OCR``/``IMAGE_CTX`` en base64, que
+la ingesta ya guarda en disco. Guardarlo tal cual en ``alpr_readings.raw_xml``
+duplica las imágenes en la tabla, el WAL y las copias de seguridad.
+``RAW_XML_POLICY`` decide qué se conserva:
+
+* ``full``: el XML completo, como hasta ahora;
+* ``strip_images``: el XML sin el contenido de ``IMAGE_OCR``/``IMAGE_CTX``
+  (las etiquetas quedan vacías);
+* ``compressed``: el XML sin imágenes y comprimido con gzip en ``raw_xml_gz``;
+* ``none``: no se guarda.
+"""
+from __future__ import annotations
+
+import gzip
+import re
+from typing import Optional
+
+from app.config import RAW_XML_POLICIES, settings
+
+_IMAGE_PAYLOAD_RE = re.compile(
+    r"(<(IMAGE_OCR|IMAGE_CTX)\b[^>]*>).*?(</\2\s*>)", re.DOTALL
+)
+
+
+def resolve_policy(policy: Optional[str] = None) -> str:
+    """Normaliza ``policy``; sin valor usa ``RAW_XML_POLICY``, ya validada en ``Settings``.
+
+    Lanza ``ValueError`` si la política indicada no existe.
+    """
+
+    if policy is None:
+        return settings.raw_xml_policy
+    value = policy.strip().lower()
+    if value not in RAW_XML_POLICIES:
+        raise ValueError(f"Política de raw_xml desconocida: {policy!r}")
+    return value
+
+
+def strip_image_payloads(xml_str: str) -> str:
+    """Vacía el contenido de ``IMAGE_OCR`` e ``IMAGE_CTX`` conservando las etiquetas."""
+
+    return _IMAGE_PAYLOAD_RE.sub(r"\1\3", xml_str)
+
+
+def compress_raw_xml(xml_str: str) -> bytes:
+    return gzip.compress(xml_str.encode("utf-8"), compresslevel=6, mtime=0)
+
+
+def decompress_raw_xml(data: bytes) -> str:
+    return gzip.decompress(data).decode("utf-8")
+
+
+def raw_xml_columns(
+    xml_str: Optional[str], policy: Optional[str] = None
+) -> tuple[Optional[str], Optional[bytes]]:
+    """Valores de ``(raw_xml, raw_xml_gz)`` para guardar ``xml_str`` según la política."""
+
+    policy = resolve_policy(policy)
+    if xml_str is None or policy == "none":
+        return None, None
+    if policy == "full":
+        return xml_str, None
+    stripped = strip_image_payloads(xml_str)
+    if policy == "compressed":
+        return None, compress_raw_xml(stripped)
+    return stripped, None
+
+
+def reading_raw_xml(reading) -> Optional[str]:
+    """Devuelve el XML guardado de una lectura, sea cual sea su formato."""
+
+    if reading.raw_xml is not None:
+        return reading.raw_xml
+    if reading.raw_xml_gz is not None:
+        return decompress_raw_xml(reading.raw_xml_gz)
+    return None
+
+
+__all__ = [
+    "RAW_XML_POLICIES",
+    "compress_raw_xml",
+    "decompress_raw_xml",
+    "raw_xml_columns",
+    "reading_raw_xml",
+    "resolve_policy",
+    "strip_image_payloads",
+]
@@ -0,0 +1,23 @@
+"""Helpers SQL compartidos para sentencias set-based."""
+from __future__ import annotations
+
+from typing import Sequence
+
+from sqlalchemy import Integer, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+
+
+def id_in(session: Session, column, ids: Sequence[int]):
+    """Condición ``column = ANY(:ids)`` en PostgreSQL o ``IN (...)`` en otros motores.
+
+    Con ``ANY`` la lista viaja como un único parámetro array, de modo que el
+    texto SQL no crece con el tamaño del lote.
+    """
+
+    if session.get_bind().dialect.name == "postgresql":
+        return column == any_(bindparam(None, list(ids), type_=ARRAY(Integer)))
+    return column.in_(list(ids))
+
+
+__all__ = ["id_in"]
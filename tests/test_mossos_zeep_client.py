@@ -157,3 +157,100 @@ def test_build_matricula_request_includes_images(tmp_path):
     )
     xml_bytes = etree.tostring(message)
     assert b"Security" in xml_bytes
+
+
+def test_template_client_matches_zeep_envelope_and_results(tmp_path):
+    import requests
+
+    from app.sender.template_client import MossosTemplateClient
+
+    wsdl_path = _write_dummy_wsdl(tmp_path)
+    cert_path, key_path = _generate_certificates(tmp_path)
+    ocr_image = tmp_path / "ocr.jpg"
+    ocr_image.write_bytes(b"ocr-bytes")
+
+    class DummyReading:
+        id = 1
+        plate = "1234ABC"
+        timestamp_utc = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+        image_ocr_path = str(ocr_image)
+        has_image_ctx = False
+        image_ctx_path = None
+        country_code = "ES"
+        brand = "SEAT"
+        model = None
+        color = None
+        vehicle_type = None
+
+    class DummyCamera:
+        codigo_lector = "CAM01"
+        coord_x = "1.23"
+        coord_y = "4.56"
+        utm_x = None
+        utm_y = None
+        serial_number = "SN1"
+
+    kwargs = dict(
+        wsdl_url=str(wsdl_path),
+        endpoint_url="http://override.local/matricules",
+        cert_path=cert_path,
+        key_path=key_path,
+        timeout=2.0,
+    )
+    zeep_client = MossosZeepClient(**kwargs)
+    template_client = MossosTemplateClient(**kwargs)
+
+    envelope_ns = "http://schemas.xmlsoap.org/soap/envelope/"
+
+    def fake_response(body, status=200):
+        response = requests.Response()
+        response.status_code = status
+        response._content = (
+            f'<soapenv:Envelope xmlns:soapenv="{envelope_ns}"><soapenv:Body>{body}'
+            "</soapenv:Body></soapenv:Envelope>"
+        ).encode()
+        response.headers["Content-Type"] = "text/xml; charset=utf-8"
+        response.encoding = "utf-8"
+        return response
+
+    def send(client, body, status=200):
+        posted = []
+
+        def post(address, message, headers):
+            posted.append((address, message, headers))
+            return fake_response(body, status)
+
+        client.client.transport.post = post
+        result = client.send_matricula(DummyReading(), DummyCamera())
+        return result, posted[0]
+
+    ok = (
+        '<m:matriculaResponse xmlns:m="http://dgp.gencat.cat/matricules">'
+        "<m:codiRetorn>1</m:codiRetorn></m:matriculaResponse>"
+    )
+    zeep_result, (zeep_address, zeep_xml, zeep_headers) = send(zeep_client, ok)
+    template_result, (template_address, template_xml, template_headers) = send(template_client, ok)
+
+    assert template_address == zeep_address == "http://override.local/matricules"
+    assert template_headers == zeep_headers
+    zeep_doc = etree.fromstring(zeep_xml)
+    template_doc = etree.fromstring(template_xml)
+    request_xpath = "//*[local-name()='matriculaRequest']"
+    assert etree.tostring(template_doc.xpath(request_xpath)[0], method="c14n", exclusive=True) == etree.tostring(
+        zeep_doc.xpath(request_xpath)[0], method="c14n", exclusive=True
+    )
+    assert template_doc.xpath("//*[local-name()='Signature']")
+    assert template_doc.xpath("//*[local-name()='Timestamp']")
+    assert template_result == zeep_result
+    assert template_result.success
+
+    for body, status in (
+        (ok.replace(">1<", ">9<"), 200),
+        ('<m:matriculaResponse xmlns:m="http://dgp.gencat.cat/matricules"/>', 200),
+        (
+            "<soapenv:Fault><faultcode>soapenv:Server</faultcode>"
+            "<faultstring>boom</faultstring></soapenv:Fault>",
+            500,
+        ),
+    ):
+        assert send(template_client, body, status)[0] == send(zeep_client, body, status)[0]
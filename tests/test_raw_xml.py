@@ -0,0 +1,70 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.admin.raw_xml import compact_raw_xml, raw_xml_sizes
+from app.models import AlprReading, Base, Camera, Municipality
+from app.utils.raw_xml import decompress_raw_xml, raw_xml_columns, reading_raw_xml
+
+XML = (
+    "<MESSAGE><PLATE_STRING>1234ABC</PLATE_STRING>"
+    "<IMAGE_OCR>" + "A" * 5000 + "</IMAGE_OCR>"
+    "<IMAGE_CTX>\n" + "B" * 5000 + "\n</IMAGE_CTX></MESSAGE>"
+)
+STRIPPED = "<MESSAGE><PLATE_STRING>1234ABC</PLATE_STRING><IMAGE_OCR></IMAGE_OCR><IMAGE_CTX></IMAGE_CTX></MESSAGE>"
+
+
+def test_raw_xml_policies():
+    assert raw_xml_columns(XML, "full") == (XML, None)
+    assert raw_xml_columns(XML, "strip_images") == (STRIPPED, None)
+    assert raw_xml_columns(XML, "none") == (None, None)
+
+    raw_xml, raw_xml_gz = raw_xml_columns(XML, "compressed")
+    assert raw_xml is None
+    assert decompress_raw_xml(raw_xml_gz) == STRIPPED
+
+
+def test_compact_raw_xml_rewrites_existing_rows():
+    engine = create_engine("sqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, future=True)()
+    try:
+        municipality = Municipality(name="Municipio", active=True)
+        session.add(municipality)
+        session.flush()
+        camera = Camera(serial_number="CAM", codigo_lector="CAM", municipality_id=municipality.id)
+        session.add(camera)
+        session.flush()
+        session.add_all(
+            [AlprReading(camera_id=camera.id, plate="1234ABC", raw_xml=XML) for _ in range(5)]
+            + [AlprReading(camera_id=camera.id, plate="1234ABC")]
+        )
+        session.commit()
+        before = raw_xml_sizes(session)
+
+        assert compact_raw_xml(session, policy="compressed", batch_size=2) == 5
+        assert compact_raw_xml(session, policy="compressed", batch_size=2) == 0
+
+        after = raw_xml_sizes(session)
+        assert (before.plain_rows, before.compressed_rows) == (5, 0)
+        assert (after.plain_rows, after.compressed_rows) == (0, 5)
+        assert after.compressed_bytes < before.plain_bytes / 10
+        session.expire_all()
+        compressed = session.query(AlprReading).filter(AlprReading.raw_xml_gz.is_not(None)).all()
+        assert {reading_raw_xml(reading) for reading in compressed} == {STRIPPED}
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def test_raw_xml_policy_is_validated_once_in_settings():
+    import pytest
+    from pydantic import ValidationError
+
+    from app.config import Settings
+    from app.utils.raw_xml import resolve_policy
+
+    assert Settings(raw_xml_policy=" Compressed ").raw_xml_policy == "compressed"
+    with pytest.raises(ValidationError):
+        Settings(raw_xml_policy="gzip")
+    with pytest.raises(ValueError):
+        resolve_policy("gzip")
@@ -0,0 +1,79 @@
+from app.sender.circuit_breaker import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _breaker(clock, threshold=3):
+    return CircuitBreaker(name="mossos", failure_threshold=threshold, reset_seconds=30, clock=clock)
+
+
+def test_breaker_opens_after_consecutive_failures():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+
+    for _ in range(3):
+        assert breaker.allow_request()
+        breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.retry_after() == 30
+
+
+def test_breaker_success_resets_failure_count():
+    breaker = _breaker(FakeClock())
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_half_open_allows_single_probe():
+    clock = FakeClock()
+    breaker = _breaker(clock, threshold=1)
+    breaker.record_failure()
+
+    clock.now = 31
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+    assert breaker.retry_after() > 0
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    clock.now = 62
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_breaker_cancelled_probe_can_be_retried():
+    clock = FakeClock()
+    breaker = _breaker(clock, threshold=1)
+    breaker.record_failure()
+    clock.now = 31
+
+    assert breaker.allow_request()
+    breaker.cancel_probe()
+    assert breaker.allow_request()
+
+
+def test_breaker_disabled_with_zero_threshold():
+    breaker = _breaker(FakeClock(), threshold=0)
+
+    for _ in range(10):
+        breaker.record_failure()
+
+    assert breaker.allow_request()
@@ -0,0 +1,229 @@
+"""Reclamación concurrente de mensajes contra un PostgreSQL local.
+
+Se ejecuta solo si ``TEST_POSTGRES_URL`` apunta a una base de datos de
+pruebas desechable (las tablas se crean y se eliminan en el test).
+"""
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import AlprReading, Base, Camera, MessageQueue, MessageStatus, Municipality
+from app.sender import worker
+
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(
+    not POSTGRES_URL, reason="TEST_POSTGRES_URL no definido; se omite el test con PostgreSQL"
+)
+
+
+@pytest.fixture()
+def pg_sessionmaker():
+    engine = create_engine(POSTGRES_URL, future=True, pool_size=10)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    try:
+        yield sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    finally:
+        Base.metadata.drop_all(engine)
+        engine.dispose()
+
+
+def test_several_workers_never_claim_the_same_message(pg_sessionmaker):
+    total_messages = 200
+    now = datetime.now(timezone.utc)
+
+    session = pg_sessionmaker()
+    municipality = Municipality(name="Municipio PG", active=True)
+    session.add(municipality)
+    session.flush()
+    camera = Camera(serial_number="PG-1", codigo_lector="PG-1", municipality_id=municipality.id)
+    session.add(camera)
+    session.flush()
+    for index in range(total_messages):
+        reading = AlprReading(camera_id=camera.id, plate=f"{index:04d}ABC")
+        session.add(reading)
+        session.flush()
+        session.add(
+            MessageQueue(
+                reading_id=reading.id,
+                status=MessageStatus.PENDING,
+                created_at=now - timedelta(seconds=total_messages - index),
+            )
+        )
+    session.commit()
+    session.close()
+
+    claims: dict[str, list[int]] = {}
+    barrier = threading.Barrier(6)
+
+    def run_worker(worker_id: str) -> None:
+        worker_session = pg_sessionmaker()
+        claimed: list[int] = []
+        barrier.wait()
+        try:
+            while True:
+                batch = worker._claim_candidates(worker_session, 7, now, worker_id)
+                if not batch:
+                    break
+                claimed.extend(message.id for message in batch)
+        finally:
+            worker_session.close()
+        claims[worker_id] = claimed
+
+    threads = [
+        threading.Thread(target=run_worker, args=(f"host-{index}:1",)) for index in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    all_claimed = [message_id for ids in claims.values() for message_id in ids]
+    assert len(all_claimed) == total_messages
+    assert len(set(all_claimed)) == total_messages
+    assert sum(1 for ids in claims.values() if ids) > 1
+
+    session = pg_sessionmaker()
+    owners = {
+        message.id: message.claimed_by for message in session.query(MessageQueue).all()
+    }
+    session.close()
+    for worker_id, ids in claims.items():
+        assert all(owners[message_id] == worker_id for message_id in ids)
+
+
+def test_queue_listener_wakes_on_ingest_notify(pg_sessionmaker):
+    import time
+
+    from app.utils.notify import QueueListener, notify_queue
+
+    session = pg_sessionmaker()
+    listener = QueueListener(session.get_bind())
+    try:
+        assert listener.start()
+        assert listener.wait(0.05) is False
+
+        notify_queue(session)
+        assert listener.wait(0.05) is False  # NOTIFY se entrega al confirmar
+        session.commit()
+
+        started = time.monotonic()
+        assert listener.wait(5) is True
+        assert time.monotonic() - started < 1
+        assert listener.wait(0.05) is False
+    finally:
+        listener.close()
+        session.close()
+
+
+def test_fair_claim_query_runs_on_postgres(pg_sessionmaker, monkeypatch):
+    now = datetime.now(timezone.utc)
+    session = pg_sessionmaker()
+    municipality = Municipality(name="Municipio PG", active=True)
+    session.add(municipality)
+    session.flush()
+    cameras = []
+    for serial in ("PG-A", "PG-B"):
+        camera = Camera(serial_number=serial, codigo_lector=serial, municipality_id=municipality.id)
+        session.add(camera)
+        session.flush()
+        cameras.append(camera)
+    for index in range(4):
+        for camera in cameras:
+            reading = AlprReading(camera_id=camera.id, plate=f"{index:04d}ABC")
+            session.add(reading)
+            session.flush()
+            session.add(
+                MessageQueue(
+                    reading_id=reading.id,
+                    status=MessageStatus.PENDING,
+                    created_at=now - timedelta(minutes=(20 if camera is cameras[0] else 10) - index),
+                )
+            )
+    session.commit()
+
+    camera_ids = [camera.id for camera in cameras]
+
+    monkeypatch.setattr(worker.settings, "sender_scheduling", "camera")
+    try:
+        claimed = worker._claim_candidates(session, 4, now, "pg:1")
+        assert [message.reading.camera_id for message in claimed] == camera_ids * 2
+
+        # Con shards, cada proceso solo reclama los municipios que le tocan.
+        monkeypatch.setattr(worker.settings, "sender_scheduling", "municipality")
+        monkeypatch.setattr(worker.settings, "sender_shard_count", 2)
+        monkeypatch.setattr(worker.settings, "sender_shard_index", municipality.id + 1)
+        assert worker._claim_candidates(session, 4, now, "pg:2") == []
+        monkeypatch.setattr(worker.settings, "sender_shard_index", municipality.id)
+        assert len(worker._claim_candidates(session, 4, now, "pg:3")) == 4
+    finally:
+        session.close()
+
+
+def test_config_change_notifies_listener_callback(pg_sessionmaker):
+    from app.utils.notify import CONFIG_CHANNEL, QueueListener
+
+    invalidations = []
+    session = pg_sessionmaker()
+    listener = QueueListener(
+        session.get_bind(), callbacks={CONFIG_CHANNEL: lambda: invalidations.append(1)}
+    )
+    try:
+        assert listener.start()
+        session.add(Municipality(name="Municipio NOTIFY", active=True))
+        session.commit()
+        assert listener.wait(0.5) is False  # no es un aviso de cola
+        assert invalidations
+    finally:
+        listener.close()
+        session.close()
+
+
+def test_maintenance_runs_in_a_single_instance(pg_sessionmaker):
+    from sqlalchemy import text
+
+    from app.sender import maintenance
+
+    session = pg_sessionmaker()
+    bind = session.get_bind()
+    municipality = Municipality(name="Municipio PG", active=True)
+    session.add(municipality)
+    session.flush()
+    camera = Camera(serial_number="PG-M", codigo_lector="PG-M", municipality_id=municipality.id)
+    session.add(camera)
+    session.flush()
+    reading = AlprReading(camera_id=camera.id, plate="1234ABC")
+    session.add(reading)
+    session.flush()
+    session.add(
+        MessageQueue(
+            reading_id=reading.id,
+            status=MessageStatus.SENDING,
+            lease_expires_at=datetime.now(timezone.utc) - timedelta(seconds=5),
+        )
+    )
+    session.commit()
+    session.close()
+
+    lock_key = {"key": maintenance.MAINTENANCE_LOCK_KEY}
+    holder = bind.connect()
+    try:
+        holder.execute(text("SELECT pg_advisory_lock(:key)"), lock_key)
+        assert maintenance.run_maintenance(bind=bind).ran is False
+        holder.execute(text("SELECT pg_advisory_unlock(:key)"), lock_key)
+        holder.commit()
+    finally:
+        holder.close()
+
+    result = maintenance.run_maintenance(bind=bind)
+    assert (result.ran, result.recovered) == (True, 1)
+    session = pg_sessionmaker()
+    try:
+        assert session.query(MessageQueue).one().status == MessageStatus.FAILED
+    finally:
+        session.close()
@@ -0,0 +1,150 @@
+import os
+
+import pytest
+
+from app.sender.client_pool import MossosClientPool
+
+
+class FakeClient:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+
+def _pem_files(tmp_path):
+    cert = tmp_path / "client.pem"
+    key = tmp_path / "key.pem"
+    cert.write_text("cert")
+    key.write_text("key")
+    return str(cert), str(key)
+
+
+def _get(pool, cert, key, endpoint="http://mossos.local/ws"):
+    return pool.get(
+        wsdl_url="matricules.wsdl",
+        endpoint_url=endpoint,
+        cert_path=cert,
+        key_path=key,
+        timeout=5.0,
+    )
+
+
+def test_pool_reuses_client_for_same_key(tmp_path):
+    cert, key = _pem_files(tmp_path)
+    pool = MossosClientPool(max_size=4, idle_seconds=60, factory=FakeClient)
+
+    first = _get(pool, cert, key)
+    second = _get(pool, cert, key)
+
+    assert first is second
+    assert pool.stats()["hits"] == 1
+    assert pool.stats()["misses"] == 1
+
+
+def test_pool_rebuilds_client_when_certificate_changes(tmp_path):
+    cert, key = _pem_files(tmp_path)
+    pool = MossosClientPool(max_size=4, idle_seconds=60, factory=FakeClient)
+
+    first = _get(pool, cert, key)
+    stat = os.stat(cert)
+    os.utime(cert, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    second = _get(pool, cert, key)
+
+    assert first is not second
+    assert pool.stats()["rebuilds"] == 1
+
+
+def test_pool_evicts_least_recently_used(tmp_path):
+    cert, key = _pem_files(tmp_path)
+    pool = MossosClientPool(max_size=2, idle_seconds=0, factory=FakeClient)
+
+    first = _get(pool, cert, key, "http://a.local")
+    _get(pool, cert, key, "http://b.local")
+    _get(pool, cert, key, "http://a.local")
+    _get(pool, cert, key, "http://c.local")
+
+    assert pool.stats()["size"] == 2
+    assert pool.stats()["evictions"] == 1
+    assert _get(pool, cert, key, "http://a.local") is first
+
+
+def test_pool_builds_clients_outside_global_lock(tmp_path):
+    import threading
+
+    cert, key = _pem_files(tmp_path)
+    building = threading.Event()
+    release = threading.Event()
+    built = []
+
+    def slow_factory(**kwargs):
+        built.append(kwargs["endpoint_url"])
+        if kwargs["endpoint_url"] == "http://slow.local":
+            building.set()
+            release.wait(5)
+        return FakeClient(**kwargs)
+
+    pool = MossosClientPool(max_size=4, idle_seconds=60, factory=slow_factory)
+    results = []
+
+    def get_slow():
+        results.append(_get(pool, cert, key, "http://slow.local"))
+
+    slow = [threading.Thread(target=get_slow) for _ in range(2)]
+    slow[0].start()
+    assert building.wait(5)
+    slow[1].start()
+
+    # Otro municipio no espera a que termine la construcción lenta.
+    assert _get(pool, cert, key, "http://fast.local") is not None
+
+    release.set()
+    for thread in slow:
+        thread.join(5)
+    assert results[0] is results[1]
+    assert built.count("http://slow.local") == 1
+
+
+def test_pool_raises_when_key_is_missing(tmp_path):
+    cert, _ = _pem_files(tmp_path)
+    pool = MossosClientPool(max_size=2, idle_seconds=0, factory=FakeClient)
+
+    with pytest.raises(FileNotFoundError):
+        _get(pool, cert, str(tmp_path / "missing.pem"))
+
+
+def test_http_sessions_share_connections_per_host():
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    from app.sender.http_sessions import HttpSessionRegistry, connection_stats
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            body = b"<ok/>"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    registry = HttpSessionRegistry(pool_connections=2, pool_maxsize=2)
+    connection_stats.clear()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/ws"
+        first = registry.get(url)
+        assert registry.get(f"http://127.0.0.1:{server.server_port}/otro") is first
+        for _ in range(3):
+            assert first.post(url, data=b"<sobre/>").status_code == 200
+
+        assert registry.stats()["127.0.0.1"] == {"requests": 3, "opened": 1, "reused": 2}
+    finally:
+        registry.close()
+        server.shutdown()
+        server.server_close()
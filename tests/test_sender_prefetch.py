@@ -0,0 +1,90 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from app.sender.prefetch import ImagePrefetcher
+
+
+def _message(message_id, *, ctx=True):
+    reading = SimpleNamespace(
+        image_ocr_path=f"{message_id}-ocr.jpg",
+        has_image_ctx=ctx,
+        image_ctx_path=f"{message_id}-ctx.jpg" if ctx else None,
+    )
+    return SimpleNamespace(id=message_id, reading=reading)
+
+
+def test_prefetch_loads_ahead_within_depth_and_memory_cap():
+    loaded = []
+    lock = threading.Lock()
+
+    def loader(path):
+        with lock:
+            loaded.append(path)
+        return "x" * 10
+
+    prefetcher = ImagePrefetcher(depth=2, max_bytes=25, loader=loader)
+    prefetcher.queue([_message(1), _message(2), _message(3), _message(4, ctx=False)])
+    try:
+        images = prefetcher.take(1)
+        assert images.ocr == "x" * 10 and images.ctx == "x" * 10
+        assert prefetcher.take(2) is not None
+        assert prefetcher.take(3) is not None
+        # El mensaje 4 no tiene contexto: no se lee y se envía b"".
+        assert prefetcher.take(4).ctx == b""
+        assert prefetcher.take(5) is None
+    finally:
+        prefetcher.close()
+
+    assert loaded.count("4-ctx.jpg") == 0
+    assert prefetcher.hits == 4
+    assert prefetcher.misses == 1
+    assert prefetcher.retained_bytes == 0
+
+
+def test_memory_cap_blocks_further_prefetch_until_consumed():
+    started = []
+    loaded = {path: threading.Event() for path in ("1-ocr.jpg", "2-ocr.jpg", "3-ocr.jpg")}
+
+    def loader(path):
+        started.append(path)
+        loaded[path].set()
+        return "y" * 100
+
+    def wait_retained(expected):
+        for _ in range(500):
+            if prefetcher.retained_bytes == expected:
+                return True
+            time.sleep(0.01)
+        return False
+
+    prefetcher = ImagePrefetcher(depth=3, max_bytes=150, loader=loader)
+    prefetcher.queue([_message(1, ctx=False)])
+    try:
+        assert wait_retained(100)
+        prefetcher.queue([_message(2, ctx=False), _message(3, ctx=False)])
+        assert wait_retained(200)
+        # 200 bytes retenidos > 150: el mensaje 3 espera a que se consuma alguno.
+        assert not loaded["3-ocr.jpg"].is_set()
+        prefetcher.discard(1)
+        assert loaded["3-ocr.jpg"].wait(5)
+        assert prefetcher.take(1) is None
+        assert prefetcher.take(2) is not None
+        assert prefetcher.take(3) is not None
+    finally:
+        prefetcher.close()
+    assert started == ["1-ocr.jpg", "2-ocr.jpg", "3-ocr.jpg"]
+    assert (prefetcher.hits, prefetcher.misses) == (2, 1)
+
+
+def test_failed_prefetch_falls_back_to_synchronous_load():
+    def loader(path):
+        raise FileNotFoundError(path)
+
+    prefetcher = ImagePrefetcher(depth=1, max_bytes=1024, loader=loader)
+    prefetcher.queue([_message(1)])
+    try:
+        assert prefetcher.take(1) is None
+    finally:
+        prefetcher.close()
+    assert prefetcher.misses == 1
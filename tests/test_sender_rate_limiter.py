@@ -0,0 +1,50 @@
+from app.sender.rate_limiter import RateLimiterRegistry, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def _bucket(clock, rate=2.0, burst=2):
+    return TokenBucket(name="mossos", rate_per_second=rate, burst=burst, clock=clock, sleep=clock.sleep)
+
+
+def test_bucket_allows_burst_then_waits_for_tokens():
+    clock = FakeClock()
+    bucket = _bucket(clock)
+
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0.5
+    assert clock.now == 0.5
+
+    clock.now += 10
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0.5]
+    assert bucket.drain_throttled() == (2, 1.0)
+    assert bucket.drain_throttled() == (0, 0.0)
+
+
+def test_bucket_without_rate_never_waits():
+    clock = FakeClock()
+    bucket = _bucket(clock, rate=0, burst=None)
+
+    assert all(bucket.acquire() == 0 for _ in range(100))
+    assert clock.now == 0
+
+
+def test_registry_reconfigures_bucket_when_endpoint_changes():
+    registry = RateLimiterRegistry()
+
+    bucket = registry.get(1, rate_per_second=5, burst=None, name="mossos")
+    assert (bucket.rate_per_second, bucket.burst) == (5.0, 5)
+
+    assert registry.get(1, rate_per_second=1, burst=3) is bucket
+    assert (bucket.rate_per_second, bucket.burst) == (1.0, 3)
+    assert registry.drain_throttled() == {}
@@ -0,0 +1,893 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+
+from app.models import (
+    AlprReading,
+    Base,
+    Camera,
+    Certificate,
+    Endpoint,
+    MessageQueue,
+    MessageStatus,
+    Municipality,
+)
+from app.sender import worker
+
+
+@pytest.fixture()
+def session():
+    engine = create_engine("sqlite:///:memory:", future=True)
+    TestingSession = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    Base.metadata.create_all(engine)
+    session = TestingSession()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def _add_message(session, camera, *, created_at, status=MessageStatus.PENDING, next_retry_at=None):
+    reading = AlprReading(camera_id=camera.id, plate="1234ABC", created_at=created_at)
+    session.add(reading)
+    session.flush()
+    message = MessageQueue(
+        reading_id=reading.id,
+        status=status,
+        attempts=1 if next_retry_at else 0,
+        created_at=created_at,
+        next_retry_at=next_retry_at,
+    )
+    session.add(message)
+    session.flush()
+    return message
+
+
+def _add_camera(session, serial="CAM-1"):
+    municipality = Municipality(name=f"Municipio {serial}", active=True)
+    session.add(municipality)
+    session.flush()
+    camera = Camera(serial_number=serial, codigo_lector=serial, municipality_id=municipality.id)
+    session.add(camera)
+    session.flush()
+    return camera
+
+
+def test_claim_candidates_skips_rows_in_backoff(session):
+    now = datetime.now(timezone.utc)
+    camera = _add_camera(session)
+    for minutes in range(3):
+        _add_message(
+            session,
+            camera,
+            created_at=now - timedelta(hours=1, minutes=minutes),
+            status=MessageStatus.FAILED,
+            next_retry_at=now + timedelta(minutes=5),
+        )
+    due = _add_message(
+        session,
+        camera,
+        created_at=now - timedelta(minutes=30),
+        status=MessageStatus.FAILED,
+        next_retry_at=now - timedelta(seconds=1),
+    )
+    fresh = _add_message(session, camera, created_at=now - timedelta(minutes=1))
+    session.commit()
+
+    candidates = worker._claim_candidates(session, 2, now, "host-a:1")
+
+    # Los primeros intentos van antes que los reintentos (carriles de prioridad).
+    assert [message.id for message in candidates] == [fresh.id, due.id]
+    assert {message.status for message in candidates} == {MessageStatus.SENDING}
+    assert {message.claimed_by for message in candidates} == {"host-a:1"}
+    assert worker._claim_candidates(session, 2, now, "host-b:2") == []
+
+
+def test_concurrent_dispatch_respects_endpoint_limit(tmp_path, monkeypatch):
+    import threading
+    import time
+
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'queue.db'}",
+        future=True,
+        connect_args={"check_same_thread": False},
+    )
+    TestingSession = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    Base.metadata.create_all(engine)
+
+    session = TestingSession()
+    now = datetime.now(timezone.utc)
+    endpoint_ids = []
+    for name in ("A", "B"):
+        endpoint = Endpoint(name=name, url=f"http://{name.lower()}.local/ws")
+        session.add(endpoint)
+        session.flush()
+        endpoint_ids.append(endpoint.id)
+        camera = _add_camera(session, serial=f"CAM-{name}")
+        camera.endpoint_id = endpoint.id
+        for index in range(6):
+            _add_message(session, camera, created_at=now - timedelta(seconds=index))
+    session.commit()
+    session.close()
+
+    in_flight: dict[int, int] = {}
+    peaks: dict[int, int] = {}
+    seen_sessions = []
+    lock = threading.Lock()
+
+    def fake_process(message_session, message, writer=None, prefetcher=None):
+        endpoint_id = message.reading.camera.endpoint_id
+        with lock:
+            seen_sessions.append(message_session)
+            in_flight[endpoint_id] = in_flight.get(endpoint_id, 0) + 1
+            peaks[endpoint_id] = max(peaks.get(endpoint_id, 0), in_flight[endpoint_id])
+        time.sleep(0.05)
+        with lock:
+            in_flight[endpoint_id] -= 1
+
+    monkeypatch.setattr(worker, "SessionLocal", TestingSession)
+    monkeypatch.setattr(worker, "process_message", fake_process)
+    monkeypatch.setattr(worker, "endpoint_limiter", worker.EndpointLimiter(2))
+    monkeypatch.setattr(worker.settings, "sender_concurrency", 8)
+
+    processed = worker.run_sender_iteration()
+
+    assert processed == 12
+    assert len({id(item) for item in seen_sessions}) == 12
+    assert peaks == {endpoint_ids[0]: 2, endpoint_ids[1]: 2}
+    engine.dispose()
+
+
+class FakeClient:
+    def __init__(self, results):
+        self.results = list(results)
+        self.sent = []
+
+    def send_matricula(self, reading, camera, images=None):
+        self.sent.append(reading.id)
+        return self.results.pop(0)
+
+
+class FakePool:
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, **kwargs):
+        return self.client
+
+    def stats(self):
+        return {}
+
+
+def _add_sendable_message(session, tmp_path, *, serial="CAM-S", attempts=0):
+    municipality = Municipality(name=f"Municipio {serial}", active=True)
+    session.add(municipality)
+    session.flush()
+    cert_path = tmp_path / f"{serial}-client.pem"
+    key_path = tmp_path / f"{serial}-key.pem"
+    cert_path.write_text("cert")
+    key_path.write_text("key")
+    session.add(
+        Certificate(
+            name=f"cert {serial}",
+            municipality_id=municipality.id,
+            client_cert_path=str(cert_path),
+            key_path=str(key_path),
+        )
+    )
+    endpoint = Endpoint(name=serial, url=f"http://{serial.lower()}.local/ws", retry_max=5)
+    session.add(endpoint)
+    session.flush()
+    camera = Camera(
+        serial_number=serial,
+        codigo_lector=serial,
+        municipality_id=municipality.id,
+        endpoint_id=endpoint.id,
+    )
+    session.add(camera)
+    session.flush()
+    image_path = tmp_path / f"{serial}-ocr.jpg"
+    image_path.write_bytes(b"ocr")
+    reading = AlprReading(
+        camera_id=camera.id,
+        plate="1234ABC",
+        timestamp_utc=datetime.now(timezone.utc),
+        has_image_ocr=True,
+        image_ocr_path=str(image_path),
+    )
+    session.add(reading)
+    session.flush()
+    message = MessageQueue(
+        reading_id=reading.id,
+        status=MessageStatus.SENDING,
+        attempts=attempts,
+        claimed_by=worker.worker_identity(),
+    )
+    session.add(message)
+    session.commit()
+    return message
+
+
+def _result(**kwargs):
+    from app.sender.mossos_client import MossosSendResult
+
+    values = {"success": False, "http_status": None, "codi_retorn": None, "fault": "timeout"}
+    values.update(kwargs)
+    return MossosSendResult(**values)
+
+
+def test_open_circuit_requeues_without_spending_attempts(session, tmp_path, monkeypatch):
+    from app.sender.circuit_breaker import CircuitBreakerRegistry
+
+    client = FakeClient([_result(transport_error=True), _result(transport_error=True)])
+    monkeypatch.setattr(worker, "client_pool", FakePool(client))
+    monkeypatch.setattr(
+        worker, "circuit_breakers", CircuitBreakerRegistry(failure_threshold=2, reset_seconds=60)
+    )
+
+    messages = [
+        _add_sendable_message(session, tmp_path, serial="CAM-S", attempts=0),
+    ]
+    endpoint_id = messages[0].reading.camera.endpoint_id
+    for index in range(2):
+        reading = AlprReading(
+            camera_id=messages[0].reading.camera_id,
+            plate=f"000{index}XYZ",
+            timestamp_utc=datetime.now(timezone.utc),
+            has_image_ocr=True,
+            image_ocr_path=messages[0].reading.image_ocr_path,
+        )
+        session.add(reading)
+        session.flush()
+        message = MessageQueue(
+            reading_id=reading.id,
+            status=MessageStatus.SENDING,
+            claimed_by=worker.worker_identity(),
+        )
+        session.add(message)
+        messages.append(message)
+    session.commit()
+
+    for message in messages:
+        worker.process_message(session, message)
+
+    assert len(client.sent) == 2
+    assert worker.circuit_breakers.get(endpoint_id).state == "OPEN"
+    skipped = messages[2]
+    assert skipped.status == MessageStatus.PENDING
+    assert skipped.attempts == 0
+    assert skipped.claimed_by is None
+    assert skipped.next_retry_at is not None
+
+
+def test_half_open_probe_is_released_when_sending_raises(session, tmp_path, monkeypatch):
+    from app.sender.circuit_breaker import CircuitBreakerRegistry
+
+    class BrokenPool(FakePool):
+        def get(self, **kwargs):
+            raise RuntimeError("WSDL inválido")
+
+    message = _add_sendable_message(session, tmp_path, serial="CAM-H")
+    endpoint_id = message.reading.camera.endpoint_id
+    breakers = CircuitBreakerRegistry(failure_threshold=1, reset_seconds=0)
+    breaker = breakers.get(endpoint_id)
+    breaker.record_failure()
+    monkeypatch.setattr(worker, "circuit_breakers", breakers)
+    monkeypatch.setattr(worker, "client_pool", BrokenPool(None))
+
+    with pytest.raises(RuntimeError):
+        worker.process_message(session, message)
+
+    assert breaker.state == "HALF_OPEN"
+    assert breaker.allow_request()
+
+
+def test_status_writer_flushes_transitions_in_one_commit(session, tmp_path):
+    from sqlalchemy import event
+
+    from app.sender.cleanup import image_deletion_queue
+    from app.sender.status_writer import StatusWriter
+
+    ok = _add_sendable_message(session, tmp_path, serial="CAM-OK")
+    retry = _add_sendable_message(session, tmp_path, serial="CAM-RETRY")
+    dead = _add_sendable_message(session, tmp_path, serial="CAM-DEAD")
+    ok_ids = (ok.id, ok.reading_id, ok.reading.camera_id)
+    retry_id, dead_id = retry.id, dead.id
+    image_path = tmp_path / "CAM-OK-ocr.jpg"
+    now = datetime.now(timezone.utc)
+
+    writer = StatusWriter(lambda: session, max_pending=10, max_delay_seconds=60)
+    writer.mark_failed(
+        retry_id, attempts=1, error="timeout", next_retry_at=now + timedelta(seconds=5), now=now
+    )
+    writer.mark_dead(dead_id, "codiRetorn=9", now)
+    assert writer.maybe_flush() == 0
+
+    # Los éxitos esperan a la ventana de volcado, junto con el resto.
+    commits = []
+    event.listen(session, "after_commit", lambda _: commits.append(1))
+    writer.mark_success(ok_ids[0], ok_ids[2], now)
+    assert writer.maybe_flush() == 0
+    assert writer.flush() == 3
+    image_deletion_queue.join()
+
+    assert commits == [1]
+    assert session.get(MessageQueue, ok_ids[0]) is None
+    assert session.get(AlprReading, ok_ids[1]) is None
+    assert session.get(Camera, ok_ids[2]).last_sent_at is not None
+    assert not image_path.exists()
+    assert session.get(MessageQueue, retry_id).status == MessageStatus.FAILED
+    assert session.get(MessageQueue, retry_id).claimed_by is None
+    assert session.get(MessageQueue, dead_id).status == MessageStatus.DEAD
+
+
+
+def test_iteration_groups_successful_sends_in_one_commit(tmp_path, monkeypatch):
+    from sqlalchemy import event
+
+    from app.sender.camera_profiles import CameraProfileCache
+    from app.sender.status_writer import StatusWriter
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}", future=True)
+    TestingSession = sessionmaker(bind=engine, autoflush=False, future=True)
+    Base.metadata.create_all(engine)
+    session = TestingSession()
+    for index in range(10):
+        message = _add_sendable_message(session, tmp_path, serial=f"CAM-{index}")
+        message.status = MessageStatus.PENDING
+        message.claimed_by = None
+    session.commit()
+    session.close()
+
+    commits = []
+    deletes = []
+    event.listen(engine, "commit", lambda _: commits.append(1))
+
+    def count_deletes(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("DELETE FROM messages_queue"):
+            deletes.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count_deletes)
+    client = FakeClient([_result(success=True) for _ in range(10)])
+    monkeypatch.setattr(worker, "SessionLocal", TestingSession)
+    monkeypatch.setattr(worker, "client_pool", FakePool(client))
+    monkeypatch.setattr(worker, "camera_profiles", CameraProfileCache(ttl_seconds=60))
+    monkeypatch.setattr(worker.settings, "sender_concurrency", 1)
+    writer = StatusWriter(TestingSession, max_pending=100, max_delay_seconds=60)
+
+    assert worker.run_sender_iteration(batch_size=10, writer=writer) == 10
+
+    assert len(client.sent) == 10
+    # Un commit para reclamar el lote y otro para volcar los diez éxitos.
+    assert len(commits) == 2
+    assert len(deletes) == 1
+    session = TestingSession()
+    assert session.query(MessageQueue).count() == 0
+    session.close()
+    engine.dispose()
+
+
+def test_status_writer_deletes_successes_in_set_based_statements(session, tmp_path):
+    from sqlalchemy import event
+
+    from app.sender.status_writer import StatusWriter
+
+    messages = [
+        _add_sendable_message(session, tmp_path, serial=f"CAM-{index}") for index in range(5)
+    ]
+    ids = [(message.id, message.reading_id, message.reading.camera_id) for message in messages]
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("DELETE"):
+            statements.append((statement.split()[2], executemany))
+
+    event.listen(session.get_bind(), "before_cursor_execute", record)
+    writer = StatusWriter(lambda: session, max_pending=10, max_delay_seconds=60)
+    now = datetime.now(timezone.utc)
+    for message_id, _, camera_id in ids:
+        writer.mark_success(message_id, camera_id, now)
+    assert writer.flush(session) == 5
+
+    # Un DELETE por tabla para todo el lote, no uno por mensaje.
+    assert statements == [("messages_queue", False), ("alpr_readings", False)]
+    for message_id, reading_id, _ in ids:
+        assert session.get(MessageQueue, message_id) is None
+        assert session.get(AlprReading, reading_id) is None
+
+
+def test_status_writer_skips_messages_reclaimed_by_another_worker(session, tmp_path):
+    from app.sender.status_writer import StatusWriter
+
+    lost_failed = _add_sendable_message(session, tmp_path, serial="CAM-A")
+    lost_sent = _add_sendable_message(session, tmp_path, serial="CAM-B")
+    kept = _add_sendable_message(session, tmp_path, serial="CAM-C")
+    ids = (lost_failed.id, lost_sent.id, lost_sent.reading_id, kept.id)
+    camera_id = lost_sent.reading.camera_id
+    # La lease venció y otro worker reclamó dos de los mensajes.
+    for message in (lost_failed, lost_sent):
+        message.claimed_by = "otro:99"
+    session.commit()
+
+    now = datetime.now(timezone.utc)
+    writer = StatusWriter(lambda: session, max_pending=10, max_delay_seconds=60)
+    writer.mark_failed(
+        ids[0], attempts=1, error="timeout", next_retry_at=now + timedelta(seconds=5), now=now
+    )
+    writer.mark_success(ids[1], camera_id, now)
+    writer.mark_dead(ids[3], "codiRetorn=9", now)
+    assert writer.flush(session) == 1
+    assert writer.pending == 0
+
+    session.expire_all()
+    assert session.get(MessageQueue, ids[0]).status == MessageStatus.SENDING
+    assert session.get(MessageQueue, ids[0]).attempts == 0
+    assert session.get(MessageQueue, ids[1]).claimed_by == "otro:99"
+    assert session.get(AlprReading, ids[2]) is not None
+    assert session.get(MessageQueue, ids[3]).status == MessageStatus.DEAD
+
+
+def test_status_writer_keeps_transitions_when_flush_fails(session, tmp_path, monkeypatch):
+    from app.sender.status_writer import StatusWriter
+
+    ok = _add_sendable_message(session, tmp_path, serial="CAM-OK")
+    dead = _add_sendable_message(session, tmp_path, serial="CAM-DEAD")
+    ok_id, camera_id = ok.id, ok.reading.camera_id
+    now = datetime.now(timezone.utc)
+    writer = StatusWriter(lambda: session, max_pending=10, max_delay_seconds=60)
+    writer.mark_dead(dead.id, "codiRetorn=9", now)
+    writer.mark_success(ok_id, camera_id, now)
+
+    def broken_commit():
+        raise RuntimeError("BD no disponible")
+
+    monkeypatch.setattr(session, "commit", broken_commit)
+    assert writer.flush(session) == 0
+    assert writer.pending == 2
+    assert session.get(MessageQueue, ok_id).status == MessageStatus.SENDING
+
+    monkeypatch.undo()
+    assert writer.flush(session) == 2
+    assert writer.pending == 0
+    assert session.get(MessageQueue, ok_id) is None
+    assert session.get(MessageQueue, dead.id).status == MessageStatus.DEAD
+
+def _controller(**overrides):
+    values = dict(
+        min_batch=10,
+        max_batch=200,
+        min_wait_seconds=0,
+        max_wait_seconds=20,
+        target_p95_ms=1000,
+        max_error_rate=0.5,
+        initial_batch=50,
+        initial_wait_seconds=5,
+    )
+    values.update(overrides)
+    return worker.AdaptiveController(**values)
+
+
+def test_adaptive_controller_scales_with_backlog_and_idle():
+    controller = _controller()
+
+    decision = controller.update(backlog=500, sent=50, p95_ms=300, error_rate=0)
+    assert (decision.batch_size, decision.wait_seconds) == (100, 0)
+    controller.update(backlog=500, sent=100, p95_ms=300, error_rate=0)
+    assert controller.update(backlog=500, sent=200, p95_ms=300, error_rate=0).batch_size == 200
+
+    decision = controller.update(backlog=0, sent=20, p95_ms=300, error_rate=0)
+    assert (decision.batch_size, decision.wait_seconds) == (100, 1.0)
+    for _ in range(10):
+        decision = controller.update(backlog=0, sent=0, p95_ms=None, error_rate=0)
+    assert (decision.batch_size, decision.wait_seconds) == (10, 20)
+
+
+def test_adaptive_controller_backs_off_on_latency_and_errors():
+    controller = _controller()
+
+    decision = controller.update(backlog=500, sent=50, p95_ms=2500, error_rate=0)
+    assert (decision.batch_size, decision.wait_seconds) == (37, 0)
+
+    decision = controller.update(backlog=500, sent=37, p95_ms=300, error_rate=0.8)
+    assert decision.batch_size == 18
+    assert decision.wait_seconds == 1.0
+
+
+def test_send_stats_reports_p95_and_error_rate():
+    stats = worker.SendStats()
+    for duration in range(1, 101):
+        stats.record(duration, error=duration > 90)
+
+    assert stats.drain() == (100, 95.0, 0.1)
+    assert stats.drain() == (0, None, 0.0)
+
+    bounded = worker.SendStats(max_samples=10)
+    for duration in range(1, 101):
+        bounded.record(duration, error=False)
+    assert bounded.drain() == (10, 100.0, 0.0)
+
+
+def test_count_backlog_is_capped_and_ignores_backoff(session, monkeypatch):
+    now = datetime.now(timezone.utc)
+    camera = _add_camera(session)
+    for index in range(5):
+        _add_message(session, camera, created_at=now - timedelta(minutes=index))
+    _add_message(
+        session,
+        camera,
+        created_at=now,
+        status=MessageStatus.FAILED,
+        next_retry_at=now + timedelta(minutes=5),
+    )
+    session.commit()
+    bind = session.get_bind()
+    monkeypatch.setattr(
+        worker, "SessionLocal", sessionmaker(bind=bind, autoflush=False, future=True)
+    )
+
+    assert worker._count_backlog(100) == 5
+    assert worker._count_backlog(3) == 3
+
+
+def test_fair_scheduling_interleaves_cameras(session, monkeypatch):
+    from app.admin.queue import camera_queue_ages
+
+    now = datetime.now(timezone.utc)
+    busy = _add_camera(session, serial="AUTOPISTA")
+    quiet = _add_camera(session, serial="PUEBLO")
+    busy_ids = [
+        _add_message(session, busy, created_at=now - timedelta(minutes=30 - index)).id
+        for index in range(6)
+    ]
+    quiet_ids = [
+        _add_message(session, quiet, created_at=now - timedelta(minutes=5 - index)).id
+        for index in range(2)
+    ]
+    session.commit()
+
+    ages = camera_queue_ages(session, now)
+    assert [(row.serial_number, row.queued, round(row.oldest_age_seconds)) for row in ages] == [
+        ("AUTOPISTA", 6, 1800),
+        ("PUEBLO", 2, 300),
+    ]
+
+    monkeypatch.setattr(worker.settings, "sender_scheduling", "camera")
+    claimed = worker._claim_candidates(session, 4, now, "host-a:1")
+
+    assert [message.id for message in claimed] == [
+        busy_ids[0],
+        quiet_ids[0],
+        busy_ids[1],
+        quiet_ids[1],
+    ]
+
+
+def test_first_attempts_get_reserved_share_of_batch(session, monkeypatch):
+    now = datetime.now(timezone.utc)
+    camera = _add_camera(session)
+    retry_ids = [
+        _add_message(
+            session,
+            camera,
+            created_at=now - timedelta(hours=1, minutes=index),
+            status=MessageStatus.FAILED,
+            next_retry_at=now - timedelta(seconds=1),
+        ).id
+        for index in range(4)
+    ]
+    fresh_ids = [
+        _add_message(session, camera, created_at=now - timedelta(minutes=5 - index)).id
+        for index in range(3)
+    ]
+    session.commit()
+
+    monkeypatch.setattr(worker.settings, "sender_first_attempt_share", 0.5)
+    claimed = worker._claim_candidates(session, 4, now, "host-a:1")
+    assert [message.id for message in claimed] == [fresh_ids[0], fresh_ids[1], retry_ids[3], retry_ids[2]]
+
+    # Los reintentos ocupan la capacidad que no usan los primeros intentos.
+    claimed = worker._claim_candidates(session, 4, now, "host-a:1")
+    assert [message.id for message in claimed] == [fresh_ids[2], retry_ids[1], retry_ids[0]]
+
+    monkeypatch.setattr(worker.settings, "sender_first_attempt_share", 0.0)
+    assert worker._claim_candidates(session, 4, now, "host-a:1") == []
+
+
+def test_expired_leases_are_recovered_and_live_ones_renewed(session):
+    from app.sender.leases import recover_expired_leases, renew_leases
+
+    now = datetime.now(timezone.utc)
+    camera = _add_camera(session)
+    live = [_add_message(session, camera, created_at=now - timedelta(minutes=index + 1)) for index in range(2)]
+    crashed = _add_message(session, camera, created_at=now, status=MessageStatus.SENDING)
+    crashed.claimed_by = "host-b:2"
+    crashed.lease_expires_at = now - timedelta(seconds=1)
+    legacy = _add_message(session, camera, created_at=now, status=MessageStatus.SENDING)
+    legacy.updated_at = now - timedelta(hours=1)
+    session.commit()
+
+    claimed = worker._claim_candidates(session, 2, now, "host-a:1")
+    claimed_ids = sorted(message.id for message in claimed)
+    assert claimed_ids == sorted(message.id for message in live)
+    assert set(claimed_ids) <= set(worker.lease_keeper.in_flight)
+    worker.lease_keeper.untrack(claimed_ids)
+
+    # Solo se renuevan los mensajes en curso; el otro conserva su lease original.
+    active, orphan = claimed_ids
+    assert renew_leases(session, "host-a:1", now + timedelta(hours=1), [active]) == 1
+
+    after_lease = now + timedelta(seconds=worker.lease_keeper.lease_seconds + 1)
+    assert recover_expired_leases(session, after_lease) == 3
+    session.expire_all()
+    assert {crashed.status, legacy.status} == {MessageStatus.FAILED}
+    assert crashed.claimed_by is None and crashed.lease_expires_at is None
+    assert session.get(MessageQueue, active).status == MessageStatus.SENDING
+    assert session.get(MessageQueue, orphan).status == MessageStatus.FAILED
+
+
+def test_iteration_counts_errors_as_attempts_and_releases_unstarted(tmp_path, monkeypatch):
+    from app.sender.status_writer import StatusWriter
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}", future=True)
+    TestingSession = sessionmaker(bind=engine, autoflush=False, future=True)
+    Base.metadata.create_all(engine)
+    session = TestingSession()
+    now = datetime.now(timezone.utc)
+    camera = _add_camera(session)
+    ids = [
+        _add_message(session, camera, created_at=now - timedelta(minutes=4 - index)).id
+        for index in range(4)
+    ]
+    session.commit()
+    session.close()
+    ok, failing, last, unstarted = ids
+
+    def fake_process(message_session, message, writer=None, prefetcher=None):
+        if message.id == failing:
+            raise ValueError("timestamp_utc vacío")
+        if message.id == last:
+            worker.shutdown_requested.set()
+        writer.mark_dead(message.id, "TEST", datetime.now(timezone.utc))
+
+    monkeypatch.setattr(worker, "SessionLocal", TestingSession)
+    monkeypatch.setattr(worker, "process_message", fake_process)
+    monkeypatch.setattr(worker.settings, "sender_concurrency", 1)
+    try:
+        processed = worker.run_sender_iteration(batch_size=4, writer=StatusWriter(TestingSession))
+    finally:
+        worker.shutdown_requested.clear()
+
+    assert processed == 3
+    session = TestingSession()
+    statuses = {message.id: message for message in session.query(MessageQueue)}
+    # Un error no bloquea la cola: consume intento y espera su backoff.
+    assert statuses[ok].status == MessageStatus.DEAD
+    assert statuses[last].status == MessageStatus.DEAD
+    assert statuses[failing].status == MessageStatus.FAILED
+    assert statuses[failing].attempts == 1
+    assert statuses[failing].next_retry_at is not None
+    assert statuses[failing].claimed_by is None
+    assert statuses[failing].last_error.startswith("ERROR_INESPERADO")
+    # Solo vuelve a PENDING lo que no se llegó a empezar.
+    assert statuses[unstarted].status == MessageStatus.PENDING
+    assert statuses[unstarted].attempts == 0
+    assert statuses[unstarted].claimed_by is None
+    assert statuses[unstarted].lease_expires_at is None
+    assert not set(ids) & set(worker.lease_keeper.in_flight)
+    session.close()
+    engine.dispose()
+
+
+def test_unexpected_error_on_last_attempt_marks_message_dead(session, tmp_path, monkeypatch):
+    from app.sender.status_writer import StatusWriter
+
+    message = _add_sendable_message(session, tmp_path, serial="CAM-E", attempts=4)
+    message_id = message.id
+
+    def broken_process(*args, **kwargs):
+        raise ValueError("timestamp_utc vacío")
+
+    monkeypatch.setattr(worker, "process_message", broken_process)
+    writer = StatusWriter(lambda: session)
+    worker._process_claimed(session, message, writer)
+    writer.flush(session)
+
+    stored = session.get(MessageQueue, message_id)
+    assert stored.status == MessageStatus.DEAD
+    assert stored.attempts == 5
+
+
+def test_camera_profiles_are_cached_until_config_changes(session, tmp_path, monkeypatch):
+    from app.sender.camera_profiles import CameraProfileCache
+    from app.utils import notify
+
+    message = _add_sendable_message(session, tmp_path, serial="CAM-P")
+    camera_id = message.reading.camera_id
+    clock = [0.0]
+    cache = CameraProfileCache(ttl_seconds=60, clock=lambda: clock[0])
+    monkeypatch.setattr(notify, "_config_callbacks", [])
+    notify.on_config_change(cache.invalidate)
+
+    profile = cache.get(session, camera_id)
+    assert profile.service_url == "http://cam-p.local/ws"
+    assert (profile.retry_max, profile.cert_path) == (5, str(tmp_path / "CAM-P-client.pem"))
+    assert cache.get(session, camera_id) is profile
+
+    # Un cambio que se deshace no invalida la caché; uno confirmado, sí.
+    endpoint = session.get(Endpoint, profile.endpoint_key)
+    endpoint.url = "http://descartado.local/ws"
+    session.flush()
+    session.rollback()
+    assert cache.get(session, camera_id) is profile
+
+    endpoint = session.get(Endpoint, profile.endpoint_key)
+    endpoint.url = "http://otro.local/ws"
+    session.commit()
+    assert cache.get(session, camera_id).service_url == "http://otro.local/ws"
+
+    clock[0] = 61
+    assert cache.get(session, camera_id) is not profile
+    assert cache.stats() == {"size": 1, "hits": 2, "misses": 3}
+    assert cache.get(session, 999_999) is None
+
+
+def test_queue_listener_falls_back_to_sleep_without_postgres():
+    from app.utils.notify import QueueListener
+
+    engine = create_engine("sqlite:///:memory:", future=True)
+    listener = QueueListener(engine)
+    assert listener.start() is False
+    assert listener.wait(0.01) is False
+    engine.dispose()
+
+
+def test_sender_load_options_skip_raw_xml(session, tmp_path):
+    message = _add_sendable_message(session, tmp_path)
+    message.reading.raw_xml = "<ANPR>" + "A" * 1000 + "</ANPR>"
+    image_path = message.reading.image_ocr_path
+    session.commit()
+    session.expunge_all()
+
+    loaded = session.query(MessageQueue).options(*worker._message_load_options()).one()
+
+    loaded_columns = inspect(loaded.reading).dict
+    assert "raw_xml" not in loaded_columns
+    assert loaded_columns["image_ocr_path"] == image_path
+
+
+def test_maintenance_purges_dead_in_chunks_within_budget(tmp_path, monkeypatch):
+    from app.sender import maintenance
+
+    engine = create_engine(f"sqlite:///{tmp_path}/queue.db", future=True)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, autoflush=False, future=True)()
+    camera = _add_camera(session)
+    old = datetime.now(timezone.utc) - timedelta(hours=1)
+    for _ in range(5):
+        message = _add_message(session, camera, created_at=old, status=MessageStatus.DEAD)
+        message.updated_at = old
+        message.reading.image_ocr_path = "cam/ocr.jpg"
+    _add_message(session, camera, created_at=old, status=MessageStatus.PENDING)
+    session.commit()
+    session.close()
+    submitted = []
+    monkeypatch.setattr(maintenance.image_deletion_queue, "submit", submitted.extend)
+    ticks = iter(range(100))
+
+    first = maintenance.run_maintenance(
+        bind=engine, chunk_size=2, budget_seconds=1, clock=lambda: next(ticks)
+    )
+    second = maintenance.run_maintenance(bind=engine, chunk_size=2, budget_seconds=60)
+
+    assert (first.ran, first.purged, first.pending) == (True, 2, True)
+    assert (second.purged, second.pending) == (3, False)
+    assert submitted == ["cam/ocr.jpg"] * 5
+    session = sessionmaker(bind=engine, future=True)()
+    assert session.query(MessageQueue).count() == 1
+    assert session.query(AlprReading).count() == 1
+    session.close()
+    engine.dispose()
+
+
+@pytest.mark.parametrize("scheduling", ["fifo", "municipality"])
+def test_shards_claim_only_their_municipalities(session, monkeypatch, scheduling):
+    now = datetime.now(timezone.utc)
+    cameras = [_add_camera(session, serial=f"CAM-{index}") for index in range(3)]
+    ids_by_municipality = {
+        camera.municipality_id: {
+            _add_message(session, camera, created_at=now - timedelta(minutes=5)).id,
+            _add_message(session, camera, created_at=now - timedelta(minutes=4)).id,
+        }
+        for camera in cameras
+    }
+    session.commit()
+
+    monkeypatch.setattr(worker.settings, "sender_scheduling", scheduling)
+    monkeypatch.setattr(worker.settings, "sender_shard_count", 2)
+    claimed_by_shard = {}
+    for index in (0, 1):
+        monkeypatch.setattr(worker.settings, "sender_shard_index", index)
+        claimed = worker._claim_candidates(session, 10, now, f"shard-{index}:1")
+        claimed_by_shard[index] = {message.id for message in claimed}
+
+    for index, claimed in claimed_by_shard.items():
+        expected = set().union(
+            *(
+                ids
+                for municipality_id, ids in ids_by_municipality.items()
+                if municipality_id % 2 == index
+            )
+        )
+        assert claimed == expected
+
+
+def test_shard_supervisor_restarts_crashed_shards():
+    from app.sender import supervisor
+
+    class FakeProcess:
+        def __init__(self, pid):
+            self.pid = pid
+            self.returncode = None
+
+        def poll(self):
+            return self.returncode
+
+    now = [0.0]
+    spawned = []
+
+    def spawn(index, count):
+        spawned.append((index, count))
+        return FakeProcess(len(spawned))
+
+    shard_supervisor = supervisor.ShardSupervisor(2, spawn=spawn, clock=lambda: now[0])
+    shard_supervisor.start()
+    assert spawned == [(0, 2), (1, 2)]
+
+    shard_supervisor.shards[1].process.returncode = 1
+    now[0] = 5.0
+    shard_supervisor.check()
+    assert len(spawned) == 2
+    now[0] = 7.0
+    shard_supervisor.check()
+    assert spawned[-1] == (1, 2)
+    assert shard_supervisor.shards[1].process.pid == 3
+
+    # Tras caer de nuevo enseguida, la espera se duplica.
+    shard_supervisor.shards[1].process.returncode = 1
+    now[0] = 8.0
+    shard_supervisor.check()
+    now[0] = 11.0
+    shard_supervisor.check()
+    assert len(spawned) == 3
+    now[0] = 12.0
+    assert shard_supervisor.check() == 2
+    assert len(spawned) == 4
+
+    # Un shard que termina sin error (sender deshabilitado) no se relanza.
+    shard_supervisor.shards[0].process.returncode = 0
+    assert shard_supervisor.check() == 1
+    assert len(spawned) == 4
+
+
+def test_image_deletion_queue_join_honours_timeout(tmp_path, monkeypatch):
+    import threading
+
+    from app.sender import cleanup
+
+    release = threading.Event()
+
+    def slow_delete(paths):
+        release.wait(5)
+        return len(paths)
+
+    monkeypatch.setattr(cleanup, "delete_image_paths", slow_delete)
+    deletions = cleanup.ImageDeletionQueue()
+    deletions.submit([str(tmp_path / "a.jpg")])
+
+    assert deletions.join(timeout=0.05) is False
+    release.set()
+    assert deletions.join(timeout=5) is True
+    assert deletions.deleted == 1
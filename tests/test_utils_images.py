@@ -33,3 +33,44 @@ def test_build_image_paths_returns_relative_and_full_paths(tmp_path, monkeypatch
     assert full_ctx == tmp_path / rel_ctx
     assert full_ocr.parent.exists()
     assert full_ctx.parent.exists()
+
+
+def test_base64_storage_modes_skip_reencoding(tmp_path, monkeypatch):
+    import base64
+
+    from app.ingest import image_storage
+    from app.sender.mossos_client import load_image_base64
+    from app.utils.cleanup import delete_image_paths
+
+    monkeypatch.setattr(images, "IMAGES_BASE", tmp_path)
+    monkeypatch.setattr(images.settings, "images_dir", str(tmp_path))
+    encoded = base64.b64encode(b"jpeg-bytes").decode("ascii")
+    received = f"{encoded[:6]}\n{encoded[6:]}\n"
+    ts = datetime(2025, 12, 1, 17, 54, 30)
+
+    monkeypatch.setattr(images.settings, "image_storage_mode", "jpeg+b64")
+    rel_ocr = image_storage.save_reading_image_base64("4225LTV", "SN1", ts, "ocr", received)
+    full_ocr = tmp_path / rel_ocr
+    assert full_ocr.read_bytes() == b"jpeg-bytes"
+    assert images.base64_sidecar(full_ocr).read_text() == encoded
+    full_ocr.write_bytes(b"changed")  # el sender debe usar el sidecar, no el JPEG
+    assert load_image_base64(rel_ocr) == encoded
+
+    monkeypatch.setattr(images.settings, "image_storage_mode", "b64")
+    rel_ctx = image_storage.save_reading_image_base64("4225LTV", "SN1", ts, "ctx", received)
+    assert rel_ctx.endswith("_ctx.jpg.b64")
+    assert load_image_base64(rel_ctx) == encoded
+
+    assert delete_image_paths([rel_ocr, rel_ctx]) == 2
+    assert list(full_ocr.parent.iterdir()) == []
+
+
+def test_settings_validate_image_storage_mode():
+    import pytest
+    from pydantic import ValidationError
+
+    from app.config import Settings
+
+    assert Settings(image_storage_mode=" JPEG+B64 ").image_storage_mode == "jpeg+b64"
+    with pytest.raises(ValidationError):
+        Settings(image_storage_mode="png")
@@ -0,0 +1,77 @@
+import pytest
+
+from app.sender.wsdl_cache import CachingTransport, WsdlFileCache
+
+WSDL_URL = "https://mossos.local/matricules.wsdl"
+
+
+def _transport(cache, remote, **kwargs):
+    transport = CachingTransport(wsdl_cache=cache, **kwargs)
+    transport._load_remote_data = remote
+    return transport
+
+
+def test_caching_transport_stores_and_reuses_documents(tmp_path):
+    cache = WsdlFileCache(str(tmp_path), ttl_seconds=3600)
+    calls = []
+
+    def remote(url):
+        calls.append(url)
+        return b"<definitions/>"
+
+    transport = _transport(cache, remote)
+    assert transport.load(WSDL_URL) == b"<definitions/>"
+    assert transport.load(WSDL_URL) == b"<definitions/>"
+    assert calls == [WSDL_URL]
+
+    fresh_transport = _transport(WsdlFileCache(str(tmp_path), ttl_seconds=3600), remote)
+    assert fresh_transport.load(WSDL_URL) == b"<definitions/>"
+    assert calls == [WSDL_URL]
+
+
+def test_caching_transport_falls_back_to_stale_copy(tmp_path, monkeypatch):
+    cache = WsdlFileCache(str(tmp_path), ttl_seconds=10)
+    cache.add(WSDL_URL, b"<stale/>")
+    monkeypatch.setattr("app.sender.wsdl_cache.time.time", lambda: 9_999_999_999.0)
+
+    def remote(url):
+        raise ConnectionError("host caído")
+
+    transport = _transport(cache, remote)
+    assert cache.get(WSDL_URL) is None
+    assert transport.load(WSDL_URL) == b"<stale/>"
+
+
+def test_default_transport_refreshes_expired_copy(tmp_path, monkeypatch):
+    from app.config import Settings
+    from app.sender import wsdl_cache
+
+    monkeypatch.delenv("WSDL_CACHE_PREFER", raising=False)
+    monkeypatch.setattr(wsdl_cache, "settings", Settings(wsdl_cache_dir=str(tmp_path)))
+    transport = wsdl_cache.build_transport(None, timeout=5)
+    transport.wsdl_cache.add(WSDL_URL, b"<old/>")
+    monkeypatch.setattr("app.sender.wsdl_cache.time.time", lambda: 9_999_999_999.0)
+    transport._load_remote_data = lambda url: b"<new/>"
+
+    assert transport.load(WSDL_URL) == b"<new/>"
+
+
+def test_caching_transport_refresh_ignores_cache(tmp_path):
+    cache = WsdlFileCache(str(tmp_path), ttl_seconds=3600)
+    cache.add(WSDL_URL, b"<old/>")
+
+    transport = _transport(cache, lambda url: b"<new/>", refresh=True)
+
+    assert transport.load(WSDL_URL) == b"<new/>"
+    assert cache.get(WSDL_URL) == b"<new/>"
+    assert transport.loaded_urls == [WSDL_URL]
+
+
+def test_caching_transport_without_copy_propagates_error(tmp_path):
+    cache = WsdlFileCache(str(tmp_path), ttl_seconds=3600)
+
+    def remote(url):
+        raise ConnectionError("host caído")
+
+    with pytest.raises(ConnectionError):
+        _transport(cache, remote).load(WSDL_URL)
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import os
+
+from lxml import etree
+from zeep import ns
+from zeep.wsse.signature import BinarySignature, _verify_envelope_with_key, _make_verify_key
+
+from app.sender.wsse import SigningContextCache, TimestampedBinarySignature
+
+from tests.test_mossos_zeep_client import _generate_certificates
+
+SOAP_ENV = "http://schemas.xmlsoap.org/soap/envelope/"
+
+
+def _envelope():
+    envelope = etree.Element(etree.QName(SOAP_ENV, "Envelope"), nsmap={"soap-env": SOAP_ENV})
+    etree.SubElement(envelope, etree.QName(SOAP_ENV, "Header"))
+    body = etree.SubElement(envelope, etree.QName(SOAP_ENV, "Body"))
+    etree.SubElement(body, "{http://dgp.gencat.cat/matricules}matriculaRequest").text = "x"
+    return envelope
+
+
+def test_signing_context_is_cached_until_files_change(tmp_path):
+    cert_path, key_path = _generate_certificates(tmp_path)
+    contexts = SigningContextCache()
+    signature = TimestampedBinarySignature(key_path, cert_path, contexts=contexts)
+
+    for _ in range(3):
+        envelope, _ = signature.apply(_envelope(), {})
+        _verify_envelope_with_key(envelope, _make_verify_key(open(cert_path, "rb").read()))
+    assert contexts.loads == 1
+
+    stat = os.stat(cert_path)
+    os.utime(cert_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    signature.apply(_envelope(), {})
+    assert contexts.loads == 2
+
+
+def test_signed_envelope_matches_zeep_binary_signature_layout(tmp_path):
+    cert_path, key_path = _generate_certificates(tmp_path)
+    ours, _ = TimestampedBinarySignature(key_path, cert_path, contexts=SigningContextCache()).apply(
+        _envelope(), {}
+    )
+    theirs, _ = BinarySignature(key_path, cert_path).apply(_envelope(), {})
+
+    def layout(envelope):
+        security = envelope.find(f".//{{{ns.WSSE}}}Security")
+        # Los nodos creados por xmlsec no se encuentran con búsquedas por etiqueta.
+        key_info = next(el for el in security.iter() if el.tag == f"{{{ns.DS}}}KeyInfo")
+        token = security.find(f"{{{ns.WSSE}}}BinarySecurityToken")
+        return (
+            [etree.QName(child).localname for child in key_info.iter()],
+            token.get("ValueType"),
+            token.get("EncodingType"),
+            "".join(token.text.split()),
+        )
+
+    assert layout(ours) == layout(theirs)
+
+
+def test_signing_pool_returns_verifiable_envelope(tmp_path):
+    from app.sender.signing_pool import SigningPool
+
+    cert_path, key_path = _generate_certificates(tmp_path)
+    signature = TimestampedBinarySignature(key_path, cert_path, contexts=SigningContextCache())
+    pool = SigningPool(processes=1)
+    try:
+        signed = [pool.sign(etree.tostring(_envelope()), signature) for _ in range(2)]
+    finally:
+        pool.shutdown()
+
+    verify_key = _make_verify_key(open(cert_path, "rb").read())
+    for document in signed:
+        assert document.startswith(b"<?xml")
+        _verify_envelope_with_key(etree.fromstring(document), verify_key)